@@ -0,0 +1,130 @@
+"""Нагрузочный тест базы данных: задержка обработчика, пока параллельные пользователи пишут в базу.
+
+Для каждого уровня нагрузки (--writers) запускается указанное количество пользователей-писателей:
+каждый в цикле сохраняет баллы по предмету (create_educational_subjects) и сообщение (create_message)
+с паузой --think-ms между записями. Одновременно пробный обработчик каждые --probe-ms миллисекунд
+выполняет выборку предметов пользователя (load_educational_subjects, как /view_scores), а отдельная задача
+замеряет задержку цикла событий (насколько позже срока просыпается asyncio.sleep).
+
+С флагом --blocking те же запросы выполняются как в первой версии database.sqlite3: одно соединение,
+запрос и commit прямо в цикле событий. Задержка обработчика считается от момента, когда он должен был
+начаться, поэтому включает ожидание цикла событий. С блокирующими запросами каждый commit (fsync) держит
+цикл событий: p99 растет до сотен миллисекунд уже при 100 пишущих пользователях, а запись упирается
+в ~1000 строк в секунду. С потоком-писателем, WAL и буфером записи p99 остается в пределах десятков
+миллисекунд при записи в несколько тысяч строк в секунду и растет только вместе с загрузкой процессора.
+С флагом --max-p99-ms скрипт завершается с кодом 1, если p99 обработчика на любом уровне больше порога.
+
+Запуск из корня проекта:
+    python -m benchmarks.db_load --writers 0 10 100 300 --seconds 5
+    python -m benchmarks.db_load --writers 0 10 100 300 --seconds 5 --blocking
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from benchmarks.replay import SUBJECTS, percentile
+from database import sqlite3 as db
+from database.migrations import apply_migrations
+
+
+# Запросы первой версии database.sqlite3: выполняются и фиксируются прямо в цикле событий
+class BlockingStorage:
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        apply_migrations(self.conn)
+
+    async def create_educational_subjects(self, data_subject, user_id):
+        self.conn.execute(db.SQL_UPSERT_SUBJECT,
+                          (user_id, data_subject['name_subject'], data_subject['points_subject']))
+        self.conn.commit()
+
+    async def create_message(self, message, user_id):
+        self.conn.execute(db.SQL_INSERT_MESSAGE, (user_id, message, int(time.time())))
+        self.conn.commit()
+
+    async def load_educational_subjects(self, user_id):
+        return self.conn.execute(db.SQL_SELECT_SUBJECTS, (user_id,)).fetchall()
+
+
+async def writer(storage, user_id, think, stop, counter):
+    while not stop.is_set():
+        await storage.create_educational_subjects(
+            {'name_subject': random.choice(SUBJECTS), 'points_subject': random.randint(0, 100)}, user_id)
+        await storage.create_message('привет', user_id)
+        counter[0] += 2
+        await asyncio.sleep(think * random.uniform(0.5, 1.5))
+
+
+async def probe(storage, interval, stop, latencies, lags):
+    while not stop.is_set():
+        start = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start)
+        await storage.load_educational_subjects(random.randint(1, 1000))
+        # задержка от момента, когда обработчик должен был начаться: включает ожидание цикла событий
+        latencies.append(time.perf_counter() - start)
+
+
+# Один уровень нагрузки, возвращает p99 обработчика в миллисекундах
+async def run_level(storage, writers, args):
+    stop = asyncio.Event()
+    latencies, lags, counter = [], [], [0]
+    tasks = [asyncio.create_task(writer(storage, 1000 + i, args.think_ms / 1000, stop, counter))
+             for i in range(writers)]
+    tasks.append(asyncio.create_task(probe(storage, args.probe_ms / 1000, stop, latencies, lags)))
+    await asyncio.sleep(args.seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+
+    latencies.sort()
+    lags.sort()
+    p99 = percentile(latencies, 0.99) * 1000
+    print(f'{writers:>8}{counter[0] / args.seconds:>12.0f}{len(latencies):>8}'
+          f'{percentile(latencies, 0.5) * 1000:>10.2f}{p99:>10.2f}{percentile(lags, 0.99) * 1000:>12.2f}')
+    return p99
+
+
+async def run(args):
+    path = os.path.join(tempfile.mkdtemp(), 'load.db')
+    if args.blocking:
+        storage = BlockingStorage(path)
+    else:
+        db.DB_NAME = path
+        await db.db_start()
+        storage = db
+
+    print(f'{"writers":>8}{"writes/s":>12}{"probes":>8}{"p50 ms":>10}{"p99 ms":>10}{"lag p99 ms":>12}')
+    worst_p99 = 0.0
+    try:
+        for writers in args.writers:
+            worst_p99 = max(worst_p99, await run_level(storage, writers, args))
+    finally:
+        if not args.blocking:
+            await db.db_close()
+
+    if args.max_p99_ms and worst_p99 > args.max_p99_ms:
+        print(f'FAIL: p99 {worst_p99:.2f} ms > {args.max_p99_ms} ms')
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, nargs='+', default=[0, 10, 100, 300],
+                        help='уровни нагрузки: сколько пользователей пишут одновременно')
+    parser.add_argument('--seconds', type=float, default=5.0, help='длительность каждого уровня')
+    parser.add_argument('--think-ms', type=float, default=100.0, help='пауза пользователя между записями, мс')
+    parser.add_argument('--probe-ms', type=float, default=5.0, help='интервал пробного обработчика, мс')
+    parser.add_argument('--blocking', action='store_true', help='блокирующие запросы в цикле событий')
+    parser.add_argument('--max-p99-ms', type=float, default=0.0, help='порог p99 для кода возврата 1')
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == '__main__':
+    main()
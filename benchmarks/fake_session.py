@@ -0,0 +1,63 @@
+"""Сессия Bot API без обращения к Telegram для локальных бенчмарков.
+
+FakeSession записывает все исходящие запросы бота и возвращает правдоподобные ответы:
+- для методов отправки (sendMessage, sendPhoto и т.п.) - объект Message;
+- для методов, возвращающих bool (deleteMessage, setMyCommands и т.п.) - True;
+- для getMe - пользователя-бота.
+
+Пример:
+    session = FakeSession()
+    bot = Bot(token='42:TEST', session=session)
+"""
+
+import asyncio
+import time
+from collections import Counter
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Chat, Message, PhotoSize, User
+
+BOT_USER = User(id=42, is_bot=True, first_name='BenchBot', username='bench_bot')
+
+
+class FakeSession(BaseSession):
+    """Сессия, которая считает вызовы API вместо их отправки.
+
+    Attributes:
+        calls (Counter): Количество вызовов по имени метода API.
+        latency (float): Искусственная задержка ответа (в секундах).
+    """
+
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.calls = Counter()
+        self.latency = latency
+        self._message_id = 0
+
+    async def make_request(self, bot, method, timeout=None):
+        # запрос никуда не отправляется, только учитывается
+        self.calls[method.__api_method__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._result(method)
+
+    def _result(self, method):
+        returning = method.__returning__
+        if returning is bool:
+            return True
+        if returning is User:
+            return BOT_USER
+        if returning is Message:
+            self._message_id += 1
+            chat_id = getattr(method, 'chat_id', 0)
+            photo = [PhotoSize(file_id=f'photo-{self._message_id}', file_unique_id=f'u{self._message_id}',
+                               width=1, height=1)] if method.__api_method__ == 'sendPhoto' else None
+            return Message(message_id=self._message_id, date=int(time.time()),
+                           chat=Chat(id=chat_id, type='private'), from_user=BOT_USER,
+                           text=getattr(method, 'text', None), photo=photo)
+        return None
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+    async def close(self):
+        pass
@@ -0,0 +1,65 @@
+"""Бенчмарк пропускной способности обработчиков при разных настройках логирования.
+
+Имитирует обработчик эхо-сообщения (две записи INFO и переключение цикла событий) и сравнивает:
+1. прежнюю настройку logging.basicConfig(filename=...) - запись в файл в цикле событий;
+2. services.logging_setup - очередь и отдельный поток записи (с выборочной записью эхо-сообщений и без нее).
+
+Запуск из корня проекта:
+    python -m benchmarks.logging_benchmark --handlers 50000
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from services.logging_setup import TEXT_FORMAT, setup_logging
+
+
+async def echo_handler():
+    logging.info(f'Start send echo - message')
+    await asyncio.sleep(0)
+    logging.info(f'message echo message')
+
+
+async def run_handlers(count):
+    start = time.perf_counter()
+    for _ in range(count):
+        await echo_handler()
+    return count / (time.perf_counter() - start)
+
+
+def reset_logging():
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--handlers', type=int, default=50_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        reset_logging()
+        logging.basicConfig(filename=os.path.join(tmp, 'basic.log'), level=logging.INFO, format=TEXT_FORMAT)
+        rate = asyncio.run(run_handlers(args.handlers))
+        print(f'basicConfig file logging: {rate:.0f} handlers/s')
+        reset_logging()
+
+        for json_format, sample_rate in ((False, 1.0), (True, 1.0), (False, 0.1)):
+            config = SimpleNamespace(file=os.path.join(tmp, f'queue-{json_format}-{sample_rate}.log'),
+                                     rotation='size', max_bytes=10 * 1024 * 1024, when='midnight',
+                                     backup_count=2, json=json_format, sample_rate=sample_rate)
+            listener = setup_logging(config)
+            rate = asyncio.run(run_handlers(args.handlers))
+            listener.stop()
+            print(f'queue logging (json={json_format}, sample_rate={sample_rate}): {rate:.0f} handlers/s')
+            reset_logging()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Бенчмарк выборки предметов пользователя (load_educational_subjects) до и после миграций схемы.
+
+Создает временную базу со старой схемой (TEXT user_id, без индексов), заполняет educational_subjects
+указанным количеством строк и измеряет время выборки предметов случайных пользователей:
+1. старым запросом через str.format по таблице без индекса;
+2. параметризованным запросом после применения database.migrations.
+
+Запуск из корня проекта:
+    python -m benchmarks.lookup_benchmark --rows 1000000 --lookups 200
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from database.migrations import apply_migrations
+from database.sqlite3 import SQL_SELECT_SUBJECTS
+
+SUBJECTS = ['Математика', 'Физика', 'Химия', 'Биология', 'История', 'Информатика', 'Литература', 'География']
+
+
+# Заполнение базы старой схемой (как в первой версии db_start)
+def fill_old_schema(conn, rows):
+    conn.execute('CREATE TABLE profile(user_id TEXT PRIMARY KEY, first_name TEXT, last_name TEXT)')
+    conn.execute('CREATE TABLE educational_subjects(user_id TEXT, name_subject TEXT, points_subject INTEGER)')
+    conn.execute('CREATE TABLE message_from_users(user_id TEXT, message TEXT, day TEXT)')
+    users = max(rows // len(SUBJECTS), 1)
+    data = ((str(i % users), SUBJECTS[i // users % len(SUBJECTS)], i % 101) for i in range(rows))
+    with conn:
+        conn.executemany('INSERT INTO educational_subjects VALUES(?, ?, ?)', data)
+    return users
+
+
+# Время выполнения запросов (в миллисекундах) для списка пользователей
+def measure(query, user_ids):
+    timings = []
+    for user_id in user_ids:
+        start = time.perf_counter()
+        query(user_id)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(title, timings):
+    timings = sorted(timings)
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f'{title}: mean {statistics.mean(timings):.3f} ms, median {statistics.median(timings):.3f} ms, p99 {p99:.3f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--lookups', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, 'bench.db'))
+        start = time.perf_counter()
+        users = fill_old_schema(conn, args.rows)
+        print(f'filled {args.rows} rows for {users} users in {time.perf_counter() - start:.1f} s')
+        user_ids = [random.randrange(users) for _ in range(args.lookups)]
+
+        before = measure(lambda user_id: conn.execute(
+            "SELECT * FROM educational_subjects WHERE user_id == '{}' ".format(user_id)).fetchall(), user_ids)
+        report('before migrations', before)
+
+        start = time.perf_counter()
+        apply_migrations(conn)
+        print(f'migrations applied in {time.perf_counter() - start:.1f} s')
+
+        after = measure(lambda user_id: conn.execute(SQL_SELECT_SUBJECTS, (user_id,)).fetchall(), user_ids)
+        report('after migrations', after)
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Офлайн-бенчмарк: прогон синтетических пользователей через настоящий диспетчер бота.
+
+Диспетчер собирается так же, как в main.py (create_bot, create_dispatcher: роутеры fsm.r, user_handlers.r,
+other_handlers.r и все middleware), но бот работает через FakeSession - запросы к Telegram только считаются.
+База данных и хранилище FSM создаются во временном каталоге.
+
+Каждый пользователь проходит сценарий:
+/start -> кнопка регистрации -> имя -> фамилия -> /enter_scores -> предмет -> баллы -> /view_scores -> случайные сообщения.
+Шаги одного пользователя идут по порядку, разные пользователи обрабатываются параллельно.
+
+Отчет: обновлений в секунду, перцентили задержки по шагам (обработчикам), время запросов к базе данных
+по функциям и количество вызовов API. С флагом --max-p99-ms скрипт завершается с кодом 1,
+если p99 любого шага больше порога, что позволяет ловить регрессии при локальных прогонах.
+
+Запуск из корня проекта:
+    python -m benchmarks.replay --users 2000 --concurrency 200 --chatter 3
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from aiogram.methods import TelegramMethod
+from aiogram.types import Update
+from benchmarks.fake_session import FakeSession
+from benchmarks.synthetic import callback_update, message_update
+
+SUBJECTS = ['Математика', 'Физика', 'Химия', 'Биология', 'История', 'Информатика']
+CHATTER = ['привет', 'как дела?', 'что ты умеешь', 'спасибо', 'ок', '👍']
+
+
+# Шаги сценария пользователя: (название шага, функция создания обновления)
+def scenario(user_id, chatter):
+    steps = [
+        ('start', lambda uid: message_update(uid, user_id, '/start')),
+        ('start_reg', lambda uid: callback_update(uid, user_id, 'start_reg')),
+        ('first_name', lambda uid: message_update(uid, user_id, 'Иван')),
+        ('last_name', lambda uid: message_update(uid, user_id, 'Петров')),
+        ('enter_scores', lambda uid: message_update(uid, user_id, '/enter_scores')),
+        ('name_subject', lambda uid: message_update(uid, user_id, random.choice(SUBJECTS))),
+        ('points_subject', lambda uid: message_update(uid, user_id, str(random.randint(0, 100)))),
+        ('view_scores', lambda uid: message_update(uid, user_id, '/view_scores')),
+    ]
+    steps += [('chatter', lambda uid: message_update(uid, user_id, random.choice(CHATTER)))] * chatter
+    return steps
+
+
+def percentile(values, q):
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def run(args):
+    # настройки до импорта модулей бота: временная база, лимиты не мешают измерению (если не --real-limits)
+    tmp = tempfile.mkdtemp()
+    os.environ.setdefault('BOT_TOKEN', '42:TEST')
+    os.environ['FSM_STORAGE'] = 'sqlite'
+    if not args.real_limits:
+        for name in ('OUTBOUND_GLOBAL_RATE', 'OUTBOUND_CHAT_RATE', 'THROTTLE_USER_RATE', 'THROTTLE_GLOBAL_RATE'):
+            os.environ[name] = '1000000'
+        os.environ['OUTBOUND_CHAT_BURST'] = os.environ['THROTTLE_USER_BURST'] = '1000000'
+
+    from config_data.config import load_config
+    from database import sqlite3 as db
+    from main import create_bot, create_dispatcher
+    from services.metrics import db_seconds
+
+    db.DB_NAME = os.path.join(tmp, 'bench.db')
+    config = load_config()
+    session = FakeSession(latency=args.api_latency / 1000)
+    bot = create_bot(config, session=session)
+    dp = create_dispatcher(config)
+    await db.db_start()
+
+    update_ids = iter(range(1, 10 ** 9))
+    latencies = defaultdict(list)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def feed(raw):
+        update = Update.model_validate(raw, context={'bot': bot})
+        result = await dp.feed_update(bot, update)
+        if isinstance(result, TelegramMethod):
+            await dp.silent_call_request(bot, result)
+
+    async def user(user_id):
+        async with semaphore:
+            for step, make in scenario(user_id, args.chatter):
+                start = time.perf_counter()
+                await feed(make(next(update_ids)))
+                latencies[step].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(100_000 + i) for i in range(args.users)))
+    elapsed = time.perf_counter() - start
+    await db.db_close()
+
+    total = sum(len(values) for values in latencies.values())
+    print(f'{total} updates from {args.users} users in {elapsed:.2f} s: {total / elapsed:.0f} updates/s')
+    print(f'{"step":<16}{"count":>8}{"p50 ms":>10}{"p90 ms":>10}{"p99 ms":>10}{"max ms":>10}')
+    worst_p99 = 0.0
+    for step, values in latencies.items():
+        values.sort()
+        p99 = percentile(values, 0.99) * 1000
+        worst_p99 = max(worst_p99, p99)
+        print(f'{step:<16}{len(values):>8}{percentile(values, 0.5) * 1000:>10.2f}'
+              f'{percentile(values, 0.9) * 1000:>10.2f}{p99:>10.2f}{values[-1] * 1000:>10.2f}')
+
+    print('DB time by function:')
+    for (query,), (count, seconds) in sorted(db_seconds.totals().items()):
+        print(f'  {query:<28}{count:>8} calls {seconds:>8.3f} s total {seconds / count * 1000:>8.3f} ms avg')
+    print(f'API calls: {dict(session.calls)}')
+
+    if args.max_p99_ms and worst_p99 > args.max_p99_ms:
+        print(f'FAIL: p99 {worst_p99:.2f} ms > {args.max_p99_ms} ms')
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=100, help='сколько пользователей активны одновременно')
+    parser.add_argument('--chatter', type=int, default=3, help='случайных сообщений на пользователя')
+    parser.add_argument('--api-latency', type=float, default=0.0, help='задержка ответа FakeSession, мс')
+    parser.add_argument('--real-limits', action='store_true', help='не отключать лимиты из config')
+    parser.add_argument('--max-p99-ms', type=float, default=0.0, help='порог p99 для кода возврата 1')
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""Генерация синтетических обновлений Telegram (в виде словарей JSON, как их присылает Bot API)."""
+
+import time
+
+
+def _user(user_id):
+    return {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}', 'language_code': 'ru'}
+
+
+# Текстовое сообщение (или команда, если текст начинается с "/")
+def message_update(update_id, user_id, text):
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private', 'first_name': f'User{user_id}'},
+        'from': _user(user_id),
+        'text': text,
+    }
+    if text.startswith('/'):
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    return {'update_id': update_id, 'message': message}
+
+
+# Нажатие инлайн-кнопки с callback_data
+def callback_update(update_id, user_id, data):
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': _user(user_id),
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private', 'first_name': f'User{user_id}'},
+                'text': 'menu',
+            },
+        },
+    }
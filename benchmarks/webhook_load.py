@@ -0,0 +1,114 @@
+"""Нагрузочный стенд для режима webhook: отправляет обновления на сервер и измеряет пропускную способность.
+
+Обновления берутся из файла JSONL (одно записанное обновление Telegram в строке) или генерируются
+(случайные сообщения, попадающие в эхо-обработчик). Каждое обновление отправляется POST-запросом
+с заголовком X-Telegram-Bot-Api-Secret-Token, как это делает Telegram.
+
+С флагом --serve стенд сам поднимает сервер бота (services.webhook) на временной базе с FakeSession,
+поэтому токен и доступ к Telegram не нужны.
+
+Запуск из корня проекта:
+    python -m benchmarks.webhook_load --serve --count 5000 --concurrency 50
+    python -m benchmarks.webhook_load --url http://127.0.0.1:8080/webhook --secret s3cret --updates updates.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter
+from aiohttp import ClientSession, web
+from yarl import URL
+from benchmarks.synthetic import message_update
+
+
+# Загрузка записанных обновлений или генерация синтетических
+def load_updates(path, count, users):
+    if path:
+        with open(path, encoding='utf-8') as f:
+            updates = [json.loads(line) for line in f if line.strip()]
+        return [updates[i % len(updates)] for i in range(count)]
+    return [message_update(i + 1, random.randint(1, users), f'привет {i}') for i in range(count)]
+
+
+# Запуск сервера бота с FakeSession во временном каталоге
+async def serve(host, port, secret, path):
+    from aiogram import Bot, Dispatcher
+    from benchmarks.fake_session import FakeSession
+    from database import sqlite3 as db
+    from handlers import fsm, user_handlers, other_handlers
+    from services.webhook import create_webhook_app
+
+    db.DB_NAME = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    await db.db_start()
+
+    bot = Bot(token='42:TEST', session=FakeSession())
+    dp = Dispatcher()
+    dp.include_routers(fsm.r, user_handlers.r, other_handlers.r)
+
+    runner = web.AppRunner(create_webhook_app(dp, bot, secret, path))
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    return runner, bot.session
+
+
+async def post_all(url, secret, updates, concurrency):
+    queue = asyncio.Queue()
+    for update in updates:
+        queue.put_nowait(update)
+    latencies, statuses = [], Counter()
+    headers = {'X-Telegram-Bot-Api-Secret-Token': secret} if secret else {}
+
+    async def worker(session):
+        while not queue.empty():
+            update = queue.get_nowait()
+            start = time.perf_counter()
+            async with session.post(url, json=update, headers=headers) as response:
+                await response.read()
+                statuses[response.status] += 1
+            latencies.append(time.perf_counter() - start)
+
+    async with ClientSession() as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return elapsed, sorted(latencies), statuses
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8080/webhook')
+    parser.add_argument('--secret', default='')
+    parser.add_argument('--updates', help='файл JSONL с записанными обновлениями')
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--serve', action='store_true', help='поднять локальный сервер бота с FakeSession')
+    args = parser.parse_args()
+
+    runner = session = None
+    if args.serve:
+        url = URL(args.url)
+        runner, session = await serve(url.host, url.port, args.secret, url.path)
+
+    updates = load_updates(args.updates, args.count, args.users)
+    elapsed, latencies, statuses = await post_all(args.url, args.secret, updates, args.concurrency)
+
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f'{len(updates)} updates in {elapsed:.2f} s: {len(updates) / elapsed:.0f} updates/s')
+    print(f'latency: median {statistics.median(latencies) * 1000:.2f} ms, p99 {p99 * 1000:.2f} ms')
+    print(f'HTTP statuses: {dict(statuses)}')
+    if session is not None:
+        print(f'API calls outside webhook responses: {dict(session.calls)}')
+    if runner is not None:
+        from database.sqlite3 import db_close
+        await runner.cleanup()
+        await db_close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
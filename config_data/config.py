@@ -6,6 +6,49 @@ config = load_config('.env')
 Где `.env` файл может содержать: BOT_TOKEN=1234567890:AbCdEfGhIjKlMnOpQrStUvWxYz0123456789
 
 В результате будет создан объект типа Config, содержащий экземпляр TgBot с токеном.
+
+Необязательные переменные окружения:
+- ADMIN_IDS: id администраторов через запятую (команды загрузки и выгрузки данных, handlers.admin_handlers).
+- FSM_STORAGE: хранилище состояний FSM - sqlite (по умолчанию), redis или memory.
+- REDIS_URL: адрес Redis для FSM_STORAGE=redis (по умолчанию redis://localhost:6379/0).
+- FSM_TTL: время жизни незавершенной анкеты в секундах (по умолчанию 86400).
+- WEBHOOK_URL: внешний адрес бота (https://example.com). Если задан, бот работает через webhook, иначе через polling.
+- WEBHOOK_PATH: путь для приема обновлений (по умолчанию /webhook).
+- WEBHOOK_SECRET: секретный токен, который Telegram передает в заголовке X-Telegram-Bot-Api-Secret-Token.
+- WEBHOOK_HOST, WEBHOOK_PORT: адрес и порт локального HTTP-сервера (по умолчанию 0.0.0.0:8080).
+- OUTBOUND_GLOBAL_RATE: общий лимит исходящих сообщений в секунду (по умолчанию 30).
+- OUTBOUND_CHAT_RATE, OUTBOUND_CHAT_BURST: лимит сообщений в секунду в один чат и допустимый всплеск (по умолчанию 1 и 3).
+- THROTTLE_USER_RATE, THROTTLE_USER_BURST: лимит входящих событий в секунду от одного пользователя и всплеск (1 и 5).
+- THROTTLE_GLOBAL_RATE: общий лимит входящих событий в секунду (по умолчанию 100, 0 - без лимита).
+- THROTTLE_NOTICE_INTERVAL: не чаще чем раз в сколько секунд предупреждать пользователя (по умолчанию 10).
+- LOG_FILE: файл лога (по умолчанию bot.log).
+- LOG_ROTATION: ротация лога по размеру (size, по умолчанию) или по времени (time).
+- LOG_MAX_BYTES, LOG_WHEN, LOG_BACKUP_COUNT: размер файла (10 МБ), интервал ротации (midnight) и количество архивов (5).
+- LOG_JSON: писать лог в формате JSON (по умолчанию False).
+- LOG_SAMPLE_RATE: доля записываемых частых INFO-сообщений, например эхо-ответов (по умолчанию 0.1).
+- METRICS_HOST, METRICS_PORT: адрес и порт HTTP-эндпоинта /metrics (по умолчанию 0.0.0.0:9090, порт 0 - отключить).
+- BROADCAST_CONCURRENCY: сколько сообщений рассылки отправляется одновременно (по умолчанию 20).
+- SCORE_HISTORY: сохранять все введенные баллы по предмету для команды /history (по умолчанию True).
+- MESSAGE_RETENTION_DAYS: сколько дней хранить сообщения пользователей в базе, старые переносятся в архив (90).
+- ARCHIVE_DIR: каталог архивов сообщений (по умолчанию archive).
+- MAINTENANCE_INTERVAL: интервал обслуживания базы в секундах (по умолчанию 86400, 0 - отключить).
+- VACUUM_PAGES: сколько свободных страниц базы освобождать за один проход (по умолчанию 1000).
+- BACKUP_DIR: каталог резервных копий базы (по умолчанию backups, services.backup).
+- BACKUP_INTERVAL: интервал резервного копирования в секундах (по умолчанию 86400, 0 - отключить).
+- BACKUP_KEEP: сколько последних копий хранить (по умолчанию 7).
+- BACKUP_STEP_PAGES, BACKUP_STEP_SLEEP: сколько страниц базы копировать за один шаг и пауза между шагами
+  в секундах (по умолчанию 1000 и 0.05).
+- CATCHUP: обрабатывать при запуске обновления, накопившиеся за время остановки бота (по умолчанию True,
+  False - удалять их, как раньше).
+- CATCHUP_CONCURRENCY: сколько накопившихся обновлений обрабатывается одновременно (по умолчанию 100).
+- UPDATE_CONCURRENCY: сколько обновлений обрабатывается одновременно (по умолчанию 1000, services.executor).
+- USER_QUEUE_LIMIT: сколько обновлений одного пользователя может ждать обработки, остальные отбрасываются (100).
+- MAX_PENDING_UPDATES: сколько обновлений принимается в обработку, дальше polling, webhook и разбор накопившихся
+  обновлений ждут, пока освободится место (по умолчанию 10000). При WORKERS > 1 - также сколько обновлений
+  может ждать в очереди одного процесса-обработчика (services.sharding).
+- SHUTDOWN_TIMEOUT: сколько секунд при остановке ждать завершения принятых обновлений (по умолчанию 25).
+- HEALTH_MAX_LOOP_LAG: задержка цикла событий в секундах, после которой /healthz отвечает 503 (по умолчанию 5).
+- WORKERS: количество процессов-обработчиков (по умолчанию 1 - один процесс, больше 1 - services.sharding).
 """
 
 
@@ -15,10 +58,118 @@ from environs import Env
 @dataclass
 class TgBot():
     token: str 
+    admin_ids: list
+
+@dataclass
+class FsmStorage:
+    backend: str
+    redis_url: str
+    ttl: int
+
+@dataclass
+class Webhook:
+    url: str
+    path: str
+    secret: str
+    host: str
+    port: int
+
+@dataclass
+class Outbound:
+    global_rate: float
+    chat_rate: float
+    chat_burst: int
+
+@dataclass
+class Throttling:
+    user_rate: float
+    user_burst: int
+    global_rate: float
+    notice_interval: float
+
+@dataclass
+class Metrics:
+    host: str
+    port: int
+
+@dataclass
+class Logging:
+    file: str
+    rotation: str
+    max_bytes: int
+    when: str
+    backup_count: int
+    json: bool
+    sample_rate: float
+
+@dataclass
+class Scores:
+    history: bool
+
+
+@dataclass
+class Broadcast:
+    concurrency: int
+
+
+@dataclass
+class Maintenance:
+    retention_days: int
+    archive_dir: str
+    interval: int
+    vacuum_pages: int
+
+
+@dataclass
+class Backup:
+    dir: str
+    interval: int
+    keep: int
+    step_pages: int
+    step_sleep: float
+
+
+@dataclass
+class Executor:
+    concurrency: int
+    user_queue: int
+    max_pending: int
+
+
+@dataclass
+class Catchup:
+    enabled: bool
+    concurrency: int
+
+
+@dataclass
+class Shutdown:
+    timeout: float
+    max_loop_lag: float
+
+
+@dataclass
+class Sharding:
+    workers: int
+
 
 @dataclass
 class Config:
     tg_bot: TgBot 
+    fsm: FsmStorage
+    webhook: Webhook
+    outbound: Outbound
+    throttling: Throttling
+    metrics: Metrics
+    logging: Logging
+    sharding: Sharding
+    broadcast: Broadcast
+    scores: Scores
+    maintenance: Maintenance
+    backup: Backup
+    catchup: Catchup
+    executor: Executor
+    shutdown: Shutdown
 
 
 # создания экземпляра телеграмм бота
@@ -34,5 +185,72 @@ def load_config(path = None) -> Config:
     """
     env = Env()
     env.read_env(path) # путь для файла env где хранится токен
-    return Config(tg_bot=TgBot(token=env('BOT_TOKEN')))
+    return Config(
+        tg_bot=TgBot(token=env('BOT_TOKEN'), admin_ids=env.list('ADMIN_IDS', [], subcast=int)),
+        fsm=FsmStorage(
+            backend=env('FSM_STORAGE', 'sqlite'),
+            redis_url=env('REDIS_URL', 'redis://localhost:6379/0'),
+            ttl=env.int('FSM_TTL', 86400),
+        ),
+        webhook=Webhook(
+            url=env('WEBHOOK_URL', ''),
+            path=env('WEBHOOK_PATH', '/webhook'),
+            secret=env('WEBHOOK_SECRET', ''),
+            host=env('WEBHOOK_HOST', '0.0.0.0'),
+            port=env.int('WEBHOOK_PORT', 8080),
+        ),
+        outbound=Outbound(
+            global_rate=env.float('OUTBOUND_GLOBAL_RATE', 30),
+            chat_rate=env.float('OUTBOUND_CHAT_RATE', 1),
+            chat_burst=env.int('OUTBOUND_CHAT_BURST', 3),
+        ),
+        throttling=Throttling(
+            user_rate=env.float('THROTTLE_USER_RATE', 1),
+            user_burst=env.int('THROTTLE_USER_BURST', 5),
+            global_rate=env.float('THROTTLE_GLOBAL_RATE', 100),
+            notice_interval=env.float('THROTTLE_NOTICE_INTERVAL', 10),
+        ),
+        metrics=Metrics(
+            host=env('METRICS_HOST', '0.0.0.0'),
+            port=env.int('METRICS_PORT', 9090),
+        ),
+        logging=Logging(
+            file=env('LOG_FILE', 'bot.log'),
+            rotation=env('LOG_ROTATION', 'size'),
+            max_bytes=env.int('LOG_MAX_BYTES', 10 * 1024 * 1024),
+            when=env('LOG_WHEN', 'midnight'),
+            backup_count=env.int('LOG_BACKUP_COUNT', 5),
+            json=env.bool('LOG_JSON', False),
+            sample_rate=env.float('LOG_SAMPLE_RATE', 0.1),
+        ),
+        sharding=Sharding(workers=env.int('WORKERS', 1)),
+        broadcast=Broadcast(concurrency=env.int('BROADCAST_CONCURRENCY', 20)),
+        scores=Scores(history=env.bool('SCORE_HISTORY', True)),
+        maintenance=Maintenance(
+            retention_days=env.int('MESSAGE_RETENTION_DAYS', 90),
+            archive_dir=env('ARCHIVE_DIR', 'archive'),
+            interval=env.int('MAINTENANCE_INTERVAL', 86400),
+            vacuum_pages=env.int('VACUUM_PAGES', 1000),
+        ),
+        backup=Backup(
+            dir=env('BACKUP_DIR', 'backups'),
+            interval=env.int('BACKUP_INTERVAL', 86400),
+            keep=env.int('BACKUP_KEEP', 7),
+            step_pages=env.int('BACKUP_STEP_PAGES', 1000),
+            step_sleep=env.float('BACKUP_STEP_SLEEP', 0.05),
+        ),
+        catchup=Catchup(
+            enabled=env.bool('CATCHUP', True),
+            concurrency=env.int('CATCHUP_CONCURRENCY', 100),
+        ),
+        executor=Executor(
+            concurrency=env.int('UPDATE_CONCURRENCY', 1000),
+            user_queue=env.int('USER_QUEUE_LIMIT', 100),
+            max_pending=env.int('MAX_PENDING_UPDATES', 10000),
+        ),
+        shutdown=Shutdown(
+            timeout=env.float('SHUTDOWN_TIMEOUT', 25),
+            max_loop_lag=env.float('HEALTH_MAX_LOOP_LAG', 5),
+        ),
+    )
 
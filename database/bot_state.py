@@ -0,0 +1,32 @@
+"""Модуль служебных значений бота в таблице bot_state (ключ - целое число).
+
+Используется для id последнего обработанного обновления Telegram (middlewares.dedup): после перезапуска
+бот пропускает обновления, которые уже обработал, даже если Telegram доставит их повторно.
+Значение только растет (запись берет максимум из старого и нового), поэтому порядок записей
+не важен. Запись идет через буфер записи (WriteBuffer).
+
+Основные функции модуля:
+- load_state(key, max_age): значение по ключу (None, если его нет или оно старше max_age секунд).
+- save_state(key, value): сохранение значения.
+"""
+
+import time
+from database.sqlite3 import fetch_all, write_buffer
+
+SQL_SELECT_STATE = 'SELECT value, updated_at FROM bot_state WHERE key = ?'
+SQL_UPSERT_STATE = ('INSERT INTO bot_state(key, value, updated_at) VALUES(?, ?, ?) '
+                    'ON CONFLICT(key) DO UPDATE SET value = MAX(value, excluded.value), updated_at = excluded.updated_at')
+
+
+async def load_state(key, max_age=None):
+    rows = await fetch_all(SQL_SELECT_STATE, (key,))
+    if not rows:
+        return None
+    value, updated_at = rows[0]
+    if max_age is not None and time.time() - updated_at > max_age:
+        return None
+    return value
+
+
+async def save_state(key, value):
+    await write_buffer.add(SQL_UPSERT_STATE, (key, value, int(time.time())))
@@ -0,0 +1,122 @@
+"""Модуль хранения рассылок администратора (services.broadcast).
+
+Таблица broadcasts хранит текст, статус (running, done, cancelled) и позицию рассылки: last_user_id -
+все пользователи с меньшим или равным id уже обработаны. Таблица broadcast_deliveries хранит статус
+доставки каждому пользователю (sent, blocked, failed). Получатели читаются из profile частями по
+первичному ключу (user_id > last_user_id), а пользователи, которым уже есть запись о доставке, пропускаются,
+поэтому прерванная рассылка продолжается с места остановки без повторной отправки.
+Записи о доставке идут через буфер записи (WriteBuffer), позиция сохраняется после каждой части получателей.
+
+Рассылку выполняет один процесс - владелец аренды (lease_owner, lease_until): владелец продлевает аренду,
+пока рассылка идет, а продолжить незавершенную рассылку (services.broadcast.Broadcaster.resume) можно,
+только получив аренду, срок которой истек или которую освободили при остановке. Так рассылка, идущая
+в одном процессе-обработчике (services.sharding), не запускается второй раз в другом, а рассылка
+упавшего процесса продолжается после истечения аренды.
+
+Отмена и ход рассылки не зависят от процесса, получившего команду администратора: отмена записывается
+в строку рассылки (cancel_requested), владелец проверяет флаг при продлении аренды и останавливает рассылку,
+а ход рассылок других процессов читается из сохраненных счетчиков (sent, failed).
+
+Основные функции модуля:
+- create_broadcast(admin_id, text, owner, ttl): создает рассылку с арендой владельца owner, возвращает ее id.
+- claim_broadcast(broadcast_id, owner, ttl): получение аренды незавершенной рассылки, True - получена.
+- renew_lease(broadcast_id, owner, ttl), release_lease(broadcast_id, owner): продление и освобождение аренды;
+  renew_lease возвращает True, если запрошена отмена рассылки.
+- request_cancel(broadcast_id): запрос отмены рассылки, False - такой незавершенной рассылки нет.
+- running_broadcasts(): незавершенные рассылки (для продолжения после перезапуска и для хода рассылок).
+- count_recipients(after_user_id): сколько пользователей осталось после позиции.
+- next_recipients(broadcast_id, after_user_id, limit): следующая часть получателей.
+- delivery_counts(broadcast_id): количество доставок по статусам.
+- record_delivery(broadcast_id, user_id, status, error): запись статуса доставки.
+- save_progress(broadcast_id, last_user_id, sent, failed): сохранение позиции и счетчиков.
+- finish_broadcast(broadcast_id, status, sent, failed): завершение рассылки.
+"""
+
+import time
+from database.sqlite3 import execute, fetch_all, write_buffer
+
+SQL_INSERT_BROADCAST = ("INSERT INTO broadcasts(admin_id, text, status, created_at, lease_owner, lease_until) "
+                        "VALUES(?, ?, 'running', ?, ?, ?)")
+SQL_CLAIM_BROADCAST = ("UPDATE broadcasts SET lease_owner = ?, lease_until = ? "
+                       "WHERE id = ? AND status = 'running' AND lease_until < ?")
+SQL_SELECT_OWNER = 'SELECT lease_owner FROM broadcasts WHERE id = ?'
+SQL_RENEW_LEASE = 'UPDATE broadcasts SET lease_until = ? WHERE id = ? AND lease_owner = ?'
+SQL_RELEASE_LEASE = 'UPDATE broadcasts SET lease_until = 0 WHERE id = ? AND lease_owner = ?'
+SQL_REQUEST_CANCEL = "UPDATE broadcasts SET cancel_requested = 1 WHERE id = ? AND status = 'running'"
+SQL_SELECT_CANCEL = "SELECT cancel_requested FROM broadcasts WHERE id = ? AND status = 'running'"
+SQL_SELECT_RUNNING = ("SELECT id, admin_id, text, last_user_id, sent, failed, cancel_requested FROM broadcasts "
+                      "WHERE status = 'running' ORDER BY id")
+SQL_COUNT_RECIPIENTS = 'SELECT COUNT(*) FROM profile WHERE user_id > ?'
+SQL_NEXT_RECIPIENTS = ('SELECT user_id FROM profile WHERE user_id > ? AND NOT EXISTS ('
+                       'SELECT 1 FROM broadcast_deliveries AS d WHERE d.broadcast_id = ? AND d.user_id = profile.user_id) '
+                       'ORDER BY user_id LIMIT ?')
+SQL_DELIVERY_COUNTS = 'SELECT status, COUNT(*) FROM broadcast_deliveries WHERE broadcast_id = ? GROUP BY status'
+SQL_INSERT_DELIVERY = ('INSERT OR REPLACE INTO broadcast_deliveries(broadcast_id, user_id, status, error) '
+                       'VALUES(?, ?, ?, ?)')
+SQL_UPDATE_PROGRESS = 'UPDATE broadcasts SET last_user_id = ?, sent = ?, failed = ? WHERE id = ?'
+SQL_FINISH_BROADCAST = 'UPDATE broadcasts SET status = ?, sent = ?, failed = ? WHERE id = ?'
+
+
+async def create_broadcast(admin_id, text, owner, ttl):
+    now = time.time()
+    return await execute(SQL_INSERT_BROADCAST, (admin_id, text, now, owner, int(now + ttl)))
+
+
+# Аренда выдается, если рассылка не завершена и прежняя аренда истекла или освобождена
+async def claim_broadcast(broadcast_id, owner, ttl):
+    now = int(time.time())
+    await execute(SQL_CLAIM_BROADCAST, (owner, now + ttl, broadcast_id, now))
+    rows = await fetch_all(SQL_SELECT_OWNER, (broadcast_id,))
+    return bool(rows) and rows[0][0] == owner
+
+
+# Продление аренды, возвращает True, если запрошена отмена рассылки
+async def renew_lease(broadcast_id, owner, ttl):
+    await execute(SQL_RENEW_LEASE, (int(time.time()) + ttl, broadcast_id, owner))
+    rows = await fetch_all(SQL_SELECT_CANCEL, (broadcast_id,))
+    return bool(rows and rows[0][0])
+
+
+async def request_cancel(broadcast_id):
+    await execute(SQL_REQUEST_CANCEL, (broadcast_id,))
+    return bool(await fetch_all(SQL_SELECT_CANCEL, (broadcast_id,)))
+
+
+async def release_lease(broadcast_id, owner):
+    await execute(SQL_RELEASE_LEASE, (broadcast_id, owner))
+
+
+# Список (id, admin_id, text, last_user_id, sent, failed, cancel_requested)
+async def running_broadcasts():
+    return await fetch_all(SQL_SELECT_RUNNING)
+
+
+async def count_recipients(after_user_id=0):
+    rows = await fetch_all(SQL_COUNT_RECIPIENTS, (after_user_id,))
+    return rows[0][0]
+
+
+# Список id пользователей, которым рассылка еще не отправлялась
+async def next_recipients(broadcast_id, after_user_id, limit):
+    rows = await fetch_all(SQL_NEXT_RECIPIENTS, (after_user_id, broadcast_id, limit))
+    return [user_id for user_id, in rows]
+
+
+# Словарь {статус: количество}
+async def delivery_counts(broadcast_id):
+    return dict(await fetch_all(SQL_DELIVERY_COUNTS, (broadcast_id,)))
+
+
+async def record_delivery(broadcast_id, user_id, status, error=None):
+    await write_buffer.add(SQL_INSERT_DELIVERY, (broadcast_id, user_id, status, error))
+
+
+# Позиция сохраняется только после записи статусов доставки этой части получателей
+async def save_progress(broadcast_id, last_user_id, sent, failed):
+    await write_buffer.flush()
+    await execute(SQL_UPDATE_PROGRESS, (last_user_id, sent, failed, broadcast_id))
+
+
+async def finish_broadcast(broadcast_id, status, sent, failed):
+    await write_buffer.flush()
+    await execute(SQL_FINISH_BROADCAST, (status, sent, failed, broadcast_id))
@@ -0,0 +1,181 @@
+"""Модуль массовой загрузки и выгрузки данных в формате CSV.
+
+Позволяет загрузить в базу списки учеников (таблица profile) и результаты экзаменов
+(таблица educational_subjects) целыми файлами, а также выгрузить их для отчетов.
+
+Загрузка читает файл пачками по BATCH_SIZE строк и записывает каждую пачку одним запросом
+в одной транзакции (database.sqlite3.execute_many); следующая пачка читается из файла,
+пока записывается предыдущая. Существующие записи обновляются (upsert), строки с ошибками
+пропускаются и считаются. Выгрузка читает таблицу курсором частями (database.sqlite3.fetch_chunks)
+и сразу пишет их в файл, поэтому память не растет с размером таблицы.
+Обе операции возвращают отчет: количество строк, пропущенные строки, время и строк в секунду.
+
+Формат файлов (первая строка - заголовок, кодировка UTF-8):
+- profiles: user_id, first_name, last_name
+- scores: user_id, name_subject, points_subject (баллы от 0 до 100; названия предметов из справочника
+  приводятся к одному написанию, см. database.subjects, новые предметы добавляются в справочник).
+  Если включена история баллов (SCORE_HISTORY), каждая загруженная строка записывается и в score_history
+  в той же транзакции, что и в educational_subjects, как при вводе баллов в боте.
+
+Основные функции модуля:
+- import_csv(kind, path, batch_size): загрузка файла в таблицу.
+- export_csv(kind, path, size): выгрузка таблицы в файл.
+
+Запуск из командной строки (из корня проекта):
+    python -m database.bulk import profiles roster.csv
+    python -m database.bulk export scores scores.csv
+"""
+
+import argparse
+import asyncio
+import csv
+import logging
+import time
+from collections import namedtuple
+from database.sqlite3 import (SQL_INSERT_HISTORY, SQL_UPSERT_SUBJECT, add_subject, db_close, db_start, execute_batch,
+                              execute_many, fetch_chunks, score_history_enabled, subject_catalog, user_cache,
+                              write_buffer)
+
+# Размер пачки строк при загрузке и при выгрузке
+BATCH_SIZE = 5000
+EXPORT_CHUNK = 5000
+
+SQL_UPSERT_PROFILE = ('INSERT INTO profile(user_id, first_name, last_name) VALUES(?, ?, ?) '
+                      'ON CONFLICT(user_id) DO UPDATE SET first_name = excluded.first_name, '
+                      'last_name = excluded.last_name')
+SQL_EXPORT_PROFILES = 'SELECT user_id, first_name, last_name FROM profile ORDER BY user_id'
+SQL_EXPORT_SCORES = ('SELECT user_id, name_subject, points_subject FROM educational_subjects '
+                     'ORDER BY user_id, name_subject')
+
+
+# Разбор строки файла в параметры запроса (ValueError - строка пропускается)
+def _parse_profile(row):
+    first_name, last_name = row['first_name'].strip(), row['last_name'].strip()
+    if not first_name or not last_name:
+        raise ValueError('empty name')
+    return int(row['user_id']), first_name, last_name
+
+
+def _parse_score(row):
+    name_subject, points_subject = row['name_subject'].strip(), int(row['points_subject'])
+    if not name_subject or not 0 <= points_subject <= 100:
+        raise ValueError('bad score')
+    return int(row['user_id']), name_subject, points_subject
+
+
+# Названия предметов пачки приводятся к справочнику, новые предметы добавляются в него
+async def _canonical_subjects(batch):
+    for name_subject in {name_subject for _, name_subject, _ in batch}:
+        if subject_catalog.match_id(name_subject) is None:
+            await add_subject(name_subject)
+    return [(user_id, subject_catalog.match(name_subject), points_subject)
+            for user_id, name_subject, points_subject in batch]
+
+
+Table = namedtuple('Table', 'columns parse upsert export')
+
+TABLES = {
+    'profiles': Table(('user_id', 'first_name', 'last_name'), _parse_profile, SQL_UPSERT_PROFILE,
+                      SQL_EXPORT_PROFILES),
+    'scores': Table(('user_id', 'name_subject', 'points_subject'), _parse_score, SQL_UPSERT_SUBJECT,
+                    SQL_EXPORT_SCORES),
+}
+
+
+def _report(rows, skipped, start):
+    seconds = time.perf_counter() - start
+    return {'rows': rows, 'skipped': skipped, 'seconds': seconds, 'rows_per_sec': rows / seconds if seconds else 0.0}
+
+
+# Запись пачки; баллы - вместе с историей попыток в одной транзакции (если история включена)
+async def _write_rows(kind, table, batch):
+    if kind == 'scores' and score_history_enabled():
+        created_at = int(time.time())
+        await execute_batch({table.upsert: batch, SQL_INSERT_HISTORY: [row + (created_at,) for row in batch]})
+    else:
+        await execute_many(table.upsert, batch)
+
+
+# Чтение следующей пачки строк файла (выполняется в потоке), возвращает (строки, пропущено)
+def _read_batch(reader, parse, size):
+    batch, skipped = [], 0
+    for row in reader:
+        try:
+            batch.append(parse(row))
+        except (ValueError, TypeError, AttributeError):
+            skipped += 1
+        if len(batch) >= size:
+            break
+    return batch, skipped
+
+
+# Загрузка CSV-файла в таблицу kind (profiles или scores)
+async def import_csv(kind, path, batch_size=BATCH_SIZE):
+    table = TABLES[kind]
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    rows = skipped = 0
+
+    with open(path, newline='', encoding='utf-8-sig') as file:
+        reader = csv.DictReader(file)
+        missing = set(table.columns) - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f'missing columns: {", ".join(sorted(missing))}')
+
+        batch, bad = await loop.run_in_executor(None, _read_batch, reader, table.parse, batch_size)
+        while batch:
+            if kind == 'scores':
+                batch = await _canonical_subjects(batch)
+            # следующая пачка читается из файла, пока записывается текущая
+            writing = asyncio.ensure_future(_write_rows(kind, table, batch))
+            rows, skipped = rows + len(batch), skipped + bad
+            batch, bad = await loop.run_in_executor(None, _read_batch, reader, table.parse, batch_size)
+            await writing
+        skipped += bad
+
+    if kind == 'profiles':
+        # в кэше могут быть старые имена и ответы "не зарегистрирован"
+        user_cache.clear()
+    report = _report(rows, skipped, start)
+    logging.info(f'import {kind} from {path}: {report}')
+    return report
+
+
+# Выгрузка таблицы kind (profiles или scores) в CSV-файл
+async def export_csv(kind, path, size=EXPORT_CHUNK):
+    table = TABLES[kind]
+    start = time.perf_counter()
+    # дописываем накопленные в буфере баллы
+    await write_buffer.flush()
+
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(table.columns)
+        rows = await fetch_chunks(table.export, (), writer.writerows, size)
+
+    report = _report(rows, 0, start)
+    logging.info(f'export {kind} to {path}: {report}')
+    return report
+
+
+async def _main(args):
+    await db_start(score_history=not args.no_history)
+    try:
+        if args.action == 'import':
+            report = await import_csv(args.kind, args.path, args.batch_size)
+        else:
+            report = await export_csv(args.kind, args.path, args.batch_size)
+    finally:
+        await db_close()
+    print(f'{args.action} {args.kind}: {report["rows"]} rows, {report["skipped"]} skipped, '
+          f'{report["seconds"]:.2f} s, {report["rows_per_sec"]:.0f} rows/s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('action', choices=('import', 'export'))
+    parser.add_argument('kind', choices=tuple(TABLES))
+    parser.add_argument('path')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--no-history', action='store_true', help='не записывать баллы в score_history')
+    asyncio.run(_main(parser.parse_args()))
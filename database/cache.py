@@ -0,0 +1,67 @@
+"""
+Модуль реализует ограниченный по размеру кэш в памяти с временем жизни записей (TTL + LRU).
+
+Используется перед load_user: статус регистрации пользователя почти не меняется, поэтому
+RegistrationFilter и login_menu не обращаются к базе данных при каждом событии.
+
+Основные компоненты модуля:
+1. Класс TTLCache:
+   - get(key): возвращает значение или MISSING, если записи нет или она устарела.
+   - set(key, value, ttl): сохраняет значение, вытесняя самую давно использованную запись при переполнении.
+   - stats(): возвращает счетчики попаданий и промахов.
+"""
+
+import time
+from collections import OrderedDict
+
+# Признак отсутствия значения в кэше (None и пустой список - допустимые значения)
+MISSING = object()
+
+
+class TTLCache:
+    """Кэш с ограниченным размером и временем жизни записей.
+
+    Attributes:
+        maxsize (int): Максимальное количество записей.
+        ttl (float): Время жизни записи по умолчанию (в секундах).
+        hits (int): Количество попаданий.
+        misses (int): Количество промахов.
+    """
+
+    def __init__(self, maxsize=100_000, ttl=600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (время истечения, значение)
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return MISSING
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,116 @@
+"""
+Модуль хранилищ состояний FSM (машины состояний aiogram).
+
+По умолчанию состояния и данные анкет хранятся в той же базе SQLite, что и остальные данные бота,
+поэтому они переживают перезапуск контейнера и доступны всем процессам бота, работающим с этим файлом.
+Для нескольких хостов можно подключить Redis (или любой сервер с протоколом Redis).
+
+Незавершенные анкеты (FSMFillForm) не копятся бесконечно: у каждой записи есть время истечения,
+просроченные записи не читаются и периодически удаляются. Запись в просроченную, но еще не удаленную
+запись сбрасывает второе поле (set_state - данные, set_data - состояние), чтобы пользователь не вернулся
+в старый шаг анкеты со старыми данными.
+
+Основные компоненты модуля:
+1. Класс SQLiteStorage:
+   - Реализация BaseStorage поверх таблицы fsm_storage (см. database.migrations).
+2. Функция create_storage(fsm_config):
+   - Создает хранилище по настройкам (sqlite, redis или memory).
+"""
+
+import asyncio
+import json
+import logging
+import time
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
+from database.sqlite3 import execute, fetch_all
+
+# Запросы к таблице состояний
+SQL_UPSERT_STATE = ('INSERT INTO fsm_storage(key, state, data, expires_at) VALUES(?, ?, \'{}\', ?) '
+                    'ON CONFLICT(key) DO UPDATE SET state = excluded.state, expires_at = excluded.expires_at, '
+                    'data = CASE WHEN fsm_storage.expires_at <= ? THEN \'{}\' ELSE data END')
+SQL_UPSERT_DATA = ('INSERT INTO fsm_storage(key, state, data, expires_at) VALUES(?, NULL, ?, ?) '
+                   'ON CONFLICT(key) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at, '
+                   'state = CASE WHEN fsm_storage.expires_at <= ? THEN NULL ELSE state END')
+SQL_SELECT_STATE = 'SELECT state FROM fsm_storage WHERE key = ? AND expires_at > ?'
+SQL_SELECT_DATA = 'SELECT data FROM fsm_storage WHERE key = ? AND expires_at > ?'
+SQL_DELETE_EMPTY = 'DELETE FROM fsm_storage WHERE key = ? AND state IS NULL AND data = \'{}\''
+SQL_DELETE_EXPIRED = 'DELETE FROM fsm_storage WHERE expires_at <= ?'
+
+
+class SQLiteStorage(BaseStorage):
+    """Хранилище состояний FSM в базе SQLite.
+
+    Attributes:
+        ttl (float): Время жизни состояния и данных (в секундах) с момента последнего изменения.
+        cleanup_interval (float): Период удаления просроченных записей (в секундах).
+    """
+
+    def __init__(self, ttl=86400, cleanup_interval=600):
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self._cleanup_task = None
+
+    # Ключ записи в таблице
+    @staticmethod
+    def _key(key):
+        return ':'.join(str(part) for part in (key.bot_id, key.chat_id, key.user_id, key.thread_id,
+                                               key.business_connection_id, key.destiny))
+
+    # Фоновое удаление просроченных записей запускается при первой записи
+    def _ensure_cleanup(self):
+        if self._cleanup_task is None:
+            self._cleanup_task = asyncio.create_task(self._cleanup())
+
+    async def _cleanup(self):
+        while True:
+            await asyncio.sleep(self.cleanup_interval)
+            try:
+                await execute(SQL_DELETE_EXPIRED, (time.time(),))
+            except Exception:
+                logging.exception('fsm storage cleanup failed')
+
+    async def set_state(self, key, state=None):
+        self._ensure_cleanup()
+        state = state.state if isinstance(state, State) else state
+        now = time.time()
+        await execute(SQL_UPSERT_STATE, (self._key(key), state, now + self.ttl, now))
+        if state is None:
+            await execute(SQL_DELETE_EMPTY, (self._key(key),))
+
+    async def get_state(self, key):
+        rows = await fetch_all(SQL_SELECT_STATE, (self._key(key), time.time()))
+        return rows[0][0] if rows else None
+
+    async def set_data(self, key, data):
+        self._ensure_cleanup()
+        now = time.time()
+        await execute(SQL_UPSERT_DATA, (self._key(key), json.dumps(data, ensure_ascii=False), now + self.ttl, now))
+        if not data:
+            await execute(SQL_DELETE_EMPTY, (self._key(key),))
+
+    async def get_data(self, key):
+        rows = await fetch_all(SQL_SELECT_DATA, (self._key(key), time.time()))
+        return json.loads(rows[0][0]) if rows else {}
+
+    async def close(self):
+        if self._cleanup_task is not None:
+            self._cleanup_task.cancel()
+            self._cleanup_task = None
+
+
+# Создание хранилища FSM по настройкам из config_data.config.FsmStorage
+def create_storage(fsm_config):
+    if fsm_config.backend == 'sqlite':
+        return SQLiteStorage(ttl=fsm_config.ttl)
+
+    if fsm_config.backend == 'redis':
+        # redis - необязательная зависимость, нужна только для этого режима (pip install redis)
+        from aiogram.fsm.storage.redis import RedisStorage
+        return RedisStorage.from_url(fsm_config.redis_url, state_ttl=fsm_config.ttl, data_ttl=fsm_config.ttl)
+
+    if fsm_config.backend == 'memory':
+        return MemoryStorage()
+
+    raise ValueError(f'Неизвестное хранилище FSM: {fsm_config.backend}')
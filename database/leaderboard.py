@@ -0,0 +1,93 @@
+"""Модуль таблиц лидеров и статистики баллов по предметам.
+
+Статистика не пересчитывается по всей таблице educational_subjects при каждом запросе.
+Таблица subject_score_stats хранит, сколько пользователей набрали каждый балл по каждому предмету
+(не больше 101 строки на предмет, баллы от 0 до 100). Ее обновляют триггеры базы данных в той же
+транзакции, что и запись баллов (create_educational_subjects, database.bulk), см. миграцию 5.
+Поэтому место пользователя и перцентили считаются по нескольким строкам первичного ключа (O(log n)),
+а таблица лидеров предмета читается по индексу (name_subject, points_subject).
+
+Основные функции модуля:
+- top_users(name_subject, limit): лучшие пользователи по предмету.
+- subject_stats(name_subject): количество участников, средний балл, медиана и 90-й перцентиль.
+- user_ranks(user_id): место пользователя по каждому его предмету и доля участников с меньшим баллом.
+- popular_subjects(limit): предметы с наибольшим количеством участников.
+"""
+
+from database.sqlite3 import fetch_all, write_buffer
+
+# Сколько пользователей показывать в таблице лидеров
+TOP_LIMIT = 10
+
+SQL_TOP_USERS = ('SELECT profile.first_name, profile.last_name, educational_subjects.points_subject '
+                 'FROM educational_subjects LEFT JOIN profile USING(user_id) '
+                 'WHERE educational_subjects.name_subject = ? '
+                 'ORDER BY educational_subjects.points_subject DESC LIMIT ?')
+SQL_SUBJECT_HISTOGRAM = ('SELECT points_subject, cnt FROM subject_score_stats '
+                         'WHERE name_subject = ? ORDER BY points_subject')
+SQL_USER_RANKS = ('SELECT e.name_subject, e.points_subject, '
+                  'SUM(CASE WHEN s.points_subject > e.points_subject THEN s.cnt ELSE 0 END), '
+                  'SUM(CASE WHEN s.points_subject < e.points_subject THEN s.cnt ELSE 0 END), '
+                  'SUM(s.cnt) '
+                  'FROM educational_subjects AS e JOIN subject_score_stats AS s ON s.name_subject = e.name_subject '
+                  'WHERE e.user_id = ? GROUP BY e.id ORDER BY e.id')
+SQL_POPULAR_SUBJECTS = ('SELECT name_subject, SUM(cnt) AS total FROM subject_score_stats '
+                        'GROUP BY name_subject ORDER BY total DESC LIMIT ?')
+
+
+# Баллы из буфера записи должны попасть в статистику до чтения
+async def _flush():
+    await write_buffer.flush()
+
+
+# Наименьший балл, который набрали не меньше доли q участников (по гистограмме баллов)
+def _percentile(histogram, count, q):
+    accumulated = 0
+    for points, cnt in histogram:
+        accumulated += cnt
+        if accumulated >= q * count:
+            return points
+    return histogram[-1][0]
+
+
+# Лучшие пользователи по предмету: список (имя, фамилия, баллы)
+async def top_users(name_subject, limit=TOP_LIMIT):
+    await _flush()
+    return await fetch_all(SQL_TOP_USERS, (name_subject, limit))
+
+
+# Статистика предмета или None, если по предмету нет баллов
+async def subject_stats(name_subject):
+    await _flush()
+    histogram = await fetch_all(SQL_SUBJECT_HISTOGRAM, (name_subject,))
+    count = sum(cnt for _, cnt in histogram)
+    if not count:
+        return None
+    return {
+        'count': count,
+        'average': sum(points * cnt for points, cnt in histogram) / count,
+        'median': _percentile(histogram, count, 0.5),
+        'p90': _percentile(histogram, count, 0.9),
+    }
+
+
+# Место пользователя по каждому предмету: список словарей subject, points, rank, total, percentile
+async def user_ranks(user_id):
+    await _flush()
+    ranks = []
+    for name_subject, points, above, below, total in await fetch_all(SQL_USER_RANKS, (user_id,)):
+        ranks.append({
+            'subject': name_subject,
+            'points': points,
+            'rank': above + 1,
+            'total': total,
+            # доля остальных участников, набравших меньше баллов
+            'percentile': below / (total - 1) * 100 if total > 1 else 100.0,
+        })
+    return ranks
+
+
+# Предметы с наибольшим количеством участников: список (предмет, участников)
+async def popular_subjects(limit=TOP_LIMIT):
+    await _flush()
+    return await fetch_all(SQL_POPULAR_SUBJECTS, (limit,))
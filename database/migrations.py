@@ -0,0 +1,243 @@
+"""
+Модуль версионных миграций схемы базы данных.
+
+Текущая версия схемы хранится в заголовке файла базы (PRAGMA user_version).
+При запуске бота apply_migrations() применяет по порядку все миграции с номером больше текущей версии.
+Каждая миграция выполняется в отдельной транзакции вместе с записью нового номера версии,
+поэтому при ошибке база остается в предыдущей версии.
+
+Чтобы изменить схему, добавьте в конец списка MIGRATIONS новую пару (версия, шаги), где шаги -
+список SQL-запросов или функция, принимающая соединение.
+
+Миграции:
+1. Исходная схема: таблицы profile, educational_subjects, message_from_users.
+2. user_id хранится как INTEGER; у educational_subjects и message_from_users появляется первичный ключ;
+   индекс (user_id) для сообщений и уникальный индекс (user_id, name_subject) для предметов
+   (при переносе дубликатов предмета остается последняя запись).
+3. Таблица fsm_storage для хранения состояний FSM (database.fsm_storage.SQLiteStorage).
+4. Таблица media_files с file_id загруженных в Telegram файлов (services.media).
+5. Таблица subject_score_stats: сколько пользователей набрали каждый балл по каждому предмету
+   (database.leaderboard). Поддерживается триггерами на educational_subjects; индекс (name_subject, points_subject)
+   для таблицы лидеров предмета.
+6. Таблицы рассылок broadcasts и broadcast_deliveries (database.broadcasts): текст, статус и позиция
+   рассылки, статус доставки каждому пользователю.
+7. Справочник предметов subjects (database.subjects). Названия предметов в educational_subjects
+   приводятся к названиям справочника: совпадающие без учета регистра и опечатки в 1-2 буквы
+   в названиях предметов ЕГЭ объединяются (у пользователя остается последняя запись предмета).
+8. Таблица score_history: все введенные баллы пользователя по предмету с временем ввода
+   (в educational_subjects остается только последний балл), индекс (user_id, name_subject).
+9. В message_from_users дата сообщения хранится как время Unix (created_at INTEGER) вместо текста 'дд.мм.гггг',
+   индекс (created_at) для удаления и архивирования старых сообщений (services.maintenance).
+10. Таблица bot_state: служебные значения бота по ключу, например id последнего обработанного обновления
+   (database.bot_state).
+11. Полнотекстовый индекс FTS5 message_search по тексту и автору сообщений message_from_users (внешнее
+   содержимое - представление message_search_source, синхронизация триггерами на вставку, удаление и изменение),
+   заполняется из существующих сообщений (database.search).
+12. Таблица backup_runs: журнал резервных копий базы (время, длительность, блокировка, файл и контрольная сумма,
+   services.backup).
+13. В broadcasts владелец рассылки и срок его аренды (lease_owner, lease_until): незавершенную рассылку
+   продолжает только процесс, получивший аренду (database.broadcasts).
+14. В broadcasts флаг отмены cancel_requested: рассылку, идущую в другом процессе, отменяет ее владелец.
+"""
+
+import logging
+from database.subjects import DEFAULT_SUBJECTS, levenshtein, max_typos, normalize
+
+
+# Миграция 7: справочник предметов и объединение разных написаний одного предмета
+def _merge_subjects(conn):
+    conn.execute('CREATE TABLE subjects(id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)')
+    canonical = {normalize(name): name for name in DEFAULT_SUBJECTS}
+    default_keys = list(canonical)
+
+    # написания, которые уже есть в базе, самые частые первыми (они становятся названием предмета)
+    spellings = [name for name, in conn.execute(
+        'SELECT name_subject FROM educational_subjects GROUP BY name_subject ORDER BY COUNT(*) DESC')]
+    targets = {}
+    for name in spellings:
+        key = normalize(name)
+        if key not in canonical:
+            # опечатка в названии предмета ЕГЭ
+            typos = max_typos(key)
+            typo_of = [default for default in default_keys if levenshtein(key, default, typos) <= typos]
+            canonical[key] = canonical[typo_of[0]] if len(typo_of) == 1 else ' '.join(name.split())
+        targets[name] = canonical[key]
+
+    conn.executemany('INSERT OR IGNORE INTO subjects(name) VALUES(?)', [(name,) for name in canonical.values()])
+
+    for name, target in targets.items():
+        if name == target:
+            continue
+        # если у пользователя есть оба написания, остается более поздняя запись
+        for old, new in ((name, target), (target, name)):
+            conn.execute('DELETE FROM educational_subjects WHERE name_subject = ? AND EXISTS ('
+                         'SELECT 1 FROM educational_subjects AS other WHERE other.user_id = educational_subjects.user_id '
+                         'AND other.name_subject = ? AND other.id > educational_subjects.id)', (old, new))
+        conn.execute('UPDATE educational_subjects SET name_subject = ? WHERE name_subject = ?', (target, name))
+
+
+MIGRATIONS = [
+    (1, [
+        'CREATE TABLE IF NOT EXISTS profile(user_id TEXT PRIMARY KEY, first_name TEXT, last_name TEXT)',
+        'CREATE TABLE IF NOT EXISTS educational_subjects(user_id TEXT, name_subject TEXT, points_subject INTEGER)',
+        'CREATE TABLE IF NOT EXISTS message_from_users(user_id TEXT, message TEXT, day TEXT)',
+    ]),
+    (2, [
+        # Профили: user_id становится целым первичным ключом (alias rowid)
+        'CREATE TABLE profile_new(user_id INTEGER PRIMARY KEY, first_name TEXT, last_name TEXT)',
+        'INSERT OR IGNORE INTO profile_new(user_id, first_name, last_name) '
+        'SELECT CAST(user_id AS INTEGER), first_name, last_name FROM profile',
+        'DROP TABLE profile',
+        'ALTER TABLE profile_new RENAME TO profile',
+
+        # Предметы: одна запись на пару (пользователь, предмет)
+        'CREATE TABLE educational_subjects_new(id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, '
+        'name_subject TEXT NOT NULL, points_subject INTEGER NOT NULL)',
+        'CREATE UNIQUE INDEX idx_educational_subjects_user_subject '
+        'ON educational_subjects_new(user_id, name_subject)',
+        'INSERT INTO educational_subjects_new(user_id, name_subject, points_subject) '
+        'SELECT CAST(user_id AS INTEGER), name_subject, points_subject FROM educational_subjects '
+        'WHERE true ORDER BY rowid '
+        'ON CONFLICT(user_id, name_subject) DO UPDATE SET points_subject = excluded.points_subject',
+        'DROP TABLE educational_subjects',
+        'ALTER TABLE educational_subjects_new RENAME TO educational_subjects',
+
+        # Сообщения: первичный ключ и индекс по пользователю
+        'CREATE TABLE message_from_users_new(id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, '
+        'message TEXT, day TEXT)',
+        'INSERT INTO message_from_users_new(user_id, message, day) '
+        'SELECT CAST(user_id AS INTEGER), message, day FROM message_from_users ORDER BY rowid',
+        'DROP TABLE message_from_users',
+        'ALTER TABLE message_from_users_new RENAME TO message_from_users',
+        'CREATE INDEX idx_message_from_users_user_id ON message_from_users(user_id)',
+    ]),
+    (3, [
+        'CREATE TABLE fsm_storage(key TEXT PRIMARY KEY, state TEXT, data TEXT NOT NULL, expires_at REAL NOT NULL)',
+        'CREATE INDEX idx_fsm_storage_expires_at ON fsm_storage(expires_at)',
+    ]),
+    (4, [
+        'CREATE TABLE media_files(path TEXT PRIMARY KEY, file_id TEXT NOT NULL)',
+    ]),
+    (5, [
+        'CREATE TABLE subject_score_stats(name_subject TEXT NOT NULL, points_subject INTEGER NOT NULL, '
+        'cnt INTEGER NOT NULL, PRIMARY KEY(name_subject, points_subject)) WITHOUT ROWID',
+        'INSERT INTO subject_score_stats(name_subject, points_subject, cnt) '
+        'SELECT name_subject, points_subject, COUNT(*) FROM educational_subjects GROUP BY name_subject, points_subject',
+        'CREATE INDEX idx_educational_subjects_subject_points ON educational_subjects(name_subject, points_subject)',
+
+        # Счетчики меняются в той же транзакции, что и баллы пользователя
+        'CREATE TRIGGER educational_subjects_stats_insert AFTER INSERT ON educational_subjects BEGIN '
+        'INSERT INTO subject_score_stats(name_subject, points_subject, cnt) '
+        'VALUES(new.name_subject, new.points_subject, 1) '
+        'ON CONFLICT(name_subject, points_subject) DO UPDATE SET cnt = cnt + 1; '
+        'END',
+        'CREATE TRIGGER educational_subjects_stats_delete AFTER DELETE ON educational_subjects BEGIN '
+        'UPDATE subject_score_stats SET cnt = cnt - 1 '
+        'WHERE name_subject = old.name_subject AND points_subject = old.points_subject; '
+        'DELETE FROM subject_score_stats '
+        'WHERE name_subject = old.name_subject AND points_subject = old.points_subject AND cnt <= 0; '
+        'END',
+        'CREATE TRIGGER educational_subjects_stats_update AFTER UPDATE OF name_subject, points_subject '
+        'ON educational_subjects '
+        'WHEN old.name_subject IS NOT new.name_subject OR old.points_subject IS NOT new.points_subject BEGIN '
+        'UPDATE subject_score_stats SET cnt = cnt - 1 '
+        'WHERE name_subject = old.name_subject AND points_subject = old.points_subject; '
+        'DELETE FROM subject_score_stats '
+        'WHERE name_subject = old.name_subject AND points_subject = old.points_subject AND cnt <= 0; '
+        'INSERT INTO subject_score_stats(name_subject, points_subject, cnt) '
+        'VALUES(new.name_subject, new.points_subject, 1) '
+        'ON CONFLICT(name_subject, points_subject) DO UPDATE SET cnt = cnt + 1; '
+        'END',
+    ]),
+    (6, [
+        'CREATE TABLE broadcasts(id INTEGER PRIMARY KEY, admin_id INTEGER NOT NULL, text TEXT NOT NULL, '
+        'status TEXT NOT NULL, created_at REAL NOT NULL, last_user_id INTEGER NOT NULL DEFAULT 0, '
+        'sent INTEGER NOT NULL DEFAULT 0, failed INTEGER NOT NULL DEFAULT 0)',
+        'CREATE TABLE broadcast_deliveries(broadcast_id INTEGER NOT NULL, user_id INTEGER NOT NULL, '
+        'status TEXT NOT NULL, error TEXT, PRIMARY KEY(broadcast_id, user_id)) WITHOUT ROWID',
+    ]),
+    (7, _merge_subjects),
+    (8, [
+        'CREATE TABLE score_history(id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, name_subject TEXT NOT NULL, '
+        'points_subject INTEGER NOT NULL, created_at INTEGER NOT NULL)',
+        'CREATE INDEX idx_score_history_user_subject ON score_history(user_id, name_subject)',
+    ]),
+    (9, [
+        'CREATE TABLE message_from_users_new(id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, message TEXT, '
+        'created_at INTEGER NOT NULL)',
+        # 'дд.мм.гггг' -> 'гггг-мм-дд' -> время Unix начала дня (UTC)
+        "INSERT INTO message_from_users_new(id, user_id, message, created_at) "
+        "SELECT id, user_id, message, COALESCE(CAST(strftime('%s', substr(day, 7, 4) || '-' || substr(day, 4, 2) "
+        "|| '-' || substr(day, 1, 2)) AS INTEGER), 0) FROM message_from_users",
+        'DROP TABLE message_from_users',
+        'ALTER TABLE message_from_users_new RENAME TO message_from_users',
+        'CREATE INDEX idx_message_from_users_user_id ON message_from_users(user_id)',
+        'CREATE INDEX idx_message_from_users_created_at ON message_from_users(created_at)',
+    ]),
+    (10, [
+        'CREATE TABLE bot_state(key TEXT PRIMARY KEY, value INTEGER NOT NULL, updated_at INTEGER NOT NULL) '
+        'WITHOUT ROWID',
+    ]),
+    (11, [
+        # author - id пользователя словом 'u<id>', чтобы фильтр по пользователю выполнялся самим индексом
+        "CREATE VIEW message_search_source AS SELECT id, message, 'u' || user_id AS author FROM message_from_users",
+        "CREATE VIRTUAL TABLE message_search USING fts5(message, author, content='message_search_source', "
+        "content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        'CREATE TRIGGER message_search_insert AFTER INSERT ON message_from_users BEGIN '
+        "INSERT INTO message_search(rowid, message, author) VALUES (new.id, new.message, 'u' || new.user_id); END",
+        'CREATE TRIGGER message_search_delete AFTER DELETE ON message_from_users BEGIN '
+        "INSERT INTO message_search(message_search, rowid, message, author) "
+        "VALUES ('delete', old.id, old.message, 'u' || old.user_id); END",
+        'CREATE TRIGGER message_search_update AFTER UPDATE OF message, user_id ON message_from_users BEGIN '
+        "INSERT INTO message_search(message_search, rowid, message, author) "
+        "VALUES ('delete', old.id, old.message, 'u' || old.user_id); "
+        "INSERT INTO message_search(rowid, message, author) VALUES (new.id, new.message, 'u' || new.user_id); END",
+        "INSERT INTO message_search(message_search) VALUES ('rebuild')",
+    ]),
+    (12, [
+        'CREATE TABLE backup_runs(id INTEGER PRIMARY KEY, started_at INTEGER NOT NULL, status TEXT NOT NULL, '
+        'path TEXT, sha256 TEXT, bytes INTEGER, pages INTEGER, steps INTEGER, seconds REAL, '
+        'lock_seconds REAL, max_step_seconds REAL, error TEXT)',
+    ]),
+    (13, [
+        'ALTER TABLE broadcasts ADD COLUMN lease_owner TEXT',
+        'ALTER TABLE broadcasts ADD COLUMN lease_until INTEGER NOT NULL DEFAULT 0',
+    ]),
+    (14, [
+        'ALTER TABLE broadcasts ADD COLUMN cancel_requested INTEGER NOT NULL DEFAULT 0',
+    ]),
+]
+
+
+# Текущая версия схемы базы
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+# Применение всех миграций, которые еще не были применены
+def apply_migrations(conn, migrations=MIGRATIONS):
+    current = schema_version(conn)
+    for version, steps in migrations:
+        if version <= current:
+            continue
+
+        conn.execute('BEGIN IMMEDIATE')
+        # другой процесс (services.sharding) мог применить миграцию, пока мы ждали блокировку
+        if schema_version(conn) >= version:
+            conn.rollback()
+            current = version
+            continue
+        logging.info(f'apply db migration {version}')
+        try:
+            if callable(steps):
+                steps(conn)
+            else:
+                for sql in steps:
+                    conn.execute(sql)
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+        current = version
+    return current
@@ -0,0 +1,151 @@
+"""Модуль полнотекстового поиска по сообщениям пользователей (таблица message_from_users).
+
+В message_from_users попадают сообщения, на которые у бота нет команды (other_handlers.send_echo),
+поэтому по ним поддержка ищет запросы пользователей. Поиск LIKE '%...%' читает всю таблицу;
+вместо него используется индекс FTS5 message_search (миграция 11), который обновляется триггерами
+при вставке и удалении сообщений (в том числе при архивировании services.maintenance).
+
+Поиск:
+- слова запроса ищутся все сразу (AND), регистр и ё/е не важны; окончания не учитываются, поэтому
+  для поиска по началу слова используется *: "оплат*" найдет "оплата", "оплатить";
+- "фраза в кавычках" ищется как фраза; специальные символы FTS5 в словах экранируются;
+- результаты сортируются по релевантности (bm25), с фильтрами по пользователю и времени и постранично.
+
+Время запроса не зависит от размера таблицы:
+- фильтр по пользователю выполняется индексом (колонка author со словом 'u<id>'), а не проверкой каждой
+  найденной строки;
+- фильтр по времени переводится в границы id сообщения по индексу (created_at): id и created_at
+  растут вместе, поэтому индекс FTS5 читает только нужный диапазон; точное условие по created_at
+  проверяется дополнительно;
+- bm25 считается только для RANK_WINDOW последних совпадений: для частого слова (сотни тысяч совпадений)
+  сортировка всех совпадений по релевантности занимает сотни миллисекунд, а релевантные, но старые
+  сообщения поддержке обычно не нужны. Для редких слов окно вмещает все совпадения, и порядок не меняется;
+  страницы дальше RANK_WINDOW результатов пусты - запрос нужно уточнить фильтрами;
+- фрагменты (snippet) строятся только для строк страницы, отдельным запросом.
+
+Основные функции модуля:
+- fts_query(text): запрос FTS5 из текста пользователя.
+- search_messages(text, user_id, since, until, limit, offset): страница результатов и признак следующей страницы.
+
+Запуск из командной строки (из корня проекта):
+    python -m database.search "оплата курса" --user 123456 --since 2024-09-01 --page 2
+"""
+
+import argparse
+import asyncio
+import re
+import time
+from datetime import datetime
+from database.sqlite3 import db_close, db_start, fetch_all
+
+# Количество результатов на странице
+PAGE_SIZE = 10
+# Маркеры найденных слов во фрагменте сообщения (заменяются на <b></b> после экранирования HTML)
+MARK_START, MARK_END = '\x02', '\x03'
+
+# Сколько последних совпадений сортируется по релевантности
+RANK_WINDOW = 5000
+
+# Страница id: последние RANK_WINDOW совпадений с фильтрами, отсортированные по релевантности
+SQL_SEARCH_PAGE = ('SELECT id FROM (SELECT m.id, message_search.rank FROM message_search '
+                   'JOIN message_from_users AS m ON m.id = message_search.rowid '
+                   'WHERE message_search MATCH ?{filters} ORDER BY message_search.rowid DESC LIMIT ?) '
+                   'ORDER BY rank LIMIT ? OFFSET ?')
+# Границы id по времени (индекс по created_at)
+SQL_FIRST_ID = 'SELECT id FROM message_from_users WHERE created_at >= ? ORDER BY created_at, id LIMIT 1'
+SQL_LAST_ID = 'SELECT id FROM message_from_users WHERE created_at < ? ORDER BY created_at DESC, id DESC LIMIT 1'
+SQL_SNIPPETS = ('SELECT m.id, m.user_id, m.created_at, snippet(message_search, 0, ?, ?, \'…\', 16) '
+                'FROM message_search JOIN message_from_users AS m ON m.id = message_search.rowid '
+                'WHERE message_search MATCH ? AND message_search.rowid IN ({ids})')
+
+# Фраза в кавычках или слово (с * на конце - поиск по началу слова)
+_TOKENS = re.compile(r'"([^"]+)"|(\S+)')
+
+
+# Запрос FTS5 из текста пользователя: каждое слово и фраза в кавычках, чтобы символы FTS5 не ломали запрос
+def fts_query(text):
+    terms = []
+    for phrase, word in _TOKENS.findall(text):
+        if phrase:
+            term, prefix = phrase, False
+        else:
+            term, prefix = word.rstrip('*'), word.endswith('*')
+        if term.strip():
+            terms.append('"' + term.replace('"', '""') + '"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+
+# Поиск сообщений, возвращает (список (id, user_id, created_at, фрагмент), есть ли следующая страница)
+async def search_messages(text, user_id=None, since=None, until=None, limit=PAGE_SIZE, offset=0):
+    query = fts_query(text)
+    if not query:
+        return [], False
+    query = f'message : ({query})'
+    if user_id is not None:
+        query += f' AND author : "u{int(user_id)}"'
+
+    filters, params = [], [query]
+    if since is not None:
+        first = await fetch_all(SQL_FIRST_ID, (since,))
+        if not first:
+            return [], False
+        filters.append(' AND message_search.rowid >= ? AND m.created_at >= ?')
+        params += [first[0][0], since]
+    if until is not None:
+        last = await fetch_all(SQL_LAST_ID, (until,))
+        if not last:
+            return [], False
+        filters.append(' AND message_search.rowid <= ? AND m.created_at < ?')
+        params += [last[0][0], until]
+    # одна строка сверх страницы показывает, есть ли следующая страница
+    params += [RANK_WINDOW, limit + 1, offset]
+    ids = [row[0] for row in await fetch_all(SQL_SEARCH_PAGE.format(filters=''.join(filters)), params)]
+    page = ids[:limit]
+    if not page:
+        return [], False
+
+    rows = await fetch_all(SQL_SNIPPETS.format(ids=', '.join('?' * len(page))), [MARK_START, MARK_END, query] + page)
+    order = {message_id: index for index, message_id in enumerate(page)}
+    rows.sort(key=lambda row: order[row[0]])
+    return rows, len(ids) > limit
+
+
+# Дата 'гггг-мм-дд' или 'дд.мм.гггг' в начало дня (время Unix, местное время)
+def parse_date(text):
+    for date_format in ('%Y-%m-%d', '%d.%m.%Y'):
+        try:
+            return int(datetime.strptime(text, date_format).timestamp())
+        except ValueError:
+            pass
+    raise ValueError(f'bad date: {text}')
+
+
+async def _main(args):
+    await db_start()
+    try:
+        start = time.perf_counter()
+        rows, more = await search_messages(
+            args.query, args.user,
+            parse_date(args.since) if args.since else None,
+            parse_date(args.until) + 86400 if args.until else None,
+            args.limit, (args.page - 1) * args.limit,
+        )
+        seconds = time.perf_counter() - start
+    finally:
+        await db_close()
+    for message_id, user_id, created_at, snippet in rows:
+        snippet = snippet.replace(MARK_START, '[').replace(MARK_END, ']')
+        print(f'#{message_id} {datetime.fromtimestamp(created_at):%d.%m.%Y %H:%M} user {user_id}: {snippet}')
+    print(f'page {args.page}: {len(rows)} results{", more on the next page" if more else ""}, '
+          f'{seconds * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('query')
+    parser.add_argument('--user', type=int, default=None)
+    parser.add_argument('--since', default=None, help='дата гггг-мм-дд или дд.мм.гггг (включительно)')
+    parser.add_argument('--until', default=None, help='дата гггг-мм-дд или дд.мм.гггг (включительно)')
+    parser.add_argument('--page', type=int, default=1)
+    parser.add_argument('--limit', type=int, default=PAGE_SIZE)
+    asyncio.run(_main(parser.parse_args()))
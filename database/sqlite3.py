@@ -1,97 +1,400 @@
-""" 
-Модуль представляет собой набор функций для управления базой данных SQLite, используемой ботом. 
-Основные задачи этого модуля включают создание таблиц, запись и извлечение данных о пользователях, 
+"""
+Модуль представляет собой набор функций для управления базой данных SQLite, используемой ботом.
+Основные задачи этого модуля включают создание таблиц, запись и извлечение данных о пользователях,
 их образовательных предметах и сообщениях, отправленных боту.
 
+Стандартный sqlite3 блокирующий, поэтому все запросы выполняются вне цикла событий aiogram:
+- запись идет через один поток-писатель (ThreadPoolExecutor с одним потоком), т.к. SQLite
+  допускает только одного писателя одновременно;
+- чтение идет через пул потоков-читателей, у каждого потока свое соединение.
+База работает в режиме WAL, поэтому читатели не блокируют писателя и наоборот.
+Каждый запрос выполняется своим курсором (conn.execute), общего глобального курсора нет.
+Вставки в educational_subjects и message_from_users идут через буфер записи (WriteBuffer)
+и записываются пачками в одной транзакции. Профиль пользователя записывается сразу,
+т.к. login_menu читает его сразу после регистрации.
+Результаты load_user кэшируются в памяти (user_cache): зарегистрированные пользователи
+на USER_CACHE_TTL секунд, отсутствующие - на USER_CACHE_NEGATIVE_TTL секунд.
+create_profile сразу записывает новый профиль в кэш.
+Все запросы параметризованы (плейсхолдеры ?) и заданы константами модуля, поэтому SQLite
+не разбирает их заново при каждом вызове (кэш подготовленных запросов соединения),
+а кавычки в тексте пользователя не ломают запрос.
+Время каждого вызова функций модуля пишется в метрику bot_db_seconds (services.metrics).
+
 ### Основные функции модуля:
-1. db_start():
-   - Устанавливает соединение с базой данных db_bota.db.
-   - Создает курсор для выполнения SQL-запросов.
-   - Проверяет наличие и создает три таблицы:
+1. db_start(score_history=False):
+   - Запускает потоки для работы с базой данных db_bota.db.
+   - score_history: записывать ли каждый ввод баллов в таблицу score_history (score_history_enabled()).
+   - Применяет миграции схемы (database.migrations), в результате в базе есть три таблицы:
      - profile: содержит информацию о зарегистрированных пользователях (ID, имя, фамилия).
      - educational_subjects: содержит данные об учебных предметах и набранных баллах пользователями.
-     - message_from_users: сохраняет сообщения от пользователей вместе с датой отправки.
+     - message_from_users: сохраняет сообщения от пользователей вместе со временем отправки (created_at).
+
+2. db_close():
+   - Сбрасывает буфер записи, дожидается завершения запросов, останавливает потоки и закрывает соединения.
 
-2. create_profile(date_profile, user_id):
+3. create_profile(date_profile, user_id):
    - Добавляет нового пользователя в таблицу profile, используя переданные параметры (user_id, first_name, last_name).
 
-3. load_user(user_id):
-   - Извлекает данные пользователя по его ID из таблицы profile и возвращает их в виде списка.
+4. load_user(user_id):
+   - Извлекает данные пользователя по его ID из кэша или таблицы profile и возвращает их в виде списка.
 
-4. update_educational_subjects(data_subject, user_id):
-   - Обновляет или добавляет информацию о предмете и баллах пользователя в таблице educational_subjects.
+5. create_educational_subjects(data_subject, user_id):
+   - Добавляет или обновляет информацию о предмете и баллах пользователя в таблице educational_subjects
+     (upsert: на пару пользователь-предмет одна строка с последним баллом).
+   - Если включена история баллов, добавляет попытку в таблицу score_history.
 
-5. load_educational_subjects(user_id):
+6. load_educational_subjects(user_id):
    - Загружает данные об учебных предметах и баллах конкретного пользователя из таблицы educational_subjects и возвращает их в виде списка.
 
-6. update_message(message, user_id):
-   - Сохраняет сообщение от пользователя в таблицу message_from_users вместе с текущей датой.
+7. create_message(message, user_id):
+   - Сохраняет сообщение от пользователя в таблицу message_from_users вместе с текущим временем (Unix).
+
+8. load_media_file_id(path), save_media_file_id(path, file_id), delete_media_file_id(path):
+   - Читают, сохраняют и удаляют file_id загруженного в Telegram файла в таблице media_files.
+
+9. execute(sql, params) и fetch_all(sql, params):
+   - Выполняют произвольный запрос через поток-писатель или пул читателей (для других модулей пакета database).
+   - execute_batch(batch) выполняет несколько запросов {sql: [params, ...]} в одной транзакции.
+
+10. add_subject(name) и get_subject(subject_id):
+   - Добавляет новый предмет в справочник subjects и в справочник в памяти subject_catalog
+     (database.subjects.SubjectCatalog, загружается в db_start()) и возвращает id строки предмета.
+   - Возвращает название предмета по id; предмет, добавленный другим процессом бота, читается из базы.
+
+11. load_score_history(user_id, name_subject, limit):
+   - Загружает последние попытки пользователя по предмету (баллы и время ввода) из таблицы score_history.
+
+12. execute_many(sql, rows) и fetch_chunks(sql, params, consumer, size):
+   - Пачка строк одним запросом в одной транзакции и чтение результата частями курсором без загрузки
+     всей таблицы в память (для database.bulk).
+
+13. execute_script(sql):
+   - Выполняет запросы через поток-писатель до конца (нужно для PRAGMA incremental_vacuum и VACUUM,
+     services.maintenance).
 """
 
+import asyncio
 import sqlite3 as sq
-from datetime import date
-
-# Запуск базы данных 
-async def db_start():
-    global db, cur
-    
-    # создем экземпляр базы даных с названием файла, где она будет храниться
-    db = sq.connect('db_bota.db')
-    cur = db.cursor()
-    
-    # Создаем таблицу данных пользователей 
-    cur.execute('CREATE TABLE IF NOT EXISTS profile(user_id TEXT PRIMARY KEY, first_name TEXT, last_name TEXT)')
-    
-    # Создаем таблицу данных по предметам ЕГЭ и баллам
-    cur.execute('CREATE TABLE IF NOT EXISTS educational_subjects(user_id TEXT, name_subject TEXT, points_subject INTEGER)')
-    
-    # Создаем таблицу данных по написанным боту сообщениям для обработки, что не покрывает основной функционал
-    cur.execute('CREATE TABLE IF NOT EXISTS message_from_users(user_id TEXT, message TEXT, day TEXT)')
-    
-    db.commit()
-
-     
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from database.cache import MISSING, TTLCache
+from database.migrations import apply_migrations
+from database.subjects import SubjectCatalog
+from database.write_buffer import WriteBuffer
+from services.metrics import db_seconds
+
+# Файл базы данных и количество потоков-читателей
+DB_NAME = 'db_bota.db'
+READ_WORKERS = 4
+
+# Размер кэша профилей и время жизни записей (в секундах) для найденных и ненайденных пользователей
+USER_CACHE_SIZE = 100_000
+USER_CACHE_TTL = 3600
+USER_CACHE_NEGATIVE_TTL = 30
+
+# Запросы к базе данных
+SQL_INSERT_PROFILE = 'INSERT INTO profile(user_id, first_name, last_name) VALUES(?, ?, ?)'
+SQL_SELECT_PROFILE = 'SELECT user_id, first_name, last_name FROM profile WHERE user_id = ?'
+SQL_UPSERT_SUBJECT = ('INSERT INTO educational_subjects(user_id, name_subject, points_subject) VALUES(?, ?, ?) '
+                      'ON CONFLICT(user_id, name_subject) DO UPDATE SET points_subject = excluded.points_subject')
+SQL_SELECT_SUBJECTS = ('SELECT user_id, name_subject, points_subject FROM educational_subjects '
+                       'WHERE user_id = ? ORDER BY id')
+SQL_INSERT_MESSAGE = 'INSERT INTO message_from_users(user_id, message, created_at) VALUES(?, ?, ?)'
+SQL_SELECT_MEDIA = 'SELECT file_id FROM media_files WHERE path = ?'
+SQL_UPSERT_MEDIA = ('INSERT INTO media_files(path, file_id) VALUES(?, ?) '
+                    'ON CONFLICT(path) DO UPDATE SET file_id = excluded.file_id')
+SQL_DELETE_MEDIA = 'DELETE FROM media_files WHERE path = ?'
+SQL_INSERT_HISTORY = ('INSERT INTO score_history(user_id, name_subject, points_subject, created_at) '
+                      'VALUES(?, ?, ?, ?)')
+SQL_SELECT_HISTORY = ('SELECT points_subject, created_at FROM score_history '
+                      'WHERE user_id = ? AND name_subject = ? ORDER BY id DESC LIMIT ?')
+SQL_SELECT_SUBJECT_NAMES = 'SELECT id, name FROM subjects ORDER BY id'
+SQL_SELECT_SUBJECT = 'SELECT id, name FROM subjects WHERE id = ?'
+SQL_SELECT_SUBJECT_ID = 'SELECT id FROM subjects WHERE name = ?'
+SQL_INSERT_SUBJECT_NAME = 'INSERT OR IGNORE INTO subjects(name) VALUES(?)'
+
+_writer = None                  # однопоточный исполнитель для записи
+_readers = None                 # пул потоков для чтения
+_local = threading.local()      # соединение текущего потока
+_connections = []               # все открытые соединения, чтобы закрыть их в db_close()
+_connections_lock = threading.Lock()
+_score_history = False          # записывать ли историю баллов (db_start)
+
+
+# Замер времени вызова функции модуля (метка - имя функции)
+def _timed(func):
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        with db_seconds.time(func.__name__):
+            return await func(*args, **kwargs)
+    return wrapper
+
+
+# Соединение для текущего потока (создается при первом обращении)
+def _connect():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sq.connect(DB_NAME, timeout=30, check_same_thread=False, cached_statements=256)
+        # новые базы создаются с возможностью постепенного освобождения места (services.maintenance)
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        _local.conn = conn
+        with _connections_lock:
+            _connections.append(conn)
+    return conn
+
+
+# Выполняется в потоке-писателе: один запрос в отдельной транзакции, возвращает id вставленной строки
+def _execute_write(sql, params=()):
+    conn = _connect()
+    with conn:
+        return conn.execute(sql, params).lastrowid
+
+
+# Выполняется в потоке-писателе: пачка вставок {sql: [params, ...]} в одной транзакции
+def _execute_batch(batch):
+    conn = _connect()
+    with conn:
+        for sql, rows in batch.items():
+            conn.executemany(sql, rows)
+
+
+# Выполняется в потоке-читателе: возвращает все строки запроса
+def _fetch_all(sql, params=()):
+    return _connect().execute(sql, params).fetchall()
+
+
+# Выполняется в потоке-писателе: один запрос для всех строк в одной транзакции
+def _execute_many(sql, rows):
+    conn = _connect()
+    with conn:
+        conn.executemany(sql, rows)
+
+
+# Выполняется в потоке-писателе: запросы через sqlite3_exec, каждый выполняется полностью
+def _execute_script(sql):
+    _connect().executescript(sql)
+
+
+# Выполняется в потоке-читателе: передает строки запроса в consumer частями по size, возвращает их количество
+def _fetch_chunks(sql, params, consumer, size):
+    cursor = _connect().execute(sql, params)
+    count = 0
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return count
+        consumer(rows)
+        count += len(rows)
+
+
+# Создание и обновление таблиц (выполняется в потоке-писателе)
+def _migrate():
+    apply_migrations(_connect())
+
+
+# Передача функции в поток-писатель без блокировки цикла событий
+async def _write(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_writer, func, *args)
+
+
+# Передача функции в пул потоков-читателей без блокировки цикла событий
+async def _read(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_readers, func, *args)
+
+
+# Буфер группированной записи для вставок предметов и сообщений
+@_timed
+async def _write_batch(batch):
+    await _write(_execute_batch, batch)
+
+write_buffer = WriteBuffer(_write_batch)
+
+# Кэш результатов load_user по id пользователя
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# Справочник предметов в памяти (названия из таблицы subjects)
+subject_catalog = SubjectCatalog()
+
+
+# Запуск базы данных
+async def db_start(score_history=False):
+    global _writer, _readers, _score_history
+
+    _score_history = score_history
+    _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+    _readers = ThreadPoolExecutor(max_workers=READ_WORKERS, thread_name_prefix='db-reader')
+    await _write(_migrate)
+    subject_catalog.load(await _read(_fetch_all, SQL_SELECT_SUBJECT_NAMES))
+
+
+# Остановка базы данных: ждем выполнения запросов и закрываем соединения
+async def db_close():
+    global _writer, _readers
+
+    if _writer is not None:
+        await write_buffer.flush()
+
+    for executor in (_writer, _readers):
+        if executor is not None:
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+    _writer = _readers = None
+
+    with _connections_lock:
+        for conn in _connections:
+            conn.close()
+        _connections.clear()
+
+
+# Запрос на запись для других модулей пакета database (выполняется сразу, без буфера), возвращает lastrowid
+@_timed
+async def execute(sql, params=()):
+    return await _write(_execute_write, sql, params)
+
+
+# Запрос на чтение для других модулей пакета database
+@_timed
+async def fetch_all(sql, params=()):
+    return await _read(_fetch_all, sql, params)
+
+
+# Запрос на запись для пачки строк (одна транзакция)
+@_timed
+async def execute_many(sql, rows):
+    await _write(_execute_many, sql, rows)
+
+
+# Запросы к нескольким таблицам {sql: [params, ...]} в одной транзакции
+@_timed
+async def execute_batch(batch):
+    await _write(_execute_batch, batch)
+
+
+# Включена ли история баллов (db_start(score_history=True))
+def score_history_enabled():
+    return _score_history
+
+
+# Запросы обслуживания базы (PRAGMA, VACUUM) через поток-писатель
+@_timed
+async def execute_script(sql):
+    await _write(_execute_script, sql)
+
+
+# Чтение результата запроса частями: consumer(rows) вызывается в потоке-читателе
+@_timed
+async def fetch_chunks(sql, params, consumer, size=1000):
+    return await _read(_fetch_chunks, sql, params, consumer, size)
+
+
 # Заполнение таблицы profile после регистрации пользвателя с сохранением его данных
+@_timed
 async def create_profile(date_profile, user_id):
-    cur.execute("INSERT INTO profile VALUES('{}', '{}', '{}')".format(user_id, 
-                date_profile['first_name'], date_profile['last_name']))
-   
-    db.commit()
+    profile = (user_id, date_profile['first_name'], date_profile['last_name'])
+    await _write(_execute_write, SQL_INSERT_PROFILE, profile)
+
+    # обновляем кэш, чтобы не выдавать устаревший ответ "не зарегистрирован"
+    user_cache.set(user_id, [profile])
 
 
 # Выгрузка данных пользователя из базы данных
+@_timed
 async def load_user(user_id):
+    loads = user_cache.get(user_id)
+    if loads is not MISSING:
+        return list(loads)
+
     # выгружаем данные пользователя по id
-    load_user_bd = cur.execute("SELECT * FROM profile WHERE user_id == '{}' ".format(user_id)).fetchall()
-    
-    loads = [] # возвращаем данные из БД в виде списка
-    for user in load_user_bd:
-        loads.append(user)
-    db.commit()
-    return loads
-    
+    loads = await _read(_fetch_all, SQL_SELECT_PROFILE, (user_id,))
+    user_cache.set(user_id, loads, None if loads else USER_CACHE_NEGATIVE_TTL)
+
+    # возвращаем данные из БД в виде списка
+    return list(loads)
+
 
 # Заполнение таблицы educational_subjects после отправки боту данных по предмету
+@_timed
 async def create_educational_subjects(data_subject, user_id):
-    cur.execute("INSERT INTO educational_subjects VALUES('{}', '{}', '{}')".format(user_id, 
-                data_subject['name_subject'], data_subject['points_subject']))
-    db.commit()
+    await write_buffer.add(SQL_UPSERT_SUBJECT,
+                           (user_id, data_subject['name_subject'], data_subject['points_subject']))
+    if _score_history:
+        await write_buffer.add(SQL_INSERT_HISTORY, (user_id, data_subject['name_subject'],
+                                                    data_subject['points_subject'], int(time.time())))
 
 
 # Выгрузка данных по предмета по id пользователя
+@_timed
 async def load_educational_subjects(user_id):
-    load_educational_subjects_bd = cur.execute("SELECT * FROM educational_subjects WHERE user_id == '{}' ".format(user_id)).fetchall()
-    
-    loads = [] # возвращаем данные из БД в виде списка
-    for educational in load_educational_subjects_bd:
-        loads.append(educational)
-    db.commit()
-    return loads
- 
-    
+    # дописываем накопленные предметы, чтобы пользователь увидел только что введенные баллы
+    await write_buffer.flush()
+
+    load_educational_subjects_bd = await _read(_fetch_all, SQL_SELECT_SUBJECTS, (user_id,))
+
+    # возвращаем данные из БД в виде списка
+    return list(load_educational_subjects_bd)
+
+
 # Заполнение таблицы message_from_users после отправки боту сообщения
+@_timed
 async def create_message(message, user_id):
-    today = date.today().strftime("%d.%m.%Y")     # создаем переменню и записываем дату сообщения
-    cur.execute("INSERT INTO message_from_users VALUES('{}', '{}', '{}')".format(user_id, message, today))
-    db.commit()
-    
\ No newline at end of file
+    await write_buffer.add(SQL_INSERT_MESSAGE, (user_id, message, int(time.time())))
+
+
+# Выгрузка file_id загруженного в Telegram файла (None, если файл еще не загружался)
+@_timed
+async def load_media_file_id(path):
+    rows = await _read(_fetch_all, SQL_SELECT_MEDIA, (path,))
+    return rows[0][0] if rows else None
+
+
+# Сохранение file_id файла после загрузки в Telegram
+@_timed
+async def save_media_file_id(path, file_id):
+    await _write(_execute_write, SQL_UPSERT_MEDIA, (path, file_id))
+
+
+# Удаление file_id, который Telegram больше не принимает
+@_timed
+async def delete_media_file_id(path):
+    await _write(_execute_write, SQL_DELETE_MEDIA, (path,))
+
+
+# Выполняется в потоке-писателе: добавление предмета (если его еще нет), возвращает id строки
+def _insert_subject(name):
+    conn = _connect()
+    with conn:
+        conn.execute(SQL_INSERT_SUBJECT_NAME, (name,))
+        return conn.execute(SQL_SELECT_SUBJECT_ID, (name,)).fetchone()[0]
+
+
+# Добавление нового предмета в справочник, возвращает id строки предмета
+@_timed
+async def add_subject(name):
+    subject_id = subject_catalog.match_id(name)
+    if subject_id is not None:
+        return subject_id
+    name = ' '.join(name.split())
+    return subject_catalog.add(await _write(_insert_subject, name), name)
+
+
+# Название предмета по id строки или None (например, для кнопки с удаленным предметом)
+@_timed
+async def get_subject(subject_id):
+    name = subject_catalog.get(subject_id)
+    if name is None:
+        # предмет мог добавить другой процесс бота (services.sharding)
+        for subject_id, name in await _read(_fetch_all, SQL_SELECT_SUBJECT, (subject_id,)):
+            subject_catalog.add(subject_id, name)
+    return name
+
+
+# Выгрузка последних попыток пользователя по предмету: список (баллы, время ввода)
+@_timed
+async def load_score_history(user_id, name_subject, limit=10):
+    await write_buffer.flush()
+    return await _read(_fetch_all, SQL_SELECT_HISTORY, (user_id, name_subject, limit))
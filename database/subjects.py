@@ -0,0 +1,127 @@
+"""Модуль справочника учебных предметов с быстрым поиском по названию.
+
+Названия предметов, которые вводят пользователи ("Математика", "математика", "Матиматика"),
+приводятся к одному названию из справочника, чтобы баллы по предмету не разделялись на несколько предметов.
+
+Справочник хранится в таблице subjects (миграция 7) и при запуске бота загружается в память
+(database.sqlite3.subject_catalog) вместе с id строк: id предмета не меняется между перезапусками
+и одинаков во всех процессах бота, поэтому используется в callback_data кнопок. Поиск:
+- точное совпадение по нормализованному ключу (регистр, ё/е, лишние пробелы) - поиск в словаре;
+- похожие названия для подсказок - кандидаты по общим триграммам, затем сортировка по расстоянию Левенштейна.
+
+Модуль не обращается к базе данных, поэтому используется и в миграциях.
+
+Основные компоненты модуля:
+- DEFAULT_SUBJECTS: предметы ЕГЭ, с которыми создается справочник.
+- normalize(name): ключ названия для сравнения.
+- levenshtein(a, b, limit): расстояние редактирования между строками.
+- SubjectCatalog: справочник в памяти с методами match, suggest, get и add.
+"""
+
+from collections import defaultdict
+
+DEFAULT_SUBJECTS = (
+    'Математика', 'Русский язык', 'Физика', 'Химия', 'Информатика', 'Биология', 'История', 'География',
+    'Обществознание', 'Литература', 'Английский язык', 'Немецкий язык', 'Французский язык',
+    'Испанский язык', 'Китайский язык',
+)
+
+# Сколько кандидатов по триграммам проверять расстоянием Левенштейна
+SUGGEST_CANDIDATES = 10
+
+
+# Ключ для сравнения названий: без учета регистра, ё как е, одиночные пробелы
+def normalize(name):
+    return ' '.join(name.split()).casefold().replace('ё', 'е')
+
+
+# Триграммы ключа с пробелами по краям (короткие названия тоже дают несколько триграмм)
+def _trigrams(key):
+    padded = f' {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Расстояние Левенштейна; если оно больше limit, возвращается limit + 1
+def levenshtein(a, b, limit=None):
+    if limit is not None and abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+# Максимальное расстояние, при котором название считается опечаткой
+def max_typos(key):
+    return 1 if len(key) < 6 else 2 if len(key) < 12 else 3
+
+
+class SubjectCatalog:
+    """Справочник предметов в памяти.
+
+    Предметы хранятся по id строки таблицы subjects.
+    """
+
+    def __init__(self, rows=()):
+        self.load(rows)
+
+    # Загрузка справочника из строк (id, название)
+    def load(self, rows):
+        self._names = {}                        # id -> название
+        self._keys = {}                         # ключ -> id
+        self._trigrams = defaultdict(list)      # триграмма -> id названий
+        for subject_id, name in rows:
+            self.add(subject_id, name)
+
+    def __len__(self):
+        return len(self._names)
+
+    # Добавление названия с id строки, возвращает id (или id уже существующего названия)
+    def add(self, subject_id, name):
+        key = normalize(name)
+        existing = self._keys.get(key)
+        if existing is not None:
+            return existing
+        self._keys[key] = subject_id
+        self._names[subject_id] = ' '.join(name.split())
+        for trigram in _trigrams(key):
+            self._trigrams[trigram].append(subject_id)
+        return subject_id
+
+    # Название предмета по id или None
+    def get(self, subject_id):
+        return self._names.get(subject_id)
+
+    # Название из справочника для введенного текста или None
+    def match(self, text):
+        subject_id = self._keys.get(normalize(text))
+        return None if subject_id is None else self._names[subject_id]
+
+    # id предмета для введенного текста или None
+    def match_id(self, text):
+        return self._keys.get(normalize(text))
+
+    # Похожие названия: список (id, название), самые близкие первыми
+    def suggest(self, text, limit=3):
+        key = normalize(text)
+        shared = defaultdict(int)
+        for trigram in _trigrams(key):
+            for subject_id in self._trigrams.get(trigram, ()):
+                shared[subject_id] += 1
+        candidates = sorted(shared, key=shared.get, reverse=True)[:SUGGEST_CANDIDATES]
+
+        typos = max_typos(key)
+        scored = []
+        for subject_id in candidates:
+            candidate = normalize(self._names[subject_id])
+            distance = levenshtein(key, candidate, typos)
+            # опечатка или начало названия ("англ" -> "Английский язык")
+            if distance <= typos or (len(key) >= 3 and candidate.startswith(key)):
+                scored.append((distance, subject_id))
+        scored.sort()
+        return [(subject_id, self._names[subject_id]) for _, subject_id in scored[:limit]]
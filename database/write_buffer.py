@@ -0,0 +1,142 @@
+"""
+Модуль реализует буфер записи (group commit) для массовых вставок в базу данных.
+
+Вместо отдельной транзакции и fsync на каждую строку вставки копятся в памяти и записываются
+пачкой через executemany в одной транзакции. Сброс буфера происходит:
+- при накоплении flush_rows строк;
+- через flush_interval секунд после первой строки в буфере;
+- явно, через метод flush() (например, при остановке бота).
+
+Сбросы выполняются по одному (asyncio.Lock): flush() дожидается и пачки, которая уже записывается
+(например, сброса по таймеру), поэтому после flush() в базе есть все строки, добавленные до вызова.
+Если пачка не записалась, она записывается еще раз через RETRY_DELAY секунд (например, база была
+временно заблокирована), а при повторной ошибке - по одной строке: теряются только строки,
+которые не записываются сами по себе (счетчик failed_rows). Следующая пачка ждет окончания повторов,
+поэтому старая пачка не перезаписывает более новые значения тех же строк (upsert).
+
+Основные компоненты модуля:
+1. Класс WriteBuffer:
+   - add(sql, params): добавляет строку в буфер.
+   - flush(): записывает все накопленные строки одной транзакцией и дожидается уже начатой записи.
+   - stats(): возвращает счетчики глубины очереди и времени сброса.
+"""
+
+import asyncio
+import logging
+import time
+
+# Пауза перед повторной записью пачки после ошибки (в секундах)
+RETRY_DELAY = 0.1
+
+
+class WriteBuffer:
+    """Буфер вставок с групповой фиксацией транзакции.
+
+    Attributes:
+        flush_rows (int): Количество строк, при котором буфер сбрасывается сразу.
+        flush_interval (float): Максимальное время (в секундах) ожидания строки в буфере.
+        flush_count (int): Количество выполненных сбросов.
+        flushed_rows (int): Количество записанных строк.
+        failed_rows (int): Количество строк, которые не удалось записать.
+        last_flush_seconds (float): Длительность последнего сброса.
+        max_flush_seconds (float): Максимальная длительность сброса.
+        total_flush_seconds (float): Суммарная длительность всех сбросов.
+    """
+
+    def __init__(self, write_batch, flush_rows=500, flush_interval=0.2):
+        # write_batch - корутина, принимающая словарь {sql: [params, ...]} и записывающая его в одной транзакции
+        self._write_batch = write_batch
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+
+        self._pending = {}
+        self._depth = 0
+        self._timer = None
+        self._lock = None       # создается в цикле событий (буфер создается при импорте модуля)
+
+        self.flush_count = 0
+        self.flushed_rows = 0
+        self.failed_rows = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    @property
+    def queue_depth(self):
+        return self._depth
+
+    # Добавление строки в буфер
+    async def add(self, sql, params):
+        self._pending.setdefault(sql, []).append(params)
+        self._depth += 1
+
+        if self._depth >= self.flush_rows:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.flush_interval, self._on_timer)
+
+    # Срабатывание таймера: сброс выполняется в отдельной задаче
+    def _on_timer(self):
+        self._timer = None
+        asyncio.ensure_future(self.flush())
+
+    # Запись всех накопленных строк одной транзакцией; сбросы идут по одному, чтобы сохранить порядок записи
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, rows = self._pending, self._depth
+            self._pending, self._depth = {}, 0
+
+            start = time.perf_counter()
+            failed = await self._write(batch, rows)
+
+        duration = time.perf_counter() - start
+        self.flush_count += 1
+        self.flushed_rows += rows - failed
+        self.failed_rows += failed
+        self.last_flush_seconds = duration
+        self.max_flush_seconds = max(self.max_flush_seconds, duration)
+        self.total_flush_seconds += duration
+
+    # Запись пачки: повтор после паузы, затем по одной строке; возвращает количество незаписанных строк
+    async def _write(self, batch, rows):
+        try:
+            await self._write_batch(batch)
+            return 0
+        except Exception:
+            logging.exception(f'write buffer flush failed, retrying {rows} rows')
+        await asyncio.sleep(RETRY_DELAY)
+        try:
+            await self._write_batch(batch)
+            return 0
+        except Exception:
+            logging.exception(f'write buffer retry failed, writing {rows} rows one by one')
+
+        failed = 0
+        for sql, params_list in batch.items():
+            for params in params_list:
+                try:
+                    await self._write_batch({sql: [params]})
+                except Exception as error:
+                    failed += 1
+                    logging.error(f'write buffer row lost: {error}; {sql}')
+        return failed
+
+    # Счетчики для мониторинга
+    def stats(self):
+        return {
+            'queue_depth': self._depth,
+            'flush_count': self.flush_count,
+            'flushed_rows': self.flushed_rows,
+            'failed_rows': self.failed_rows,
+            'last_flush_seconds': self.last_flush_seconds,
+            'max_flush_seconds': self.max_flush_seconds,
+            'total_flush_seconds': self.total_flush_seconds,
+        }
@@ -0,0 +1,16 @@
+"""
+Фильтр для команд администраторов бота.
+
+Класс AdminFilter пропускает событие, только если его отправил пользователь из списка ADMIN_IDS
+(config_data.config). Список передается в диспетчер (dp['admin_ids']) и приходит в фильтр
+аргументом admin_ids.
+"""
+
+from aiogram.filters import BaseFilter
+
+
+class AdminFilter(BaseFilter):
+    """Фильтр для проверки, что событие отправил администратор."""
+
+    async def __call__(self, event, admin_ids):
+        return event.from_user.id in admin_ids
@@ -0,0 +1,128 @@
+"""Этот модуль содержит обработчики команд администраторов бота (id из ADMIN_IDS, фильтр AdminFilter).
+
+Функции-обработчики:
+   - export_data: Обрабатывает команды /export_profiles и /export_scores, выгружает таблицу в CSV-файл
+   (database.bulk.export_csv) и отправляет его документом.
+   - import_data: Обрабатывает CSV-файл с подписью profiles или scores, загружает его в базу данных
+   (database.bulk.import_csv) и отвечает отчетом о количестве строк и скорости загрузки.
+   - broadcast_command: Обрабатывает команду /broadcast <текст>, запускает рассылку всем пользователям
+   (services.broadcast.Broadcaster).
+   - broadcast_status: Обрабатывает команду /broadcast_status, выводит ход запущенных рассылок.
+   - broadcast_cancel: Обрабатывает команду /broadcast_cancel <номер>, отменяет рассылку.
+   - search_command: Обрабатывает команду /search <слова>, ищет сообщения пользователей (database.search)
+   с фильтрами user:<id>, from:<дата>, to:<дата> и страницей page:<номер>.
+"""
+
+import csv
+import logging
+import os
+import tempfile
+from datetime import datetime
+from html import escape
+from aiogram import F, Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import FSInputFile, Message
+from database.bulk import TABLES, export_csv, import_csv
+from database.search import MARK_END, MARK_START, PAGE_SIZE, parse_date, search_messages
+from filters.admin import AdminFilter
+from lexicon.lexicon import LEXICON
+
+
+r = Router(name='admin_handlers')
+r.message.filter(AdminFilter())
+
+
+# Будет срабатывать на команды /export_profiles и /export_scores
+@r.message(Command('export_profiles', 'export_scores'))
+async def export_data(message: Message, command: CommandObject):
+    kind = command.command.split('_', 1)[1]
+    logging.info(f'admin export {kind}')
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f'{kind}.csv')
+        report = await export_csv(kind, path)
+        await message.answer_document(FSInputFile(path), caption=LEXICON['admin_export_done'].format(**report))
+
+
+# Будет срабатывать на CSV-файл с подписью profiles или scores
+@r.message(F.document, F.caption.in_(TABLES))
+async def import_data(message: Message):
+    kind = message.caption
+    logging.info(f'admin import {kind}')
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f'{kind}.csv')
+        await message.bot.download(message.document, destination=path)
+        try:
+            report = await import_csv(kind, path)
+        except (ValueError, UnicodeDecodeError, csv.Error) as error:
+            return message.answer(text=LEXICON['admin_import_error'].format(error=escape(str(error))))
+    return message.answer(text=LEXICON['admin_import_done'].format(**report))
+
+
+# Будет срабатывать на команду /broadcast
+@r.message(Command('broadcast'))
+async def broadcast_command(message: Message, command: CommandObject, broadcaster):
+    text = (command.args or '').strip()
+    if not text:
+        return message.answer(text=LEXICON['broadcast_usage'])
+    broadcast_id = await broadcaster.start(message.from_user.id, text)
+    logging.info(f'admin broadcast {broadcast_id}')
+    return message.answer(text=LEXICON['broadcast_started'].format(id=broadcast_id))
+
+
+# Будет срабатывать на команду /broadcast_status
+@r.message(Command('broadcast_status'))
+async def broadcast_status(message: Message, broadcaster):
+    lines = await broadcaster.status()
+    if not lines:
+        return message.answer(text=LEXICON['broadcast_none'])
+    return message.answer(text='\n\n'.join(lines))
+
+
+# Будет срабатывать на команду /broadcast_cancel
+@r.message(Command('broadcast_cancel'))
+async def broadcast_cancel(message: Message, command: CommandObject, broadcaster):
+    args = (command.args or '').strip()
+    if not args.isdigit() or not await broadcaster.cancel(int(args)):
+        return message.answer(text=LEXICON['broadcast_not_found'])
+    return message.answer(text=LEXICON['broadcast_cancelled'].format(id=int(args)))
+
+
+# Разбор аргументов /search: фильтры user:, from:, to:, page: и слова запроса
+def parse_search_args(args):
+    options, words = {}, []
+    for part in args.split():
+        name, _, value = part.partition(':')
+        if name in ('user', 'from', 'to', 'page') and value:
+            options[name] = value
+        elif part:
+            words.append(part)
+    user_id = int(options['user']) if 'user' in options else None
+    since = parse_date(options['from']) if 'from' in options else None
+    # дата "по" включается в поиск целиком
+    until = parse_date(options['to']) + 86400 if 'to' in options else None
+    page = max(1, int(options.get('page', 1)))
+    return ' '.join(words), user_id, since, until, page
+
+
+# Будет срабатывать на команду /search
+@r.message(Command('search'))
+async def search_command(message: Message, command: CommandObject):
+    try:
+        text, user_id, since, until, page = parse_search_args((command.args or '').strip())
+    except ValueError:
+        return message.answer(text=LEXICON['search_usage'])
+    if not text:
+        return message.answer(text=LEXICON['search_usage'])
+    logging.info(f'admin search, page {page}')
+
+    rows, more = await search_messages(text, user_id, since, until, PAGE_SIZE, (page - 1) * PAGE_SIZE)
+    if not rows:
+        return message.answer(text=LEXICON['search_empty'])
+    lines = [LEXICON['search_title'].format(query=escape(text), page=page)]
+    for message_id, user, created_at, snippet in rows:
+        snippet = escape(snippet).replace(MARK_START, '<b>').replace(MARK_END, '</b>')
+        lines.append(f'#{message_id} {datetime.fromtimestamp(created_at):%d.%m.%Y %H:%M}, {user}: {snippet}')
+    if more:
+        args = ' '.join(part for part in command.args.split() if not part.startswith('page:'))
+        lines.append(LEXICON['search_next'].format(args=escape(args), page=page + 1))
+    return message.answer(text='\n\n'.join(lines))
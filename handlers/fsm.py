@@ -2,10 +2,11 @@
 ввода предметов ЕГЭ с балами.
 
 Этот модуль использует библиотеку aiogram для работы с Telegram-ботами и реализует FSM для сбора 
-данных пользователя.
+данных пользователя. Хранилище состояний создается в main.py (см. database.fsm_storage).
+Обработчики, которые заканчиваются одним ответом, возвращают метод (`return message.answer(...)`),
+чтобы в режиме webhook ответ ушел в теле ответа Telegram без отдельного запроса к API.
 
 Основные компоненты модуля:
-- MemoryStorage: Хранилище для сохранения состояний FSM.
 - Router: Объект маршрутизации для регистрации обработчиков событий.
 - FSMFillForm: Класс состояний для FSM, определяющий возможные состояния.
 - process_start_registracio: Обработчик начала процесса регистрации.
@@ -16,7 +17,10 @@
 - process_save_profile: Обработчик завершения процесса регистрации и сохранения данных пользователя.
 - warning_not_last_name: Обработчик получения некорректной фамилии.
 - make_enter_name_subject - Обработчик начала процесса заполнения данных по предметам.
-- make_enter_points_subject: Обработчик получения корректного названия предмета.
+- make_enter_points_subject: Обработчик получения корректного названия предмета. Название приводится к названию
+  из справочника предметов (database.subjects); если такого предмета нет, предлагаются кнопки с похожими
+  названиями (если они есть) и кнопка добавления нового предмета: новый предмет добавляется только по кнопке.
+- process_subject_choice: Обработчик выбора предмета кнопкой (в callback_data - id предмета в таблице subjects).
 - warning_not_name_subject: Обработчик получения некорректного названия предмета.
 - process_save_subject: Обработчик завершения процесса ввода предмета, баллов и сохранения данных.
 - warning_not_points_subject: Обработчик получения некорректных баллов.
@@ -28,19 +32,17 @@ from aiogram import F, Router
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import default_state, State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.types import CallbackQuery, Message
+from html import escape
 from filters.regisration import RegistrationFilter
 from lexicon.lexicon import LEXICON
-from database.sqlite3 import create_profile, create_educational_subjects
+from database.sqlite3 import create_profile, create_educational_subjects, add_subject, get_subject, subject_catalog
+from keyboards.keybords import menu_subject_suggestions
 from handlers.user_handlers import login_menu
 
 
-# Инициализируем хранилище (создаем экземпляр класса MemoryStorage)
-storage = MemoryStorage()
-
 # Создаем объекты роутера
-r = Router()
+r = Router(name='fsm')
 
 # Cоздаем класс, наследуемый от StatesGroup, для группы состояний нашей FSM
 class FSMFillForm(StatesGroup):
@@ -73,10 +75,9 @@ async def process_start_registracio(event, state: FSMContext):
 # Будет срабатывать на команду "/cancel" в любых состояниях, кроме состояния по умолчанию, и отключать FSM состояний
 @r.message(Command(commands='cancel'), ~StateFilter(default_state))
 async def process_cancel_command_state(message: Message, state: FSMContext):
-    await message.answer(text=LEXICON['cancel'])
-    
     # Сбрасываем FSM состояние и очищаем данные, полученные внутри состояний
     await state.clear()
+    return message.answer(text=LEXICON['cancel'])
 
 
 # Будет срабатывать, если введено корректное имя и переводить в состояния ожидания ввода фамилии
@@ -85,17 +86,17 @@ async def process_name_sent(message: Message, state: FSMContext):
     logging.info(f'start FSM first name')
     # Cохраняем введенное имя в хранилище по ключу "first_name"
     await state.update_data(first_name=message.text)
-    await message.answer(text=LEXICON['input_last_name'])
     
     # Устанавливаем состояние ожидания ввода фамилии
     await state.set_state(FSMFillForm.last_name)
+    return message.answer(text=LEXICON['input_last_name'])
 
 
 # Будет срабатывать, если во время ввода имени будет введено что-то некорректное
 @r.message(StateFilter(FSMFillForm.first_name))
 async def warning_not_first_name(message: Message):
     logging.info(f'start FSM error first name')
-    await message.answer(text= LEXICON['error_first_name'])
+    return message.answer(text= LEXICON['error_first_name'])
 
 
 # Будет срабатывать, если данные фамилии введены корректно
@@ -118,7 +119,7 @@ async def process_save_profile(message: Message, state: FSMContext):
 @r.message(StateFilter(FSMFillForm.last_name))
 async def warning_not_last_name(message: Message):
     logging.info(f'start FSM error last name')
-    await message.answer(text= LEXICON['error_last_name'])
+    return message.answer(text= LEXICON['error_last_name'])
 
 
 #Будет переведен в состояние ожидания ввода данных для записи предмета ЕГЭ и баллов
@@ -131,23 +132,57 @@ async def make_enter_name_subject(message: Message, state: FSMContext):
     await state.set_state(FSMFillForm.name_subject)
     
     
-# Будет срабатывать, если корректное название предмета и переводить в статус ввода баллов по предмету
-@r.message(StateFilter(FSMFillForm.name_subject),F.text.isalpha())
+# Будет срабатывать, если корректное название предмета (буквы, пробелы и дефисы) и переводить в статус ввода баллов по предмету
+@r.message(StateFilter(FSMFillForm.name_subject),
+           lambda x: x.text and x.text.replace(' ', '').replace('-', '').isalpha())
 async def make_enter_points_subject(message: Message, state: FSMContext):
     logging.info(f'start FSM name subject')
-    # Cохраняем введенное название предмета в хранилище по ключу "name_subject"
-    await state.update_data(name_subject=message.text)
-    await message.answer(text=LEXICON['input_points_subject'])
+    # Ищем предмет в справочнике без учета регистра
+    name_subject = subject_catalog.match(message.text)
+    if name_subject is None:
+        # Предлагаем похожие предметы, если название похоже на опечатку, и добавление нового предмета
+        suggestions = subject_catalog.suggest(message.text)
+        await state.update_data(new_subject=message.text)
+        return message.answer(text=LEXICON['subject_suggest' if suggestions else 'subject_new'],
+                              reply_markup=menu_subject_suggestions(suggestions, message.text))
+
+    # Cохраняем название предмета в хранилище по ключу "name_subject"
+    await state.update_data(name_subject=name_subject)
     
     # Устанавливаем состояние ожидания ввода баллов по ЕГЭ
     await state.set_state(FSMFillForm.points_subject)    
+    return message.answer(text=LEXICON['input_points_subject'])
+
+
+# Будет срабатывать на выбор предмета из подсказок (или добавление нового предмета)
+@r.callback_query(StateFilter(FSMFillForm.name_subject), F.data.startswith('subject:'))
+async def process_subject_choice(callback: CallbackQuery, state: FSMContext):
+    logging.info(f'start FSM choice subject')
+    choice = callback.data.split(':', 1)[1]
+    if choice == 'new':
+        new_subject = (await state.get_data()).get('new_subject')
+        if not new_subject:
+            return callback.answer()
+        name_subject = await get_subject(await add_subject(new_subject))
+    elif choice.isdigit():
+        name_subject = await get_subject(int(choice))
+    else:
+        name_subject = None
+    if name_subject is None:
+        return callback.answer()
+
+    await state.update_data(name_subject=name_subject)
+    await state.set_state(FSMFillForm.points_subject)
+    await callback.message.edit_text(text=LEXICON['subject_chosen'].format(subject=escape(name_subject))
+                                     + LEXICON['input_points_subject'])
+    return callback.answer()
     
 
 # Будет срабатывать, если во время ввода предмета будет введено что-то некорректное
 @r.message(StateFilter(FSMFillForm.name_subject))
 async def warning_not_name_subject(message: Message):
     logging.info(f'start FSM error name subject')
-    await message.answer(text= LEXICON['error_name_subject'])    
+    return message.answer(text= LEXICON['error_name_subject'])
 
 
 # Будет срабатывать, если введены корректные данные по баллам ЕГЭ (число от 0 до 100)
@@ -170,6 +205,6 @@ async def process_save_subject(message: Message, state: FSMContext):
 @r.message(StateFilter(FSMFillForm.points_subject))
 async def warning_not_points_subject(message: Message):
     logging.info(f'start FSM error points subject')
-    await message.answer(text=LEXICON['error_points_subject'])    
+    return message.answer(text=LEXICON['error_points_subject'])
     
     
@@ -11,7 +11,8 @@
    - Декорированная функция send_echo обрабатывает входящие сообщения. Она сначала проверяет, не содержится ли входящее сообщение в списке игнорируемых. 
    Если сообщение должно быть проигнорировано, функция завершается без выполнения дальнейших действий.
    - Если сообщение не игнорируется, оно сохраняется в базе данных с помощью функции update_message, после чего отправляется 
-   обратно пользователю с использованием лексикона LEXICON.
+   обратно пользователю с использованием лексикона LEXICON. Ответ возвращается из обработчика, поэтому в режиме
+   webhook он уходит в теле ответа Telegram без отдельного запроса к API.
 
 """
 
@@ -22,7 +23,7 @@ from database.sqlite3 import create_message
 from lexicon.lexicon import LEXICON
 
 
-r = Router()
+r = Router(name='other_handlers')
 
 # Список сообщений, на которые бот не отвечает
 IGNORE_MESSAGES = ['/register']
@@ -39,7 +40,7 @@ async def send_echo(message: Message):
     
    # Ответ бота
    logging.info(f'message echo message')
-   await message.answer(LEXICON['echo_message_bot'])
+   return message.answer(LEXICON['echo_message_bot'])
 
     
     
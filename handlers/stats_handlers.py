@@ -0,0 +1,62 @@
+"""Этот модуль содержит обработчики команд таблиц лидеров и статистики баллов (database.leaderboard).
+
+Функции-обработчики:
+   - top_command: Обрабатывает команду /top <предмет>, выводит лучших пользователей по предмету,
+   количество участников, средний балл, медиану и 90-й перцентиль. Без названия предмета выводит
+   список самых популярных предметов.
+   - rank_command: Обрабатывает команду /rank, выводит место пользователя среди всех участников
+   по каждому его предмету.
+"""
+
+import logging
+from html import escape
+from aiogram import Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+from database.leaderboard import popular_subjects, subject_stats, top_users, user_ranks
+from database.sqlite3 import subject_catalog
+from lexicon.lexicon import LEXICON
+
+
+r = Router(name='stats_handlers')
+
+
+# Будет срабатывать на команду /top
+@r.message(Command('top'))
+async def top_command(message: Message, command: CommandObject):
+    logging.info(f'command top')
+    name_subject = (command.args or '').strip()
+    if not name_subject:
+        subjects = await popular_subjects()
+        if not subjects:
+            return message.answer(text=LEXICON['top_empty'])
+        lines = [LEXICON['top_usage']]
+        lines += [f'{escape(subject)} - {count}' for subject, count in subjects]
+        return message.answer(text='\n'.join(lines))
+
+    # название из справочника предметов без учета регистра
+    name_subject = subject_catalog.match(name_subject) or name_subject
+    stats = await subject_stats(name_subject)
+    if stats is None:
+        return message.answer(text=LEXICON['top_no_subject'].format(subject=escape(name_subject)))
+
+    lines = [LEXICON['top_title'].format(subject=escape(name_subject))]
+    for place, (first_name, last_name, points) in enumerate(await top_users(name_subject), start=1):
+        name = escape(f'{first_name or ""} {last_name or ""}'.strip() or '-')
+        lines.append(f'{place}. {name} - {points}')
+    lines.append(LEXICON['top_stats'].format(**stats))
+    return message.answer(text='\n'.join(lines))
+
+
+# Будет срабатывать на команду /rank
+@r.message(Command('rank'))
+async def rank_command(message: Message):
+    logging.info(f'command rank')
+    ranks = await user_ranks(message.from_user.id)
+    if not ranks:
+        return message.answer(text=f"{message.from_user.first_name} {LEXICON['not_subject']}")
+
+    lines = [LEXICON['rank_title']]
+    for rank in ranks:
+        lines.append(LEXICON['rank_line'].format(**dict(rank, subject=escape(rank['subject']))))
+    return message.answer(text='\n'.join(lines))
@@ -9,27 +9,36 @@
    зарегистрироваться, если он отсутствует.
    - process_help_command: Обрабатывает команду /help, предоставляя справочную информацию.
    - services_answer_command: Обрабатывает команду /view_scores, выводит оценки пользователя по различным предметам, 
-   если они имеются в базе данных.
+   если они имеются в базе данных. Все баллы, их сумма и средний балл выводятся одним сообщением;
+   если текст длиннее лимита Telegram, он делится на страницы с инлайн-кнопками.
+   - scores_page: Обрабатывает перелистывание страниц с баллами.
+   - history_command: Обрабатывает команду /history <предмет>, выводит последние попытки пользователя по предмету.
 """
 import logging
+import time
+from html import escape
 from aiogram import F, Router
-from aiogram.types import FSInputFile 
-from aiogram.filters import Command, CommandStart
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject, CommandStart
 from aiogram.types import CallbackQuery, Message
 from lexicon.lexicon import LEXICON
-from keyboards.keybords import menu_login_or_reg, menu_reg_start
-from database.sqlite3 import load_user, load_educational_subjects
+from keyboards.keybords import menu_login_or_reg, menu_reg_start, menu_scores_pages
+from database.sqlite3 import load_user, load_educational_subjects, load_score_history, subject_catalog
+from services.media import answer_photo
 
 
-r = Router()
+r = Router(name='user_handlers')
+
+# Максимальная длина текста сообщения в Telegram
+MESSAGE_LIMIT = 4096
 
 # Будет срабатывать на команду /start 
 # Приветствует пользователя по имени и предлагает выбрать между регистрацией и входом, используя клавиатуру menu_login_or_reg() 
 @r.message(CommandStart())
 async def start_bot(message: Message):
     logging.info(f'command start')
-    await message.answer(text= f"{message.from_user.first_name} {LEXICON['start_reg']}", 
-                             reply_markup=menu_login_or_reg())
+    return message.answer(text= f"{message.from_user.first_name} {LEXICON['start_reg']}", 
+                          reply_markup=menu_login_or_reg())
       
 
 # Будет срабатывать при нажатии кнопки входа в меню.  
@@ -50,25 +59,44 @@ async def login_menu(event):
     else:
         logging.info(f'callback message login menu')
         # Определяем вызов функции был через команду или по кнопки
+        # Картинка загружается в Telegram один раз, дальше отправляется по file_id (services.media)
         if isinstance(event, CallbackQuery):
             await event.message.delete()
-            await event.message.answer_photo(photo=FSInputFile('photo/login_true.jpeg', 
-                                            filename='bot_start'),
-                                            caption=f"Привет, {event.from_user.first_name}!\n {LEXICON['greeting']}")
+            await answer_photo(event.message, 'photo/login_true.jpeg', filename='bot_start',
+                               caption=f"Привет, {event.from_user.first_name}!\n {LEXICON['greeting']}")
         else: 
-            await event.answer_photo(photo=FSInputFile('photo/login_true.jpeg', 
-                                            filename='bot_start'),
-                                            caption=f"Привет, {event.from_user.first_name}!\n {LEXICON['greeting']}")
+            await answer_photo(event, 'photo/login_true.jpeg', filename='bot_start',
+                               caption=f"Привет, {event.from_user.first_name}!\n {LEXICON['greeting']}")
 
 
 # Будет срабатывать  на команду /help и показывать справку по боту
 @r.message(Command(commands='help'))
 async def process_help_command(message: Message):
     logging.info(f'commands help')
-    await message.answer(text=LEXICON['help'])
+    return message.answer(text=LEXICON['help'])
+
+
+# Формирование страниц с баллами по предметам: строки предметов, итог по всем предметам в конце каждой страницы
+def render_scores(subjects):
+    points = [subject[2] for subject in subjects]
+    title = LEXICON['scores_title']
+    total = LEXICON['scores_total'].format(count=len(points), total=sum(points),
+                                           average=sum(points) / len(points))
+    limit = MESSAGE_LIMIT - len(title) - len(total)
 
+    pages, lines, size = [], [], 0
+    for subject in subjects:
+        line = f'Баллы по предмету {escape(subject[1])} - {subject[2]}\n'
+        if lines and size + len(line) > limit:
+            pages.append(lines)
+            lines, size = [], 0
+        lines.append(line)
+        size += len(line)
+    pages.append(lines)
+    return [title + ''.join(lines) + total for lines in pages]
 
-# Будет срабатывать  на команду /view_scores и показывать данные по предметам и баллам ЕГЭ
+
+# Будет срабатывать  на команду /view_scores и показывать данные по предметам и баллам ЕГЭ одним сообщением
 @r.message(Command(commands='view_scores'))
 async def services_answer_command(message:Message):
     logging.info(f'commands view_scores')
@@ -77,11 +105,44 @@ async def services_answer_command(message:Message):
     # если записей нет, то указываем на отсутствие данных в базе по предметам
     if user_sql:
         logging.info(f'print subject')
-        for subject in user_sql:
-            await message.answer(text = f'Баллы по предмету {subject[1]} - {subject[2]}\n')
+        pages = render_scores(user_sql)
+        return message.answer(text=pages[0], reply_markup=menu_scores_pages(0, len(pages)))
     else:
         logging.info(f'message not subject')
-        await message.answer(text=f"{message.from_user.first_name} {LEXICON['not_subject']}")
-   
+        return message.answer(text=f"{message.from_user.first_name} {LEXICON['not_subject']}")
 
-    
+
+# Будет срабатывать при перелистывании страниц с баллами
+@r.callback_query(F.data.startswith('scores_page:'))
+async def scores_page(callback: CallbackQuery):
+    logging.info(f'callback scores page')
+    user_sql = await load_educational_subjects(callback.from_user.id)
+    if user_sql:
+        pages = render_scores(user_sql)
+        page = min(int(callback.data.split(':')[1]), len(pages) - 1)
+        try:
+            await callback.message.edit_text(text=pages[page], reply_markup=menu_scores_pages(page, len(pages)))
+        except TelegramBadRequest as error:
+            # нажата кнопка текущей страницы: текст страницы с разметкой HTML нельзя сравнить
+            # с текстом сообщения, поэтому ошибку "message is not modified" просто пропускаем
+            if 'message is not modified' not in error.message:
+                raise
+    return callback.answer()
+
+
+# Будет срабатывать на команду /history и показывать последние попытки по предмету
+@r.message(Command(commands='history'))
+async def history_command(message: Message, command: CommandObject):
+    logging.info(f'commands history')
+    name_subject = (command.args or '').strip()
+    if not name_subject:
+        return message.answer(text=LEXICON['history_usage'])
+    name_subject = subject_catalog.match(name_subject) or name_subject
+
+    attempts = await load_score_history(message.from_user.id, name_subject)
+    if not attempts:
+        return message.answer(text=LEXICON['history_empty'].format(subject=escape(name_subject)))
+    lines = [LEXICON['history_title'].format(subject=escape(name_subject))]
+    lines += [f"{time.strftime('%d.%m.%Y %H:%M', time.localtime(created_at))} - {points}"
+              for points, created_at in attempts]
+    return message.answer(text='\n'.join(lines))
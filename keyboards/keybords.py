@@ -11,6 +11,15 @@
    - Создает инлайн-клавиатуру с одной кнопкой для начала процесса регистрации.
    - Возвращает объект InlineKeyboardMarkup, представляющий эту клавиатуру.
 
+3. Функция menu_scores_pages:
+   - Создает инлайн-клавиатуру для перелистывания страниц с баллами (/view_scores).
+   - Возвращает объект InlineKeyboardMarkup или None, если страница одна.
+
+4. Функция menu_subject_suggestions:
+   - Создает инлайн-клавиатуру с похожими предметами из справочника (в callback_data - id предмета
+     в таблице subjects) и кнопкой добавления нового предмета.
+   - Возвращает объект InlineKeyboardMarkup.
+
 Эти функции используются в других частях приложения для предоставления пользователю интерфейсов, 
 позволяющих выбирать между различными действиями.
 """
@@ -55,5 +64,31 @@ def menu_reg_start():
     return menu_markup
 
 
+# кнопки для перелистывания страниц с баллами по предметам
+def menu_scores_pages(page, pages):
+    if pages <= 1:
+        return None
+
+    buttons: list[InlineKeyboardButton] = []
+    if page > 0:
+        buttons.append(InlineKeyboardButton(text='◀️', callback_data=f'scores_page:{page - 1}'))
+    buttons.append(InlineKeyboardButton(text=f'{page + 1}/{pages}', callback_data=f'scores_page:{page}'))
+    if page < pages - 1:
+        buttons.append(InlineKeyboardButton(text='▶️', callback_data=f'scores_page:{page + 1}'))
+
+    # Создаем объект инлайн-клавиатуры
+    menu_markup = InlineKeyboardMarkup(inline_keyboard=[buttons])
+    return menu_markup
+
 
+# кнопки с похожими предметами (suggestions - список (id предмета, название)) и добавлением нового предмета
+def menu_subject_suggestions(suggestions, new_subject):
+    keyboard: list[list[InlineKeyboardButton]] = [
+        [InlineKeyboardButton(text=name, callback_data=f'subject:{subject_id}')]
+        for subject_id, name in suggestions
+    ]
+    keyboard.append([InlineKeyboardButton(text=f'➕ Добавить «{new_subject}»', callback_data='subject:new')])
 
+    # Создаем объект инлайн-клавиатуры
+    menu_markup = InlineKeyboardMarkup(inline_keyboard=keyboard)
+    return menu_markup
@@ -12,6 +12,9 @@ LEXICON_COMMANDS: dict[str, str] = {
     "/register": "Пройти регистрацию",
     '/enter_scores': 'Ввести баллы предмета',
     '/view_scores': 'Посмотреть баллы по предметам',
+    '/top': 'Лучшие баллы по предмету',
+    '/rank': 'Мое место среди всех',
+    '/history': 'История баллов по предмету',
     '/cancel': "Отмена действий",
     '/help': 'Справка по работе бота'
 }
@@ -40,6 +43,9 @@ LEXICON: dict[str, str] = {
    
     
     'input_name_subject': "Напишите название предмета: ", 
+    'subject_suggest': 'Такого предмета нет в списке. Возможно, вы имели в виду:',
+    'subject_new': 'Такого предмета нет в списке. Добавить новый предмет?',
+    'subject_chosen': 'Предмет: {subject}\n\n',
     'input_points_subject': "Напишите количество баллов по ЕГЭ (цифрами): ", 
     
     'error_name_subject': 'То, что вы отправили не похоже на название предмета\n\n'
@@ -56,6 +62,45 @@ LEXICON: dict[str, str] = {
     "echo_message_bot": "Простите, я еще учусь и не понимаю, что от меня требуется. "
     "Можете посмотреть мои способности по команде /help", 
     
-    "not_subject": 'у вас нет данных по предметам'
+    "not_subject": 'у вас нет данных по предметам',
+
+    'scores_title': 'Ваши баллы ЕГЭ:\n\n',
+    'throttled': 'Слишком много сообщений! Пожалуйста, подождите немного.',
+
+    'scores_total': '\nПредметов: {count}\nСумма баллов: {total}\nСредний балл: {average:.1f}',
+
+    'broadcast_usage': 'Напишите текст рассылки после команды: /broadcast Текст сообщения',
+    'broadcast_started': 'Рассылка #{id} запущена',
+    'broadcast_progress': 'Рассылка #{id}: {done} из {total}\n'
+    'Доставлено: {sent}, заблокировали бота: {blocked}, ошибки: {failed}\n'
+    'Скорость: {rate:.1f} сообщений/с',
+    'broadcast_done': 'Рассылка завершена!\n\n',
+    'broadcast_saved_progress': 'Рассылка #{id} (в другом процессе): доставлено {sent}, не доставлено {failed}',
+    'broadcast_cancelled': 'Рассылка #{id} отменена',
+    'broadcast_not_found': 'Нет запущенной рассылки с таким номером',
+    'broadcast_none': 'Нет запущенных рассылок',
+
+    'admin_import_done': 'Загружено строк: {rows}, пропущено: {skipped}\n'
+    'Время: {seconds:.1f} с ({rows_per_sec:.0f} строк/с)',
+    'history_usage': 'Напишите название предмета после команды, например: /history Математика',
+    'history_empty': 'Нет сохраненных попыток по предмету {subject}',
+    'history_title': 'Ваши попытки: {subject}\n',
+
+    'top_usage': 'Напишите название предмета после команды, например: /top Математика\n\nПопулярные предметы:',
+    'top_empty': 'Пока никто не ввел баллы',
+    'top_no_subject': 'По предмету {subject} пока нет баллов',
+    'top_title': 'Лучшие баллы: {subject}\n',
+    'top_stats': '\nУчастников: {count}\nСредний балл: {average:.1f}\nМедиана: {median}\n90% набрали не больше: {p90}',
+    'rank_title': 'Ваше место среди всех участников:\n',
+    'rank_line': '{subject}: {points} баллов - {rank} место из {total} (лучше, чем {percentile:.0f}%)',
+
+    'admin_import_error': 'Не удалось загрузить файл: {error}',
+    'admin_export_done': 'Выгружено строк: {rows} за {seconds:.1f} с ({rows_per_sec:.0f} строк/с)',
+    'search_usage': 'Напишите слова для поиска после команды: /search оплата курса\n'
+    'Фильтры: user:id, from:дд.мм.гггг, to:дд.мм.гггг, страница: page:2. '
+    'Поиск по началу слова: оплат*',
+    'search_empty': 'Ничего не найдено',
+    'search_title': 'Сообщения по запросу «{query}», страница {page}:',
+    'search_next': 'Следующая страница: /search {args} page:{page}',
     
 }
\ No newline at end of file
@@ -1,7 +1,7 @@
 """ Основной файл для запуска ТГ бота.
 
 Функциональность:
-- Создание логирования.
+- Создание логирования (запись в файл в отдельном потоке, services.logging_setup).
 - Создание функции для запуска бота, которая загружает конфигурацию из файла config.
 - Регистрация роутеров и создание ссылки на экземпляр созданного бота через диспетчер.
 - Запуск базы данных SQLite3.
@@ -17,11 +17,23 @@
 Основные шаги:
 1. Настройка логгера.
 2. Загрузка конфигурации.
-3. Создание экземпляра бота.
-4. Настройка главного меню.
-5. Подключение и запуск базы данных.
-6. Регистрация роутеров в диспетчере.
-7. Запуск polling для обработки обновлений.
+3. Создание экземпляра бота с ограничением исходящих запросов (middlewares.outbound).
+4. Создание диспетчера: роутеры и middleware (create_dispatcher).
+5. Настройка главного меню.
+6. Подключение и запуск базы данных.
+7. Продолжение прерванных рассылок администратора (services.broadcast).
+8. Запуск фонового обслуживания базы: архивирование старых сообщений и сжатие (services.maintenance),
+   резервные копии базы без остановки бота (services.backup).
+9. Обработка обновлений, накопившихся за время остановки бота (services.catchup).
+10. Запуск webhook (если задан WEBHOOK_URL) или polling (services.polling) для обработки обновлений;
+    в обработку принимается не больше MAX_PENDING_UPDATES обновлений одновременно.
+11. Корректная остановка (services.lifecycle): завершение принятых обновлений, закрытие базы данных
+    и сессии бота. Проверки состояния /healthz и /readyz доступны на METRICS_PORT.
+
+При WORKERS > 1 бот запускается в многопроцессном режиме (services.sharding): этот процесс только
+получает обновления и распределяет их по процессам-обработчикам по id пользователя.
+
+Метрики времени обработки (services.metrics) доступны по HTTP на METRICS_PORT/metrics.
 """
 
 import asyncio
@@ -30,50 +42,202 @@ from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from config_data.config import Config, load_config
-from handlers import fsm, user_handlers, other_handlers
+from handlers import admin_handlers, fsm, user_handlers, stats_handlers, other_handlers
 from keyboards.main_menu import set_main_menu
-from database.sqlite3 import db_start
+from database.sqlite3 import db_start, db_close, user_cache, write_buffer
+from database.fsm_storage import create_storage
+from services.webhook import install_stop_signal, run_webhook
+from services.polling import run_polling
+from services.sharding import run_sharded
+from services.broadcast import Broadcaster
+from services.maintenance import maintenance_loop
+from services.backup import backup_loop
+from services.catchup import catch_up
+from services.lifecycle import Lifecycle
+from middlewares.dedup import UpdateDedupMiddleware
+from middlewares.ordering import OrderedUpdateMiddleware
+from services.executor import KeyedExecutor
+from middlewares.throttling import ThrottlingMiddleware
+from middlewares.logging_context import LoggingContextMiddleware
+from middlewares.metrics import ApiMetricsMiddleware, HandlerMetricsMiddleware, UpdateMetricsMiddleware
+from services.metrics import register_stats, start_metrics_server
+from services.logging_setup import setup_logging
+from middlewares.outbound import (OutboundLimiter, SendPriorityMiddleware,
+                                  PRIORITY_HIGH, PRIORITY_LOW)
 
 bots = Bot
 
+
+# Создание экземпляра бота с ограничением исходящих запросов и метриками запросов к API
+def create_bot(config: Config, session=None) -> Bot:
+    bot = Bot(
+        token=config.tg_bot.token,
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+    # Все исходящие запросы проходят через очередь с лимитами Telegram
+    outbound = OutboundLimiter(
+        global_rate=config.outbound.global_rate,
+        chat_rate=config.outbound.chat_rate,
+        chat_burst=config.outbound.chat_burst,
+    )
+    bot.session.middleware(outbound)
+    # Время запросов к API замеряется после очереди лимитов
+    bot.session.middleware(ApiMetricsMiddleware())
+    register_stats('bot_outbound', outbound.stats)
+    return bot
+
+
+# Создание диспетчера с роутерами и middleware (используется также в benchmarks.replay)
+def create_dispatcher(config: Config) -> Dispatcher:
+    # Хранилище состояний FSM (по умолчанию в базе SQLite, переживает перезапуск)
+    dp = Dispatcher(storage=create_storage(config.fsm))
+    dp['admin_ids'] = config.tg_bot.admin_ids     # для фильтра AdminFilter
+
+    # Отбрасываем спам до очереди пользователя, базы данных и запросов к API
+    throttling = ThrottlingMiddleware(
+        user_rate=config.throttling.user_rate,
+        user_burst=config.throttling.user_burst,
+        global_rate=config.throttling.global_rate,
+        notice_interval=config.throttling.notice_interval,
+    )
+    # Обновления одного пользователя обрабатываются по порядку, разных - параллельно.
+    # Очередь пользователя должна быть до FSMContextMiddleware диспетчера: он читает состояние анкеты
+    executor = KeyedExecutor(
+        concurrency=config.executor.concurrency,
+        key_limit=config.executor.user_queue,
+        max_pending=config.executor.max_pending,
+    )
+    # Пропуск обновлений, обработанных до перезапуска (id загружается после db_start); до очереди пользователя,
+    # чтобы обновление, ждущее своей очереди, тоже считалось в работе
+    dedup = UpdateDedupMiddleware()
+    dp.update.outer_middleware.unregister(dp.fsm)
+    dp.update.outer_middleware(dedup)
+    dp.update.outer_middleware(throttling)
+    dp.update.outer_middleware(OrderedUpdateMiddleware(executor))
+    dp.update.outer_middleware(dp.fsm)
+    dp['executor'] = executor
+    register_stats('bot_executor', executor.stats)
+    dp['update_dedup'] = dedup
+    register_stats('bot_dedup', dedup.stats)
+
+    # Регистриуем роутеры в диспетчере
+    dp.include_router(admin_handlers.r)
+    dp.include_router(fsm.r)
+    dp.include_router(user_handlers.r)
+    dp.include_router(stats_handlers.r)
+    dp.include_router(other_handlers.r)
+
+    # Поля user_id и handler для логов
+    logging_context = LoggingContextMiddleware()
+    dp.update.outer_middleware(logging_context)
+    dp.message.middleware(logging_context)
+    dp.callback_query.middleware(logging_context)
+
+    # Метрики количества обновлений и времени работы обработчиков
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
+    register_stats('bot_write_buffer', write_buffer.stats)
+    register_stats('bot_user_cache', user_cache.stats)
+    register_stats('bot_throttling', throttling.stats)
+
+    # Подсказки анкеты FSM отправляются раньше эхо-ответов
+    priorities = SendPriorityMiddleware({fsm.r: PRIORITY_HIGH, other_handlers.r: PRIORITY_LOW})
+    dp.message.middleware(priorities)
+    dp.callback_query.middleware(priorities)
+    return dp
+
     
 """Функция запуска бота """
 async def main():
-    logging.basicConfig(
-        filename='bot.log',
-        level=logging.INFO,
-        format='%(filename)s:%(lineno)d #%(levelname)-8s '
-               '[%(asctime)s] - %(name)s - %(message)s'
-    )
-    logging.info(f'Start run bot')       
-        
     # Загружаем конфиг в переменную config
     config: Config = load_config()
+
+    # Логи пишет в файл отдельный поток, обработчики только кладут записи в очередь
+    log_listener = setup_logging(config.logging)
+    logging.info(f'Start run bot')       
     
+    # Многопроцессный режим: обновления обрабатывают процессы-обработчики
+    if config.sharding.workers > 1:
+        try:
+            await run_sharded(config)
+        finally:
+            log_listener.stop()
+        return
+
     # создаем экзмепляр Бота 
-    bot = Bot(
-        token=config.tg_bot.token,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-    )
+    bot = create_bot(config)
     
-    dp = Dispatcher()
+    dp = create_dispatcher(config)
     dp['bot_tg'] = bot # передаем экземпляр бота, для получения его из роутеров в других модулях
+
+    # Остановка по шагам (шаги выполняются в обратном порядке) и проверки /healthz, /readyz
+    # задачи обновлений polling: ответ, возвращенный обработчиком, отправляется в той же задаче
+    # обработчики в режиме webhook учитывает исполнитель (dp['executor'])
+    tasks = set()
+    lifecycle = Lifecycle(tasks, dp['executor'], drain_timeout=config.shutdown.timeout,
+                          max_loop_lag=config.shutdown.max_loop_lag)
+    lifecycle.start()
+    register_stats('bot_lifecycle', lifecycle.stats)
+    lifecycle.add_cleanup('bot session', bot.session.close)
+    lifecycle.add_cleanup('fsm storage', dp.storage.close)
+
+    # Рассылки администратора (команда /broadcast)
+    broadcaster = Broadcaster(bot, concurrency=config.broadcast.concurrency)
+    dp['broadcaster'] = broadcaster
+    register_stats('bot_broadcast', broadcaster.stats)
     
     # Настраиваем главное меню бота
     await set_main_menu(bot)
    
     # Загружаем базу данных и запускаем ее
-    await db_start()
+    await db_start(score_history=config.scores.history)
     logging.info(f'db activet')
-  
-    # Регистриуем роутеры в диспетчере
-    dp.include_router(fsm.r)
-    dp.include_router(user_handlers.r)
-    dp.include_router(other_handlers.r)
+    # Дожидаемся записи в базу данных и закрываем соединения
+    lifecycle.add_cleanup('database', db_close)
+    await dp['update_dedup'].load()
+    # id последнего обработанного обновления сохраняется до закрытия базы
+    lifecycle.add_cleanup('update dedup', dp['update_dedup'].save)
+    # Продолжаем рассылки, прерванные прошлой остановкой бота (при остановке прерываем, продолжатся после перезапуска)
+    lifecycle.add_cleanup('broadcasts', broadcaster.stop)
+    broadcast_watcher = asyncio.create_task(broadcaster.watch())
+    lifecycle.add_cleanup('broadcast watcher', broadcast_watcher.cancel)
+    # Архивирование старых сообщений пользователей и сжатие базы по расписанию
+    if config.maintenance.interval:
+        maintenance = asyncio.create_task(maintenance_loop(config.maintenance))
+        lifecycle.add_cleanup('maintenance', maintenance.cancel)
+    # Резервные копии базы по расписанию
+    if config.backup.interval:
+        backup = asyncio.create_task(backup_loop(config.backup))
+        lifecycle.add_cleanup('backup', backup.cancel)
+
+    if config.metrics.port:
+        metrics_runner = await start_metrics_server(config.metrics.host, config.metrics.port, lifecycle)
+        lifecycle.add_cleanup('metrics server', metrics_runner.cleanup)
 
-    # Пропускаем накопившиеся updates и запускаем polling
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    # SIGINT и SIGTERM обрабатываются с самого запуска: остановка во время catch up тоже проходит через lifecycle
+    stop = asyncio.Event()
+    install_stop_signal(stop)
+    try:
+        # Обрабатываем сообщения, отправленные пользователями, пока бот был остановлен
+        drop_pending = not config.catchup.enabled
+        if config.catchup.enabled:
+            await catch_up(dp, bot, dp.resolve_used_update_types(), config.catchup.concurrency, tasks, stop)
+            if stop.is_set():
+                return
+        lifecycle.set_ready()
+        # Запускаем webhook, если он настроен; при ошибке регистрации переключаемся на polling
+        if not (config.webhook.url and
+                await run_webhook(dp, bot, config.webhook, drop_pending, config.shutdown.timeout, stop)):
+            await bot.delete_webhook(drop_pending_updates=drop_pending)
+            # сессию бота закрывает lifecycle после завершения принятых обновлений
+            await run_polling(dp, bot, tasks, stop)
+    finally:
+        await lifecycle.shutdown()
+        logging.info(f'db closed')
+        # Дописываем оставшиеся в очереди записи лога
+        log_listener.stop()
 
     
 if __name__ == "__main__":
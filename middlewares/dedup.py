@@ -0,0 +1,100 @@
+"""Middleware, пропускающий уже обработанные обновления Telegram по update_id.
+
+update_id растет с каждым обновлением, поэтому достаточно хранить одно значение в таблице bot_state
+(database.bot_state): id, до которого включительно обработаны все полученные обновления. Обновления разных
+пользователей обрабатываются параллельно и завершаются не по порядку id, поэтому это не наибольший
+обработанный id, а id перед самым младшим еще не завершенным обновлением (обновления в работе хранятся в куче).
+Так после падения процесса обновления, которые еще обрабатывались, не считаются обработанными. Обновление
+с id не больше значения,
+сохраненного до запуска бота, пропускается: так повторная доставка после перезапуска (webhook, последняя
+неподтвержденная пачка getUpdates, разбор накопившихся обновлений services.catchup) не обрабатывается дважды.
+Во время работы сравнение идет только со значением на момент запуска.
+
+id сохраняется после обработки обновления, но не чаще раза в SAVE_INTERVAL секунд, и при остановке бота (save). После падения процесса могут повторно обработаться
+обновления не больше чем за SAVE_INTERVAL секунд. Если бот не получал обновлений больше недели, Telegram может
+начать нумерацию заново, поэтому сохраненное значение старше MARK_MAX_AGE секунд не используется.
+
+Значение хранится отдельно для каждого процесса, который получает обновления: в многопроцессном режиме
+(services.sharding) у каждого процесса-обработчика свой ключ (worker_state_key). С общим значением
+перезапущенный после падения обработчик пропустил бы свои необработанные обновления, если другой
+обработчик уже ушел вперед по update_id.
+
+Подключается outer middleware к update до очереди пользователя (create_dispatcher): обновление считается
+в работе и пока ждет своей очереди. Значение загружается методом load() после db_start.
+"""
+
+import heapq
+import time
+from aiogram import BaseMiddleware
+from database.bot_state import load_state, save_state
+
+STATE_KEY = 'last_update_id'
+MARK_MAX_AGE = 7 * 86400
+# Не чаще чем раз в сколько секунд сохранять id обработанного обновления
+SAVE_INTERVAL = 1.0
+
+
+# Ключ значения для процесса-обработчика index (services.sharding)
+def worker_state_key(index):
+    return f'{STATE_KEY}:worker-{index}'
+
+
+class UpdateDedupMiddleware(BaseMiddleware):
+    """Пропуск обновлений с update_id не больше сохраненного.
+
+    Attributes:
+        key (str): Ключ значения в таблице bot_state.
+        startup_update_id (int | None): id, сохраненный до запуска бота (обновления до него пропускаются).
+        last_update_id (int | None): id, до которого включительно обработаны все полученные обновления.
+        duplicates (int): Количество пропущенных обновлений.
+    """
+
+    def __init__(self, key=STATE_KEY):
+        self.key = key
+        self.startup_update_id = None
+        self.last_update_id = None
+        self.duplicates = 0
+        self._in_flight = []        # куча id обновлений в работе (завершенные удаляются с вершины)
+        self._done = set()          # завершенные id, которые еще лежат в куче
+        self._max_done = None       # наибольший id завершенного обновления
+        self._saved_update_id = None
+        self._saved_at = 0.0
+
+    # Загрузка сохраненного id (после db_start)
+    async def load(self):
+        self.startup_update_id = self.last_update_id = await load_state(self.key, max_age=MARK_MAX_AGE)
+        self._saved_update_id = self.last_update_id
+        return self.startup_update_id
+
+    # Сохранение id, до которого обработаны все обновления (при остановке - до закрытия базы)
+    async def save(self):
+        if self.last_update_id is not None and self.last_update_id != self._saved_update_id:
+            self._saved_update_id = self.last_update_id
+            self._saved_at = time.monotonic()
+            await save_state(self.key, self.last_update_id)
+
+    async def __call__(self, handler, event, data):
+        if self.startup_update_id is not None and event.update_id <= self.startup_update_id:
+            self.duplicates += 1
+            return None
+        heapq.heappush(self._in_flight, event.update_id)
+        try:
+            return await handler(event, data)
+        finally:
+            self._complete(event.update_id)
+            if time.monotonic() - self._saved_at >= SAVE_INTERVAL:
+                await self.save()
+
+    # Завершение обновления: значение сдвигается до самого младшего обновления, которое еще в работе
+    def _complete(self, update_id):
+        self._done.add(update_id)
+        while self._in_flight and self._in_flight[0] in self._done:
+            self._done.discard(heapq.heappop(self._in_flight))
+        if self._max_done is None or update_id > self._max_done:
+            self._max_done = update_id
+        mark = self._max_done if not self._in_flight else min(self._max_done, self._in_flight[0] - 1)
+        if self.last_update_id is None or mark > self.last_update_id:
+            self.last_update_id = mark
+
+    def stats(self):
+        return {'duplicates': self.duplicates, 'last_update_id': self.last_update_id or 0}
@@ -0,0 +1,19 @@
+"""Middleware, выставляющий контекст логирования (services.logging_setup) для текущего обновления.
+
+Подключается outer middleware к update (id пользователя) и inner middleware к сообщениям
+и нажатиям кнопок (имя обработчика), чтобы в JSON-логе были поля user_id и handler.
+"""
+
+from aiogram import BaseMiddleware
+from services.logging_setup import log_handler, log_user_id
+
+
+class LoggingContextMiddleware(BaseMiddleware):
+    async def __call__(self, handler, event, data):
+        user = data.get('event_from_user')
+        if user is not None:
+            log_user_id.set(user.id)
+        handler_object = data.get('handler')
+        if handler_object is not None:
+            log_handler.set(getattr(handler_object.callback, '__name__', None))
+        return await handler(event, data)
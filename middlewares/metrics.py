@@ -0,0 +1,42 @@
+"""Middleware для сбора метрик времени обработки (см. services.metrics).
+
+- UpdateMetricsMiddleware: outer middleware диспетчера для update, считает обновления и полное время их обработки.
+- HandlerMetricsMiddleware: inner middleware сообщений и нажатий кнопок, замеряет время обработчика
+  с метками роутера и имени функции-обработчика.
+- ApiMetricsMiddleware: middleware сессии бота, замеряет время запросов к Bot API и считает ошибки.
+"""
+
+import time
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from services.metrics import api_errors_total, api_seconds, handler_seconds, update_seconds, updates_total
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    async def __call__(self, handler, event, data):
+        event_type = event.event_type
+        updates_total.inc(event_type)
+        with update_seconds.time(event_type):
+            return await handler(event, data)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    async def __call__(self, handler, event, data):
+        router = data.get('event_router')
+        handler_object = data.get('handler')
+        name = getattr(handler_object.callback, '__name__', 'unknown') if handler_object else 'unknown'
+        with handler_seconds.time(router.name if router else 'unknown', name):
+            return await handler(event, data)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            api_errors_total.inc(name)
+            raise
+        finally:
+            api_seconds.observe(time.perf_counter() - start, name)
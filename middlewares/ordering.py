@@ -0,0 +1,24 @@
+"""Middleware, передающий обработку обновлений исполнителю с порядком по пользователю (services.executor).
+
+Подключается outer middleware к update до FSMContextMiddleware диспетчера (create_dispatcher), чтобы
+состояние анкеты читалось уже после ожидания в очереди пользователя: обновления одного пользователя
+проходят через фильтры, обработчики и анкету FSM строго по порядку поступления, обновления разных
+пользователей - параллельно. Обновление сверх лимита очереди пользователя отбрасывается.
+"""
+
+import logging
+from aiogram import BaseMiddleware
+from services.executor import QueueFull
+
+
+class OrderedUpdateMiddleware(BaseMiddleware):
+    def __init__(self, executor):
+        self.executor = executor
+
+    async def __call__(self, handler, event, data):
+        user = data.get('event_from_user')
+        try:
+            return await self.executor.submit(user.id if user else None, handler, event, data)
+        except QueueFull:
+            logging.warning(f'update {event.update_id} dropped: user queue is full')
+            return None
@@ -0,0 +1,199 @@
+"""Модуль ограничения исходящих запросов бота к Telegram (лимиты 30 сообщений/с на бота и ~1 сообщение/с в чат).
+
+Все запросы бота проходят через middleware сессии OutboundLimiter, поэтому обработчики не меняются:
+- запросы с chat_id ждут свободный токен в общем бакете и в бакете своего чата (token bucket);
+- ожидающие запросы выдаются по приоритету: подсказки анкеты FSM раньше эхо-ответов и рассылок;
+- при ответе 429 (TelegramRetryAfter) чат ставится на паузу на retry_after секунд, и запрос повторяется;
+- копятся метрики времени ожидания в очереди (stats()).
+
+Приоритет запроса берется из контекстной переменной send_priority, которую для каждого обработчика
+выставляет SendPriorityMiddleware по роутеру, в котором найден обработчик.
+
+Основные компоненты модуля:
+- PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW, PRIORITY_BACKGROUND: уровни приоритета (меньше - важнее).
+- send_priority: контекстная переменная с приоритетом текущих исходящих запросов.
+- SendPriorityMiddleware: middleware диспетчера, выставляющий приоритет по роутеру.
+- TokenBucket: бакет токенов.
+- OutboundLimiter: middleware сессии бота с очередью и лимитами.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+PRIORITY_BACKGROUND = 3
+
+send_priority = ContextVar('send_priority', default=PRIORITY_NORMAL)
+
+
+class SendPriorityMiddleware(BaseMiddleware):
+    """Выставляет приоритет исходящих запросов обработчика по его роутеру.
+
+    Attributes:
+        priorities (dict): Приоритет по объекту роутера; для остальных роутеров - PRIORITY_NORMAL.
+    """
+
+    def __init__(self, priorities):
+        self.priorities = priorities
+
+    async def __call__(self, handler, event, data):
+        # переменная не сбрасывается после обработчика: метод, который он вернул,
+        # отправляется диспетчером позже в той же задаче и должен получить тот же приоритет
+        send_priority.set(self.priorities.get(data.get('event_router'), PRIORITY_NORMAL))
+        return await handler(event, data)
+
+
+class TokenBucket:
+    """Бакет токенов: rate токенов в секунду, не больше capacity в запасе."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, now):
+        self._refill(now)
+        if now < self.paused_until or self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    # Через сколько секунд появится токен
+    def wait_time(self, now):
+        self._refill(now)
+        return max(self.paused_until - now, (1 - self.tokens) / self.rate, 0.0)
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class OutboundLimiter(BaseRequestMiddleware):
+    """Middleware сессии бота: лимиты на чат и общий лимит, очередь с приоритетами и обработка 429.
+
+    Attributes:
+        max_retries (int): Сколько раз повторять запрос после TelegramRetryAfter.
+        max_chats (int): Сколько бакетов чатов держать в памяти (самые старые вытесняются).
+    """
+
+    def __init__(self, global_rate=30, chat_rate=1, chat_burst=3, max_retries=3, max_chats=100_000):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = OrderedDict()
+        self._waiters = []          # куча (приоритет, номер, chat_id, future)
+        self._seq = itertools.count()
+        self._wakeup = None         # asyncio.Event создается в цикле событий при первом запросе
+        self._pump_task = None
+
+        self.sent = 0
+        self.retries = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, 'chat_id', None)
+        for attempt in range(self.max_retries + 1):
+            if chat_id is not None:
+                await self._acquire(chat_id, send_priority.get())
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                if chat_id is not None:
+                    self._bucket(chat_id).pause(e.retry_after)
+                else:
+                    await asyncio.sleep(e.retry_after)
+
+    def _bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+            if len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    # Ожидание своей очереди на отправку
+    async def _acquire(self, chat_id, priority):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), chat_id, future))
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+
+        start = time.monotonic()
+        await future
+        waited = time.monotonic() - start
+        self.sent += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    # Выдача разрешений ожидающим запросам по приоритету с учетом лимитов
+    async def _pump(self):
+        while self._waiters:
+            now = time.monotonic()
+            if not self._global.try_take(now):
+                await asyncio.sleep(self._global.wait_time(now))
+                continue
+
+            skipped, chosen, delay = [], None, 1.0
+            while self._waiters:
+                item = heapq.heappop(self._waiters)
+                if item[3].done():      # ожидающий запрос отменен
+                    continue
+                bucket = self._bucket(item[2])
+                if bucket.try_take(now):
+                    chosen = item
+                    break
+                skipped.append(item)
+                delay = min(delay, bucket.wait_time(now))
+            for item in skipped:
+                heapq.heappush(self._waiters, item)
+
+            if chosen is not None:
+                chosen[3].set_result(None)
+                continue
+
+            # ни один чат не готов: возвращаем общий токен и ждем токен чата или новый запрос
+            self._global.tokens = min(self._global.capacity, self._global.tokens + 1)
+            if not self._waiters:
+                break
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    # Метрики очереди исходящих запросов
+    def stats(self):
+        return {
+            'queue_length': len(self._waiters),
+            'sent': self.sent,
+            'retries': self.retries,
+            'wait_seconds_total': self.wait_seconds_total,
+            'wait_seconds_max': self.wait_seconds_max,
+        }
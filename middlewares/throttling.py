@@ -0,0 +1,116 @@
+"""Модуль входящего ограничения частоты событий (антиспам) на уровне диспетчера.
+
+ThrottlingMiddleware подключается как outer middleware к update сразу после определения пользователя
+и пропуска повторов (middlewares.dedup, create_dispatcher) и отбрасывает сообщения и нажатия кнопок сверх лимита
+до очереди пользователя (middlewares.ordering), чтения состояния FSM, фильтров и обработчиков,
+т.е. до любых запросов к базе данных и обращений к Telegram API.
+Пользователь, превысивший лимит, получает не больше одного уведомления "не так быстро" за notice_interval секунд.
+На отброшенное нажатие кнопки всегда отправляется ответ (callback.answer), иначе клиент показывает
+индикатор загрузки, пока Telegram не прервет ожидание.
+Обновления, накопившиеся за время остановки бота (services.catchup, флаг catchup в данных), не ограничиваются.
+
+Лимиты - бакеты токенов: общий на всех пользователей и отдельный на каждого пользователя.
+Состояние пользователей хранится в массивах фиксированного размера (slots ячеек), ячейка выбирается
+по мультипликативному хэшу user_id (старшие биты произведения, slots - степень двойки). Память не растет
+с числом пользователей; при совпадении хэшей пользователи делят один бакет, что только делает лимит строже.
+"""
+
+import time
+from array import array
+from aiogram import BaseMiddleware
+from lexicon.lexicon import LEXICON
+
+# Ограничиваются только эти события; множитель хэша - 2**64 / золотое сечение
+THROTTLED_EVENTS = ('message', 'callback_query')
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+HASH_MASK = (1 << 64) - 1
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Ограничение частоты событий на пользователя и общее.
+
+    Attributes:
+        user_rate (float): Событий в секунду на пользователя.
+        user_burst (int): Допустимый всплеск событий пользователя.
+        global_rate (float): Событий в секунду на всех пользователей (0 - без общего лимита).
+        notice_interval (float): Минимальный интервал между уведомлениями пользователю (в секундах).
+        passed (int), dropped_user (int), dropped_global (int): Счетчики событий.
+    """
+
+    def __init__(self, user_rate=1.0, user_burst=5, global_rate=100.0, notice_interval=10.0, slots=1 << 18):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.global_rate = global_rate
+        self.notice_interval = notice_interval
+
+        if slots & (slots - 1):
+            raise ValueError('slots must be a power of two')
+        self._slots = slots
+        self._shift = 64 - (slots.bit_length() - 1)
+        self._start = time.monotonic()
+        self._tokens = array('f', [user_burst]) * slots     # токены пользователя
+        self._updated = array('d', [0.0]) * slots           # время последнего пополнения (от _start)
+        self._noticed = array('d', [-notice_interval]) * slots   # время последнего уведомления
+
+        self._global_tokens = global_rate
+        self._global_updated = time.monotonic()
+
+        self.passed = 0
+        self.dropped_user = 0
+        self.dropped_global = 0
+
+    # Номер ячейки пользователя (мультипликативный хэш, старшие биты: младшие биты user_id не решают)
+    def _slot(self, user_id):
+        return ((user_id * HASH_MULTIPLIER) & HASH_MASK) >> self._shift
+
+    def _take_global(self):
+        if not self.global_rate:
+            return True
+        now = time.monotonic()
+        self._global_tokens = min(self.global_rate,
+                                  self._global_tokens + (now - self._global_updated) * self.global_rate)
+        self._global_updated = now
+        if self._global_tokens < 1:
+            return False
+        self._global_tokens -= 1
+        return True
+
+    def _take_user(self, slot, now):
+        tokens = min(self.user_burst, self._tokens[slot] + (now - self._updated[slot]) * self.user_rate)
+        self._updated[slot] = now
+        if tokens < 1:
+            self._tokens[slot] = tokens
+            return False
+        self._tokens[slot] = tokens - 1
+        return True
+
+    async def __call__(self, handler, event, data):
+        user = data.get('event_from_user')
+        if user is None or data.get('catchup') or event.event_type not in THROTTLED_EVENTS:
+            return await handler(event, data)
+
+        slot = self._slot(user.id)
+        now = time.monotonic() - self._start
+        if not self._take_user(slot, now):
+            self.dropped_user += 1
+            # одно уведомление за интервал, остальные события отбрасываются молча
+            notice = now - self._noticed[slot] >= self.notice_interval
+            if notice:
+                self._noticed[slot] = now
+            if event.callback_query is not None:
+                await event.callback_query.answer(text=LEXICON['throttled'] if notice else None)
+            elif notice:
+                await event.message.answer(text=LEXICON['throttled'])
+            return None
+
+        if not self._take_global():
+            self.dropped_global += 1
+            if event.callback_query is not None:
+                await event.callback_query.answer()
+            return None
+
+        self.passed += 1
+        return await handler(event, data)
+
+    def stats(self):
+        return {'passed': self.passed, 'dropped_user': self.dropped_user, 'dropped_global': self.dropped_global}
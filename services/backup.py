@@ -0,0 +1,244 @@
+"""Модуль резервного копирования базы данных db_bota.db без остановки бота.
+
+Копировать файл базы, пока бот в нее пишет, нельзя: копия может оказаться поврежденной (часть изменений
+лежит в файле -wal). Вместо этого копия делается через online backup API SQLite:
+- отдельное соединение (не поток-писатель и не читатели database.sqlite3) копирует страницы базы
+  небольшими шагами (BACKUP_STEP_PAGES страниц) с паузой BACKUP_STEP_SLEEP секунд между шагами,
+  в отдельном потоке, поэтому обработчики и запись в базу не останавливаются;
+- на все время копирования соединение держит одну транзакцию чтения: в режиме WAL она не мешает писателю,
+  а копия получается согласованным снимком. Без нее каждая запись бота между шагами заставляла бы
+  backup начинать копирование заново (на 500 тыс. сообщений и записи раз в 5 мс - 88 перезапусков);
+- копия проверяется (PRAGMA quick_check), сжимается gzip в BACKUP_DIR/db_bota-<время>.db.gz,
+  рядом записывается контрольная сумма sha256 (файл .sha256 в формате sha256sum, проверка: sha256sum -c);
+- хранятся BACKUP_KEEP последних копий, более старые удаляются;
+- каждый запуск записывается в таблицу backup_runs (миграция 12): длительность, сколько шагов копирования
+  и сколько времени соединение копирования держало блокировку чтения (сумма и самый долгий шаг),
+  размер, файл, контрольная сумма, ошибка.
+
+Восстановление (бота нужно остановить): контрольная сумма и целостность копии проверяются, затем
+содержимое копируется в db_bota.db тем же backup API (файлы -wal и -shm остаются согласованными).
+
+Основные функции модуля:
+- backup_database(config): одна резервная копия, возвращает отчет.
+- backup_loop(config): фоновая задача бота, копия раз в config.interval секунд.
+- verify_backup(path): проверка контрольной суммы и целостности копии.
+- restore_backup(path): восстановление базы из копии.
+
+Запуск из командной строки (из корня проекта):
+    python -m services.backup                                   # сделать копию
+    python -m services.backup --verify backups/db_bota-20241001-030000.db.gz
+    python -m services.backup --restore backups/db_bota-20241001-030000.db.gz
+"""
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3 as sq
+import threading
+import time
+from config_data.config import load_config
+from database.sqlite3 import DB_NAME, db_close, db_start, execute, write_buffer
+
+# Имя файлов копий и размер блока при сжатии и подсчете контрольной суммы
+BACKUP_PREFIX = 'db_bota-'
+BACKUP_SUFFIX = '.db.gz'
+COPY_CHUNK = 1024 * 1024
+
+SQL_INSERT_RUN = ('INSERT INTO backup_runs(started_at, status, path, sha256, bytes, pages, steps, seconds, '
+                  'lock_seconds, max_step_seconds, error) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)')
+
+
+class BackupAborted(Exception):
+    """Копирование прервано остановкой бота."""
+
+
+# Выполняется в отдельном потоке: копия базы в файл path по шагам, возвращает статистику шагов
+def _copy_database(path, step_pages, step_sleep, abort):
+    source = sq.connect(DB_NAME, timeout=30, isolation_level=None)
+    target = sq.connect(path)
+    steps = []
+    try:
+        wal = source.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        if wal:
+            # снимок базы на все время копирования: записи бота не перезапускают backup
+            source.execute('BEGIN')
+            source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        clock = [time.perf_counter()]
+
+        # вызывается после каждого шага копирования
+        def progress(status, remaining, total):
+            steps.append(time.perf_counter() - clock[0])
+            if abort.is_set():
+                raise BackupAborted()
+            # пауза между шагами, чтобы копирование не занимало диск и процессор подряд
+            time.sleep(step_sleep)
+            clock[0] = time.perf_counter()
+
+        source.backup(target, pages=step_pages, progress=progress)
+        if wal:
+            source.execute('COMMIT')
+        pages = target.execute('PRAGMA page_count').fetchone()[0]
+        check = target.execute('PRAGMA quick_check').fetchone()[0]
+    except BaseException:
+        target.close()
+        os.remove(path)
+        raise
+    finally:
+        target.close()
+        source.close()
+    if check != 'ok':
+        raise sq.DatabaseError(f'backup integrity check failed: {check}')
+    return {'pages': pages, 'steps': len(steps), 'lock_seconds': sum(steps),
+            'max_step_seconds': max(steps, default=0.0)}
+
+
+# Выполняется в отдельном потоке: сжатие файла src в dst, возвращает контрольную сумму sha256 сжатого файла
+def _compress(src, dst):
+    with open(src, 'rb') as source, gzip.open(dst, 'wb', compresslevel=6) as target:
+        shutil.copyfileobj(source, target, COPY_CHUNK)
+    return _sha256(dst)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(COPY_CHUNK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Удаление копий сверх keep последних, возвращает количество удаленных
+def remove_old_backups(backup_dir, keep):
+    names = sorted(name for name in os.listdir(backup_dir)
+                   if name.startswith(BACKUP_PREFIX) and name.endswith(BACKUP_SUFFIX))
+    old = names[:-keep] if keep > 0 else []
+    for name in old:
+        path = os.path.join(backup_dir, name)
+        os.remove(path)
+        if os.path.exists(path + '.sha256'):
+            os.remove(path + '.sha256')
+    return len(old)
+
+
+# Одна резервная копия базы данных, результат записывается в backup_runs
+async def backup_database(config):
+    await write_buffer.flush()
+    os.makedirs(config.dir, exist_ok=True)
+    started_at = int(time.time())
+    path = os.path.join(config.dir, time.strftime(f'{BACKUP_PREFIX}%Y%m%d-%H%M%S{BACKUP_SUFFIX}'))
+    copy = path[:-len('.gz')] + '.tmp'
+    loop = asyncio.get_running_loop()
+    abort = threading.Event()
+    start = time.perf_counter()
+    report = {'status': 'error', 'path': None, 'sha256': None, 'bytes': None, 'pages': None, 'steps': None,
+              'lock_seconds': None, 'max_step_seconds': None, 'error': None}
+    try:
+        report.update(await loop.run_in_executor(
+            None, _copy_database, copy, config.step_pages, config.step_sleep, abort))
+        report['sha256'] = await loop.run_in_executor(None, _compress, copy, path + '.tmp')
+        os.replace(path + '.tmp', path)
+        with open(path + '.sha256', 'w') as checksum:
+            checksum.write(f'{report["sha256"]}  {os.path.basename(path)}\n')
+        report.update(status='ok', path=path, bytes=os.path.getsize(path),
+                      removed=remove_old_backups(config.dir, config.keep))
+    except asyncio.CancelledError:
+        # поток копирования остановится после текущего шага
+        abort.set()
+        raise
+    except Exception as error:
+        logging.exception('db backup failed')
+        report['error'] = repr(error)
+    finally:
+        # незаконченную копию при остановке удаляет поток копирования
+        for tmp in (copy, path + '.tmp'):
+            if os.path.exists(tmp) and not abort.is_set():
+                os.remove(tmp)
+    report['seconds'] = time.perf_counter() - start
+
+    await execute(SQL_INSERT_RUN, (started_at, report['status'], report['path'], report['sha256'], report['bytes'],
+                                   report['pages'], report['steps'], report['seconds'], report['lock_seconds'],
+                                   report['max_step_seconds'], report['error']))
+    logging.info(f'db backup: {report}')
+    return report
+
+
+# Фоновая задача: резервная копия раз в config.interval секунд
+async def backup_loop(config):
+    while True:
+        await asyncio.sleep(config.interval)
+        try:
+            await backup_database(config)
+        except Exception:
+            logging.exception('db backup failed')
+
+
+# Проверка копии: контрольная сумма из файла .sha256 и целостность базы, возвращает (ok, описание)
+def verify_backup(path, keep_copy=None):
+    try:
+        with open(path + '.sha256') as checksum:
+            expected = checksum.read().split()[0]
+    except (OSError, IndexError):
+        return False, 'no checksum file'
+    if _sha256(path) != expected:
+        return False, 'checksum mismatch'
+
+    copy = keep_copy or path[:-len('.gz')] + '.verify'
+    with gzip.open(path, 'rb') as source, open(copy, 'wb') as target:
+        shutil.copyfileobj(source, target, COPY_CHUNK)
+    conn = sq.connect(copy)
+    try:
+        check = conn.execute('PRAGMA quick_check').fetchone()[0]
+    except sq.DatabaseError as error:
+        check = str(error)
+    finally:
+        conn.close()
+        if keep_copy is None:
+            os.remove(copy)
+    return check == 'ok', check
+
+
+# Восстановление db_bota.db из копии (бот должен быть остановлен)
+def restore_backup(path):
+    copy = DB_NAME + '.restore'
+    try:
+        ok, detail = verify_backup(path, keep_copy=copy)
+        if not ok:
+            raise ValueError(f'backup {path} is damaged: {detail}')
+        source = sq.connect(copy)
+        target = sq.connect(DB_NAME, timeout=30)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+    finally:
+        if os.path.exists(copy):
+            os.remove(copy)
+
+
+async def _main(args):
+    if args.verify:
+        ok, detail = verify_backup(args.verify)
+        print(f'{args.verify}: {"ok" if ok else "damaged"} ({detail})')
+        return
+    if args.restore:
+        restore_backup(args.restore)
+        print(f'{DB_NAME} restored from {args.restore}')
+        return
+    await db_start()
+    try:
+        report = await backup_database(load_config().backup)
+    finally:
+        await db_close()
+    print(report)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--verify', default=None, help='проверить файл копии')
+    parser.add_argument('--restore', default=None, help='восстановить базу из файла копии (бот остановлен)')
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,278 @@
+"""Модуль рассылки сообщений всем зарегистрированным пользователям по команде администратора.
+
+Рассылка не перебирает таблицу profile целиком: получатели читаются частями по CHUNK_SIZE
+(database.broadcasts.next_recipients) и раздаются пулу из concurrency задач-отправителей.
+Сообщения отправляются с приоритетом PRIORITY_BACKGROUND, поэтому проходят через общие лимиты
+OutboundLimiter (30 сообщений в секунду, пауза при 429) и не задерживают ответы пользователям.
+Статус доставки каждому пользователю сохраняется в базе данных, позиция рассылки - после каждой части,
+поэтому рассылка, прерванная остановкой бота, продолжается после перезапуска (resume()).
+Рассылку выполняет только процесс, владеющий ее арендой в базе (database.broadcasts): аренда продлевается,
+пока рассылка идет, и освобождается при остановке бота. watch() раз в LEASE_TTL секунд продолжает рассылки
+с истекшей арендой - например, рассылку процесса-обработчика, который упал (services.sharding), -
+и не запускает второй раз рассылку, которая идет в другом процессе.
+Отмена рассылки, идущей в другом процессе, записывается в базу: владелец видит ее при продлении аренды
+(не позже чем через LEASE_TTL / 3 секунд) и останавливает рассылку. status() показывает и ход рассылок
+других процессов по сохраненным счетчикам.
+Текст администратора отправляется как есть, без разметки HTML (символы < и & не ломают отправку).
+
+Ход рассылки (отправлено, заблокировали бота, ошибки, сообщений в секунду) администратор видит
+в сообщении, которое обновляется каждые PROGRESS_INTERVAL секунд, и в метриках bot_broadcast_*.
+
+Основные компоненты модуля:
+- Progress: счетчики одной рассылки.
+- Broadcaster: запуск, продолжение (resume, watch), отмена, ход и остановка рассылок.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError
+from database.broadcasts import (claim_broadcast, count_recipients, create_broadcast, delivery_counts,
+                                 finish_broadcast, next_recipients, record_delivery, release_lease, renew_lease,
+                                 request_cancel, running_broadcasts, save_progress)
+from lexicon.lexicon import LEXICON
+from middlewares.outbound import PRIORITY_BACKGROUND, PRIORITY_NORMAL, send_priority
+
+# Сколько получателей читать из базы за один раз
+CHUNK_SIZE = 500
+# Как часто обновлять сообщение администратора о ходе рассылки (в секундах)
+PROGRESS_INTERVAL = 10.0
+# Сколько ждать отправки уже начатых сообщений при остановке или отмене рассылки
+STOP_TIMEOUT = 10.0
+# Срок аренды рассылки (в секундах), аренда продлевается каждые LEASE_TTL / 3 секунд
+LEASE_TTL = 60
+
+
+class Progress:
+    """Счетчики одной рассылки."""
+
+    def __init__(self, total, sent=0, blocked=0, failed=0):
+        self.total = total
+        self.sent = sent
+        self.blocked = blocked
+        self.failed = failed
+        self.started = time.monotonic()
+        self._done_at_start = self.done
+
+    @property
+    def done(self):
+        return self.sent + self.blocked + self.failed
+
+    # Сообщений в секунду с момента запуска (или продолжения) рассылки
+    @property
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return (self.done - self._done_at_start) / elapsed if elapsed else 0.0
+
+    def format(self, broadcast_id):
+        return LEXICON['broadcast_progress'].format(id=broadcast_id, done=self.done, total=self.total, sent=self.sent,
+                                                    blocked=self.blocked, failed=self.failed, rate=self.rate)
+
+
+class Broadcaster:
+    """Рассылки бота: у каждой рассылки своя задача и пул отправителей.
+
+    Attributes:
+        concurrency (int): Сколько сообщений рассылки отправляется одновременно.
+        chunk_size (int): Сколько получателей читать из базы за один раз.
+        owner (str): Владелец аренды рассылок этого процесса.
+    """
+
+    def __init__(self, bot, concurrency=20, chunk_size=CHUNK_SIZE):
+        self.bot = bot
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+        self.owner = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self._tasks = {}        # id рассылки -> задача
+        self._progress = {}     # id рассылки -> Progress
+        self._queues = {}       # id рассылки -> очередь получателей текущей части
+        self._halted = set()    # id рассылок, которые нужно остановить
+
+    # Запуск новой рассылки, возвращает ее id
+    async def start(self, admin_id, text):
+        broadcast_id = await create_broadcast(admin_id, text, self.owner, LEASE_TTL)
+        progress = Progress(await count_recipients())
+        self._spawn(broadcast_id, admin_id, text, 0, progress)
+        logging.info(f'broadcast {broadcast_id} started, {progress.total} recipients')
+        return broadcast_id
+
+    # Продолжение рассылок, прерванных остановкой бота (только тех, чью аренду удалось получить)
+    async def resume(self):
+        for broadcast_id, admin_id, text, last_user_id, sent, failed, cancel_requested in await running_broadcasts():
+            if broadcast_id in self._tasks or not await claim_broadcast(broadcast_id, self.owner, LEASE_TTL):
+                continue
+            if cancel_requested:        # отменена, пока ее никто не выполнял
+                await finish_broadcast(broadcast_id, 'cancelled', sent, failed)
+                continue
+            counts = await delivery_counts(broadcast_id)
+            done = sum(counts.values())
+            progress = Progress(await count_recipients(), counts.get('sent', 0),
+                                counts.get('blocked', 0), counts.get('failed', 0))
+            self._spawn(broadcast_id, admin_id, text, last_user_id, progress)
+            logging.info(f'broadcast {broadcast_id} resumed after user {last_user_id}, {done} already processed')
+
+    # Отмена рассылки, False - такой рассылки нет среди незавершенных;
+    # рассылку другого процесса останавливает ее владелец по флагу в базе
+    async def cancel(self, broadcast_id):
+        task = self._tasks.get(broadcast_id)
+        if task is None:
+            return await request_cancel(broadcast_id)
+        await self._halt([broadcast_id])
+        progress = self._progress.pop(broadcast_id, None)
+        if progress is not None:        # рассылка не успела завершиться сама
+            await finish_broadcast(broadcast_id, 'cancelled', progress.sent, progress.blocked + progress.failed)
+        return True
+
+    # Продолжение рассылок с истекшей арендой, раз в LEASE_TTL секунд (фоновая задача)
+    async def watch(self):
+        while True:
+            try:
+                await self.resume()
+            except Exception:
+                logging.exception('broadcast resume failed')
+            await asyncio.sleep(LEASE_TTL)
+
+    # Остановка бота: рассылки прерываются и остаются в статусе running до перезапуска,
+    # аренда освобождается, чтобы рассылку сразу продолжил следующий запуск
+    async def stop(self):
+        broadcast_ids = list(self._tasks)
+        await self._halt(broadcast_ids)
+        for broadcast_id in broadcast_ids:
+            await release_lease(broadcast_id, self.owner)
+
+    # Остановка рассылок: очередь получателей очищается, уже начатые отправки завершаются и записываются,
+    # поэтому после продолжения рассылки сообщения не отправляются повторно
+    async def _halt(self, broadcast_ids):
+        tasks = [self._tasks[broadcast_id] for broadcast_id in broadcast_ids if broadcast_id in self._tasks]
+        if not tasks:
+            return
+        for broadcast_id in broadcast_ids:
+            self._halted.add(broadcast_id)
+            queue = self._queues.get(broadcast_id)
+            while queue is not None and not queue.empty():
+                queue.get_nowait()
+                queue.task_done()
+        _, pending = await asyncio.wait(tasks, timeout=STOP_TIMEOUT)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def progress(self):
+        return dict(self._progress)
+
+    # Ход незавершенных рассылок: рассылки этого процесса - по счетчикам в памяти, других - по сохраненным в базе
+    async def status(self):
+        lines = [progress.format(broadcast_id) for broadcast_id, progress in self._progress.items()]
+        for broadcast_id, _, _, _, sent, failed, _ in await running_broadcasts():
+            if broadcast_id not in self._progress:
+                lines.append(LEXICON['broadcast_saved_progress'].format(id=broadcast_id, sent=sent, failed=failed))
+        return lines
+
+    # Метрики для services.metrics
+    def stats(self):
+        return {
+            'running': len(self._tasks),
+            'sent': sum(progress.sent for progress in self._progress.values()),
+            'blocked': sum(progress.blocked for progress in self._progress.values()),
+            'failed': sum(progress.failed for progress in self._progress.values()),
+            'rate': sum(progress.rate for progress in self._progress.values()),
+        }
+
+    def _spawn(self, broadcast_id, admin_id, text, last_user_id, progress):
+        self._progress[broadcast_id] = progress
+        task = asyncio.create_task(self._run(broadcast_id, admin_id, text, last_user_id, progress))
+        self._tasks[broadcast_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast_id, None))
+
+    async def _run(self, broadcast_id, admin_id, text, last_user_id, progress):
+        # задачи-отправители наследуют контекст, поэтому все сообщения рассылки идут с низким приоритетом
+        send_priority.set(PRIORITY_BACKGROUND)
+        queue = self._queues[broadcast_id] = asyncio.Queue()
+        senders = [asyncio.create_task(self._sender(broadcast_id, text, queue, progress))
+                   for _ in range(self.concurrency)]
+        reporter = asyncio.create_task(self._report(broadcast_id, admin_id, progress))
+        lease = asyncio.create_task(self._keep_lease(broadcast_id))
+        try:
+            recipients = await next_recipients(broadcast_id, last_user_id, self.chunk_size)
+            while recipients:
+                for user_id in recipients:
+                    queue.put_nowait(user_id)
+                # следующая часть читается, пока отправляется текущая
+                upcoming = await next_recipients(broadcast_id, recipients[-1], self.chunk_size)
+                await queue.join()
+                if broadcast_id in self._halted:
+                    return
+                await save_progress(broadcast_id, recipients[-1], progress.sent, progress.blocked + progress.failed)
+                recipients = upcoming
+
+            await finish_broadcast(broadcast_id, 'done', progress.sent, progress.blocked + progress.failed)
+            self._progress.pop(broadcast_id, None)
+            logging.info(f'broadcast {broadcast_id} done: {progress.format(broadcast_id)}')
+            await self._notify(admin_id, LEXICON['broadcast_done'] + progress.format(broadcast_id))
+        finally:
+            reporter.cancel()
+            lease.cancel()
+            for sender in senders:
+                sender.cancel()
+            del self._queues[broadcast_id]
+            self._halted.discard(broadcast_id)
+
+    async def _sender(self, broadcast_id, text, queue, progress):
+        while True:
+            user_id = await queue.get()
+            try:
+                status, error = await self._send(user_id, text)
+                if status == 'sent':
+                    progress.sent += 1
+                elif status == 'blocked':
+                    progress.blocked += 1
+                else:
+                    progress.failed += 1
+                await record_delivery(broadcast_id, user_id, status, error)
+            finally:
+                queue.task_done()
+
+    # Отправка одному пользователю, возвращает (статус, ошибка)
+    async def _send(self, user_id, text):
+        try:
+            await self.bot.send_message(chat_id=user_id, text=text, parse_mode=None)
+        except TelegramForbiddenError as e:       # пользователь заблокировал бота
+            return 'blocked', e.message
+        except TelegramAPIError as e:
+            return 'failed', e.message
+        return 'sent', None
+
+    # Продление аренды, пока рассылка идет; отмена, запрошенная в другом процессе, выполняется здесь
+    async def _keep_lease(self, broadcast_id):
+        while True:
+            await asyncio.sleep(LEASE_TTL / 3)
+            try:
+                cancel_requested = await renew_lease(broadcast_id, self.owner, LEASE_TTL)
+            except Exception:
+                logging.exception(f'broadcast {broadcast_id} lease renewal failed')
+                continue
+            if cancel_requested:
+                logging.info(f'broadcast {broadcast_id} cancelled by request')
+                # отдельная задача: cancel() дожидается задачи рассылки, которая отменяет эту
+                asyncio.ensure_future(self.cancel(broadcast_id))
+                return
+
+    # Периодическое обновление сообщения администратора о ходе рассылки
+    async def _report(self, broadcast_id, admin_id, progress):
+        send_priority.set(PRIORITY_NORMAL)
+        message = await self._notify(admin_id, progress.format(broadcast_id))
+        while message is not None:
+            await asyncio.sleep(PROGRESS_INTERVAL)
+            try:
+                await message.edit_text(text=progress.format(broadcast_id))
+            except TelegramAPIError:
+                pass    # текст не изменился или сообщение удалено
+
+    async def _notify(self, admin_id, text):
+        try:
+            return await self.bot.send_message(chat_id=admin_id, text=text)
+        except TelegramAPIError:
+            logging.exception('broadcast notify failed')
+            return None
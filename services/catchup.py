@@ -0,0 +1,89 @@
+"""Модуль обработки обновлений, накопившихся, пока бот был остановлен (перезапуск, деплой).
+
+Раньше при запуске бот удалял накопившиеся обновления (drop_pending_updates=True), и сообщения,
+отправленные пользователями во время перезапуска, терялись. Теперь перед запуском polling или webhook
+бот забирает их через getUpdates и обрабатывает:
+- обновления разных пользователей - параллельно, не больше concurrency одновременно;
+- обновления одного пользователя - строго по порядку (переходы анкеты FSMFillForm остаются корректными,
+  порядок обеспечивает исполнитель services.executor через middlewares.ordering);
+- уже обработанные до остановки обновления пропускаются по update_id (middlewares.dedup);
+- лимит частоты входящих событий (middlewares.throttling) к ним не применяется: это не всплеск от пользователя,
+  а сообщения, накопившиеся за время остановки. Исходящие ответы проходят через общую очередь лимитов Telegram.
+
+Размер накопившейся очереди и время ее обработки пишутся в лог.
+
+Сигнал остановки (событие stop) проверяется перед каждым обновлением: после него новые обновления
+не берутся, а принятые остаются в множестве tasks, и их дожидается services.lifecycle при остановке
+(с ограничением SHUTDOWN_TIMEOUT) вместе с сохранением id обработанных обновлений.
+Необработанные обновления пачки не подтверждаются (следующий getUpdates с offset не вызывается), поэтому
+Telegram выдаст их снова после перезапуска, а уже обработанные пропустит middlewares.dedup.
+
+Основные функции модуля:
+- catch_up(dp, bot, allowed_updates, concurrency, tasks, stop): обработка накопившихся обновлений,
+  возвращает отчет.
+"""
+
+import asyncio
+import logging
+import time
+from services.updates import event_user_id, feed_update
+
+# Сколько обновлений запрашивать за один вызов getUpdates (максимум Bot API)
+BATCH_SIZE = 100
+
+
+# Обработка накопившихся обновлений до запуска polling или webhook
+async def catch_up(dp, bot, allowed_updates, concurrency=100, tasks=None, stop=None):
+    start = time.perf_counter()
+    pending = (await bot.get_webhook_info()).pending_update_count
+    logging.info(f'catch up: {pending} pending updates')
+    # getUpdates не работает, пока установлен webhook; накопившиеся обновления при этом сохраняются
+    await bot.delete_webhook(drop_pending_updates=False)
+
+    executor = dp['executor']
+    in_flight = asyncio.Semaphore(concurrency)
+    if tasks is None:
+        tasks = set()
+    users = set()
+    count = 0
+    offset = None
+
+    def done(task):
+        in_flight.release()
+        tasks.discard(task)
+
+    def stopped():
+        return stop is not None and stop.is_set()
+
+    while not stopped():
+        # запрос со следующим offset подтверждает Telegram получение предыдущей пачки
+        updates = await bot.get_updates(offset=offset, limit=BATCH_SIZE, timeout=0, allowed_updates=allowed_updates)
+        if not updates:
+            break
+        for update in updates:
+            await in_flight.acquire()
+            await executor.wait_capacity()
+            if stopped():
+                in_flight.release()
+                break
+            # задачи начинаются в порядке создания и в этом же порядке встают в очереди пользователей
+            task = asyncio.create_task(feed_update(dp, bot, update, catchup=True))
+            tasks.add(task)
+            task.add_done_callback(done)
+            users.add(event_user_id(update))
+            count += 1
+        offset = updates[-1].update_id + 1
+    # дожидаемся принятых обновлений; после сигнала остановки их дожидается services.lifecycle
+    if tasks:
+        waits = {asyncio.ensure_future(asyncio.wait(set(tasks)))}
+        if stop is not None:
+            waits.add(asyncio.ensure_future(stop.wait()))
+        _, left = await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+        for waiter in left:
+            waiter.cancel()
+
+    seconds = time.perf_counter() - start
+    report = {'updates': count, 'users': len(users), 'seconds': seconds,
+              'updates_per_sec': count / seconds if seconds else 0.0, 'stopped': stopped()}
+    logging.info(f'catch up finished: {report}')
+    return report
@@ -0,0 +1,139 @@
+"""Модуль исполнителя задач с порядком по ключу (для обновлений - по id пользователя).
+
+Обновления одного пользователя должны обрабатываться строго по порядку: два быстрых сообщения
+не должны одновременно пройти через шаги анкеты (process_name_sent, process_save_profile) и записи в базу.
+Обновления разных пользователей при этом обрабатываются параллельно, и медленный обработчик
+одного пользователя не задерживает остальных.
+
+KeyedExecutor:
+- у каждого ключа своя очередь FIFO: задача ключа начинается после завершения предыдущей задачи этого ключа;
+- общее ограничение concurrency на одновременно выполняемые задачи; место занимает только задача,
+  дождавшаяся своей очереди, поэтому пользователь с длинной очередью не занимает все места;
+- ограничение очереди одного ключа (key_limit): задачи сверх него отклоняются (QueueFull) - это защита
+  от пользователя, присылающего сообщения быстрее, чем они обрабатываются;
+- ограничение общего числа принятых задач (max_pending): wait_capacity() ждет, пока освободится место,
+  так прием обновлений (services.polling, services.webhook, services.catchup, services.sharding) не забирает
+  больше, чем успевает обработать;
+- задачи без ключа (None) выполняются без очереди, только с общим ограничением.
+
+Метрики: время ожидания задачи в очереди (bot_executor_wait_seconds) и счетчики stats()
+(активные ключи, задачи в очередях и выполняемые, максимальная длина очереди ключа, отклоненные задачи).
+
+Основные компоненты модуля:
+- QueueFull: исключение при переполнении очереди ключа.
+- KeyedExecutor: исполнитель с методами submit, wait_capacity, join и stats.
+"""
+
+import asyncio
+import time
+from services.metrics import executor_wait_seconds
+
+
+class QueueFull(Exception):
+    """Очередь задач ключа переполнена."""
+
+
+class KeyedExecutor:
+    """Исполнитель задач с порядком FIFO для каждого ключа и общим ограничением параллельности.
+
+    Attributes:
+        concurrency (int): Сколько задач выполняется одновременно.
+        key_limit (int): Сколько задач может ждать в очереди одного ключа (вместе с выполняемой).
+        max_pending (int): Сколько задач может быть принято всего (для wait_capacity).
+        submitted (int), rejected (int): Счетчики принятых и отклоненных задач.
+        max_key_depth (int): Наибольшая длина очереди одного ключа.
+    """
+
+    def __init__(self, concurrency=1000, key_limit=100, max_pending=10000):
+        self.concurrency = concurrency
+        self.key_limit = key_limit
+        self.max_pending = max_pending
+
+        self._slots = asyncio.Semaphore(concurrency)
+        self._tails = {}        # ключ -> future завершения последней задачи ключа
+        self._depth = {}        # ключ -> количество задач ключа в очереди
+        self._pending = 0       # все принятые и незавершенные задачи
+        self._running = 0
+        self._space = asyncio.Event()
+        self._space.set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+        self.submitted = 0
+        self.rejected = 0
+        self.max_key_depth = 0
+
+    # Выполнение func(*args) после предыдущих задач ключа, возвращает результат func
+    async def submit(self, key, func, *args):
+        depth = self._depth.get(key, 0)
+        if key is not None and depth >= self.key_limit:
+            self.rejected += 1
+            raise QueueFull(key)
+
+        previous = self._tails.get(key)
+        done = None
+        if key is not None:
+            # очередь ключа занимается сразу, до первого await, поэтому порядок задач - порядок вызова submit
+            done = asyncio.get_running_loop().create_future()
+            self._tails[key] = done
+            self._depth[key] = depth + 1
+            self.max_key_depth = max(self.max_key_depth, depth + 1)
+        self._accept()
+        start = time.perf_counter()
+        try:
+            if previous is not None:
+                # shield: отмена этой задачи не должна отменять ожидание следующих задач ключа
+                await asyncio.shield(previous)
+            async with self._slots:
+                executor_wait_seconds.observe(time.perf_counter() - start)
+                self._running += 1
+                try:
+                    return await func(*args)
+                finally:
+                    self._running -= 1
+        finally:
+            if done is not None:
+                done.set_result(None)
+                self._release(key, done)
+            self._finish()
+
+    def _accept(self):
+        self.submitted += 1
+        self._pending += 1
+        self._idle.clear()
+        if self._pending >= self.max_pending:
+            self._space.clear()
+
+    def _release(self, key, done):
+        depth = self._depth[key] - 1
+        if depth:
+            self._depth[key] = depth
+        else:
+            del self._depth[key]
+        if self._tails.get(key) is done:
+            del self._tails[key]
+
+    def _finish(self):
+        self._pending -= 1
+        if self._pending < self.max_pending:
+            self._space.set()
+        if not self._pending:
+            self._idle.set()
+
+    # Ожидание, пока число принятых задач меньше max_pending
+    async def wait_capacity(self):
+        await self._space.wait()
+
+    # Ожидание завершения всех принятых задач
+    async def join(self):
+        await self._idle.wait()
+
+    def stats(self):
+        return {
+            'active_keys': len(self._depth),
+            'pending': self._pending,
+            'running': self._running,
+            'max_key_depth': self.max_key_depth,
+            'submitted': self.submitted,
+            'rejected': self.rejected,
+        }
@@ -0,0 +1,151 @@
+"""Модуль жизненного цикла бота: корректная остановка и проверки состояния для оркестратора.
+
+Остановка (SIGTERM от docker, Ctrl+C) раньше обрывала обработчики на середине: терялись накопленные
+в буфере записи, незавершенные шаги анкеты и ответы пользователям. Lifecycle.shutdown() выполняет шаги по порядку:
+1. Бот перестает считаться готовым (/readyz отвечает 503), прием новых обновлений уже остановлен
+   (polling или сервер webhook завершены до вызова shutdown).
+2. Обработка уже принятых обновлений доводится до конца, но не дольше drain_timeout секунд; количество
+   необработанных обновлений пишется в лог. Ожидаются задачи update_tasks (обработчик и отправка ответа,
+   который он вернул: services.polling, services.sharding) и все задачи исполнителя обновлений
+   (services.executor, через него проходят обработчики во всех режимах, в том числе webhook).
+3. Выполняются зарегистрированные шаги остановки (add_cleanup) в обратном порядке регистрации:
+   остановка фоновых задач, сброс буфера записи и закрытие базы данных, закрытие сессии бота.
+   Ошибка одного шага не мешает остальным.
+
+Проверки состояния (на сервере метрик, METRICS_PORT):
+- GET /healthz - бот жив: цикл событий не заблокирован. Задержка цикла (loop lag) измеряется фоновой задачей:
+  насколько позже запланированного она просыпается. Больше max_loop_lag секунд - ответ 503.
+- GET /readyz - бот готов принимать обновления: запуск завершен, остановка не началась и база данных
+  отвечает на запрос (или другая проверка ready_check). Иначе - ответ 503.
+
+Основные компоненты модуля:
+- Lifecycle: запуск, регистрация шагов остановки, остановка, маршруты /healthz и /readyz.
+"""
+
+import asyncio
+import logging
+import time
+from aiohttp import web
+from database.sqlite3 import fetch_all
+
+# Интервал измерения задержки цикла событий и время ожидания ответа базы данных (в секундах)
+LAG_INTERVAL = 1.0
+READY_TIMEOUT = 2.0
+
+
+# Проверка базы данных по умолчанию для /readyz
+async def db_ping():
+    await fetch_all('SELECT 1')
+    return True
+
+
+class Lifecycle:
+    """Запуск и корректная остановка бота, проверки состояния.
+
+    Attributes:
+        update_tasks (set): Задачи обработки обновлений, которые нужно завершить при остановке.
+        executor (KeyedExecutor | None): Исполнитель обновлений, задачи которого нужно завершить при остановке.
+        drain_timeout (float): Сколько секунд ждать завершения принятых обновлений.
+        max_loop_lag (float): Допустимая задержка цикла событий для /healthz (в секундах).
+        ready (bool): Запуск завершен (set_ready).
+        stopping (bool): Началась остановка.
+        loop_lag (float): Последняя измеренная задержка цикла событий.
+    """
+
+    def __init__(self, update_tasks=(), executor=None, drain_timeout=25.0, max_loop_lag=5.0, ready_check=db_ping):
+        self.update_tasks = update_tasks
+        self.executor = executor
+        self.drain_timeout = drain_timeout
+        self.max_loop_lag = max_loop_lag
+        self.ready_check = ready_check
+
+        self.ready = False
+        self.stopping = False
+        self.loop_lag = 0.0
+        self._cleanups = []
+        self._monitor = None
+
+    # Запуск измерения задержки цикла событий
+    def start(self):
+        self._monitor = asyncio.create_task(self._watch_loop_lag())
+
+    async def _watch_loop_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(LAG_INTERVAL)
+            self.loop_lag = max(0.0, loop.time() - start - LAG_INTERVAL)
+
+    def set_ready(self):
+        self.ready = True
+        logging.info('bot is ready')
+
+    # Регистрация шага остановки: func(*args) - функция или корутина
+    def add_cleanup(self, name, func, *args):
+        self._cleanups.append((name, func, args))
+
+    # Ожидание завершения принятых обновлений, возвращает True, если все обработаны
+    async def drain(self):
+        tasks = set(self.update_tasks)
+        in_executor = self.executor.stats()['pending'] if self.executor is not None else 0
+        if not tasks and not in_executor:
+            return True
+        logging.info(f'shutdown: waiting for {len(tasks)} update tasks, {in_executor} updates in executor')
+        waits = set(tasks)
+        join = None
+        if in_executor:
+            join = asyncio.ensure_future(self.executor.join())
+            waits.add(join)
+        _, pending = await asyncio.wait(waits, timeout=self.drain_timeout)
+        if pending:
+            left = self.executor.stats()['pending'] if self.executor is not None else 0
+            logging.error(f'shutdown: {len(pending - {join})} update tasks, {left} updates in executor '
+                          f'still in progress after {self.drain_timeout} s')
+            if join is not None:
+                join.cancel()
+        return not pending
+
+    # Остановка: завершение обработки обновлений и шаги остановки в обратном порядке
+    async def shutdown(self):
+        if self.stopping:
+            return
+        self.stopping = True
+        start = time.perf_counter()
+        logging.info('shutdown started')
+        await self.drain()
+
+        for name, func, args in reversed(self._cleanups):
+            try:
+                result = func(*args)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception:
+                logging.exception(f'shutdown step {name} failed')
+        self._cleanups.clear()
+
+        if self._monitor is not None:
+            self._monitor.cancel()
+        logging.info(f'shutdown finished in {time.perf_counter() - start:.2f} s')
+
+    async def _healthz(self, request):
+        status = 200 if self.loop_lag <= self.max_loop_lag else 503
+        return web.json_response({'status': 'ok' if status == 200 else 'loop lag',
+                                  'loop_lag': self.loop_lag}, status=status)
+
+    async def _readyz(self, request):
+        if not self.ready or self.stopping:
+            return web.json_response({'status': 'stopping' if self.stopping else 'starting'}, status=503)
+        try:
+            ok = await asyncio.wait_for(self.ready_check(), READY_TIMEOUT)
+        except Exception:
+            logging.exception('readiness check failed')
+            ok = False
+        return web.json_response({'status': 'ok' if ok else 'unavailable'}, status=200 if ok else 503)
+
+    # Добавление маршрутов /healthz и /readyz в приложение aiohttp (services.metrics.start_metrics_server)
+    def setup_routes(self, app):
+        app.router.add_get('/healthz', self._healthz)
+        app.router.add_get('/readyz', self._readyz)
+
+    def stats(self):
+        return {'ready': int(self.ready and not self.stopping), 'loop_lag_seconds': self.loop_lag}
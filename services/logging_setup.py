@@ -0,0 +1,111 @@
+"""Модуль настройки логирования бота без записи в файл из цикла событий.
+
+Обработчики бота только кладут записи в очередь (QueueHandler), а запись в файл выполняет
+отдельный поток (QueueListener). Файл лога ротируется по размеру или по времени.
+
+Возможности:
+- текстовый формат (как раньше) или JSON с полями user_id и handler текущего обновления;
+- выборочная запись частых INFO-сообщений (например, эхо-ответов) с долей LOG_SAMPLE_RATE;
+- поля user_id и handler берутся из контекстных переменных, которые выставляет
+  middlewares.logging_context.LoggingContextMiddleware.
+
+Основные компоненты модуля:
+- log_user_id, log_handler: контекстные переменные текущего пользователя и обработчика.
+- ContextFilter: добавляет user_id и handler в запись лога.
+- SamplingFilter: пропускает только часть частых сообщений.
+- LocalQueueHandler: кладет записи в очередь без форматирования.
+- JsonFormatter: форматирует запись в одну строку JSON.
+- setup_logging(log_config): настраивает логирование и возвращает запущенный QueueListener.
+"""
+
+import json
+import logging
+import random
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from queue import SimpleQueue
+
+# Частые INFO-сообщения, которые пишутся выборочно
+SAMPLED_MESSAGES = frozenset({
+    'Start send echo - message',
+    'message echo message',
+})
+
+TEXT_FORMAT = '%(filename)s:%(lineno)d #%(levelname)-8s [%(asctime)s] - %(name)s - %(message)s'
+
+log_user_id = ContextVar('log_user_id', default=None)
+log_handler = ContextVar('log_handler', default=None)
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record):
+        record.user_id = log_user_id.get()
+        record.handler = log_handler.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает сообщения из messages с вероятностью rate, остальные записи - всегда."""
+
+    def __init__(self, rate, messages=SAMPLED_MESSAGES):
+        super().__init__()
+        self.rate = rate
+        self.messages = messages
+
+    def filter(self, record):
+        if record.levelno > logging.INFO or record.msg not in self.messages:
+            return True
+        return random.random() < self.rate
+
+
+class LocalQueueHandler(QueueHandler):
+    """QueueHandler для очереди внутри процесса: запись передается в поток без форматирования и копирования,
+    форматирование выполняет поток записи в файл."""
+
+    def prepare(self, record):
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'file': f'{record.filename}:{record.lineno}',
+            'message': record.getMessage(),
+            'user_id': getattr(record, 'user_id', None),
+            'handler': getattr(record, 'handler', None),
+        }
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+# Обработчик записи в файл с ротацией по размеру или по времени
+def _file_handler(log_config):
+    if log_config.rotation == 'time':
+        return TimedRotatingFileHandler(log_config.file, when=log_config.when,
+                                        backupCount=log_config.backup_count, encoding='utf-8')
+    return RotatingFileHandler(log_config.file, maxBytes=log_config.max_bytes,
+                               backupCount=log_config.backup_count, encoding='utf-8')
+
+
+# Настройка логирования через очередь, возвращает QueueListener (остановить через listener.stop())
+def setup_logging(log_config):
+    file_handler = _file_handler(log_config)
+    file_handler.setFormatter(JsonFormatter() if log_config.json else logging.Formatter(TEXT_FORMAT))
+
+    queue = SimpleQueue()
+    queue_handler = LocalQueueHandler(queue)
+    # фильтры выполняются в потоке обработчика до постановки в очередь, поэтому видят контекст обновления
+    queue_handler.addFilter(SamplingFilter(log_config.sample_rate))
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.handlers[:] = [queue_handler]
+
+    listener = QueueListener(queue, file_handler, respect_handler_level=True)
+    listener.start()
+    return listener
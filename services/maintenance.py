@@ -0,0 +1,131 @@
+"""Модуль обслуживания базы данных: хранение сообщений пользователей, архивирование и сжатие файла базы.
+
+Сообщения, на которые бот отвечает эхом (other_handlers.send_echo), копятся в таблице message_from_users.
+Раз в MAINTENANCE_INTERVAL секунд фоновая задача:
+1. Переносит сообщения старше MESSAGE_RETENTION_DAYS дней в архив - файл JSON Lines, сжатый gzip
+   (ARCHIVE_DIR/messages-<время>.jsonl.gz), и удаляет их из таблицы. Сообщения выбираются по индексу
+   created_at и читаются курсором частями; файл сначала пишется полностью, и только потом строки удаляются
+   небольшими пачками по id, чтобы не держать блокировку записи долго.
+2. Освобождает место в файле базы (PRAGMA incremental_vacuum) - не больше VACUUM_PAGES страниц за раз.
+3. Обновляет статистику планировщика запросов (PRAGMA optimize).
+
+incremental_vacuum работает, если база создана в режиме auto_vacuum=INCREMENTAL (так создаются новые базы,
+см. database.sqlite3._connect). Старую базу можно перевести в этот режим один раз командой
+    python -m services.maintenance --convert
+(выполняет полный VACUUM, бот на это время лучше остановить).
+
+Основные функции модуля:
+- archive_messages(before, archive_dir): архивирование и удаление сообщений старше времени before.
+- run_maintenance(config): один проход обслуживания, возвращает отчет.
+- maintenance_loop(config): фоновая задача бота.
+
+Запуск одного прохода из командной строки (из корня проекта):
+    python -m services.maintenance
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from config_data.config import load_config
+from database.sqlite3 import db_close, db_start, execute, execute_script, fetch_all, fetch_chunks, write_buffer
+
+# Размер пачки строк при чтении архивируемых сообщений и при их удалении (по id)
+ARCHIVE_CHUNK = 5000
+
+SQL_SELECT_OLD_MESSAGES = ('SELECT id, user_id, message, created_at FROM message_from_users '
+                           'WHERE created_at < ? ORDER BY created_at, id')
+SQL_DELETE_OLD_MESSAGES = 'DELETE FROM message_from_users WHERE id BETWEEN ? AND ? AND created_at < ?'
+
+
+# Архивирование сообщений старше before (время Unix), возвращает (количество, путь к архиву или None)
+async def archive_messages(before, archive_dir):
+    await write_buffer.flush()
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, time.strftime('messages-%Y%m%d-%H%M%S.jsonl.gz'))
+    ids = []
+
+    # строки пишутся в файл в потоке-читателе по мере чтения курсором
+    def write_rows(rows):
+        for row_id, user_id, message, created_at in rows:
+            archive.write(json.dumps({'id': row_id, 'user_id': user_id, 'message': message,
+                                      'created_at': created_at}, ensure_ascii=False) + '\n')
+            ids.append(row_id)
+
+    with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as archive:
+        count = await fetch_chunks(SQL_SELECT_OLD_MESSAGES, (before,), write_rows, ARCHIVE_CHUNK)
+    if not count:
+        os.remove(path + '.tmp')
+        return 0, None
+    os.replace(path + '.tmp', path)
+
+    # удаляем только то, что уже записано в архив
+    ids.sort()
+    for start in range(0, len(ids), ARCHIVE_CHUNK):
+        chunk = ids[start:start + ARCHIVE_CHUNK]
+        await execute(SQL_DELETE_OLD_MESSAGES, (chunk[0], chunk[-1], before))
+    return count, path
+
+
+# Один проход обслуживания базы данных
+async def run_maintenance(config):
+    start = time.perf_counter()
+    before = int(time.time()) - config.retention_days * 86400
+    archived, path = await archive_messages(before, config.archive_dir)
+
+    freelist_before = (await fetch_all('PRAGMA freelist_count'))[0][0]
+    auto_vacuum = (await fetch_all('PRAGMA auto_vacuum'))[0][0]
+    if auto_vacuum == 2:    # INCREMENTAL
+        await execute_script(f'PRAGMA incremental_vacuum({int(config.vacuum_pages)});')
+    await execute_script('PRAGMA optimize;')
+    freelist_after = (await fetch_all('PRAGMA freelist_count'))[0][0]
+
+    report = {
+        'archived': archived,
+        'archive': path,
+        'freed_pages': freelist_before - freelist_after,
+        'free_pages': freelist_after,
+        'incremental_vacuum': auto_vacuum == 2,
+        'seconds': time.perf_counter() - start,
+    }
+    logging.info(f'db maintenance: {report}')
+    return report
+
+
+# Фоновая задача: обслуживание базы раз в config.interval секунд
+async def maintenance_loop(config):
+    while True:
+        await asyncio.sleep(config.interval)
+        try:
+            await run_maintenance(config)
+        except Exception:
+            logging.exception('db maintenance failed')
+
+
+# Перевод старой базы в режим auto_vacuum=INCREMENTAL (полный VACUUM)
+async def convert_to_incremental():
+    await execute_script('PRAGMA auto_vacuum=INCREMENTAL; VACUUM;')
+
+
+async def _main(args):
+    config = load_config().maintenance
+    if args.retention_days is not None:
+        config.retention_days = args.retention_days
+    await db_start()
+    try:
+        if args.convert:
+            await convert_to_incremental()
+        report = await run_maintenance(config)
+    finally:
+        await db_close()
+    print(report)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--retention-days', type=int, default=None)
+    parser.add_argument('--convert', action='store_true', help='перевести базу в режим auto_vacuum=INCREMENTAL')
+    asyncio.run(_main(parser.parse_args()))
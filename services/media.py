@@ -0,0 +1,78 @@
+"""Модуль реестра статических файлов (картинок из каталога photo/), отправляемых ботом.
+
+Каждый файл загружается в Telegram один раз: после первой отправки file_id из ответа сохраняется
+в таблицу media_files и в память, а следующие отправки используют file_id без чтения файла с диска
+и повторной загрузки. Если Telegram отклоняет сохраненный file_id (ошибка про идентификатор файла),
+файл загружается заново; остальные ошибки запроса (длинная подпись, чат не найден) передаются вызывающему,
+а сохраненный file_id не удаляется.
+Загрузку одного файла выполняет только один запрос: пока файл загружается, остальные отправки этого файла
+ждут (блокировка на путь) и затем используют полученный file_id, а не загружают файл сами.
+
+Основные функции модуля:
+- answer_photo(message, path, filename=None, **kwargs): отправляет картинку в ответ на сообщение.
+"""
+
+import asyncio
+import logging
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile
+from database.sqlite3 import delete_media_file_id, load_media_file_id, save_media_file_id
+
+# Части текста ошибки Telegram, означающие, что сохраненный file_id больше не принимается
+FILE_ID_ERRORS = ('file identifier', 'file_id', 'file reference', 'file_reference')
+
+# file_id уже загруженных файлов по пути к файлу
+_file_ids = {}
+# Блокировки загрузки по пути к файлу
+_upload_locks = {}
+
+
+# Получение file_id файла из памяти или базы данных
+async def _get_file_id(path):
+    file_id = _file_ids.get(path)
+    if file_id is None:
+        file_id = await load_media_file_id(path)
+        if file_id is not None:
+            _file_ids[path] = file_id
+    return file_id
+
+
+# Отправка картинки по сохраненному file_id, с загрузкой файла при первой отправке
+async def answer_photo(message, path, filename=None, **kwargs):
+    file_id = await _get_file_id(path)
+    if file_id is not None:
+        sent = await _answer_file_id(message, path, file_id, **kwargs)
+        if sent is not None:
+            return sent
+
+    lock = _upload_locks.setdefault(path, asyncio.Lock())
+    async with lock:
+        # файл мог загрузить другой запрос, пока мы ждали блокировку
+        file_id = await _get_file_id(path)
+        if file_id is not None:
+            sent = await _answer_file_id(message, path, file_id, **kwargs)
+            if sent is not None:
+                return sent
+
+        sent = await message.answer_photo(photo=FSInputFile(path, filename=filename), **kwargs)
+        # берем самый большой размер картинки из ответа Telegram
+        file_id = sent.photo[-1].file_id
+        _file_ids[path] = file_id
+        await save_media_file_id(path, file_id)
+    logging.info(f'uploaded {path}')
+    return sent
+
+
+# Отправка по file_id, None - Telegram отклонил file_id (он удаляется, файл нужно загрузить заново)
+async def _answer_file_id(message, path, file_id, **kwargs):
+    try:
+        return await message.answer_photo(photo=file_id, **kwargs)
+    except TelegramBadRequest as error:
+        if not any(text in error.message.lower() for text in FILE_ID_ERRORS):
+            raise
+        # другой запрос мог уже загрузить файл заново, его file_id не трогаем
+        if _file_ids.get(path) in (file_id, None):
+            logging.warning(f'file_id for {path} rejected, upload again')
+            _file_ids.pop(path, None)
+            await delete_media_file_id(path)
+        return None
@@ -0,0 +1,156 @@
+"""Модуль метрик бота в формате Prometheus.
+
+Содержит простые счетчики и гистограммы (без внешних зависимостей) и HTTP-эндпоинт /metrics на aiohttp.
+
+Метрики:
+- bot_updates_total{type}: количество входящих обновлений по типу события.
+- bot_update_seconds{type}: полное время обработки обновления.
+- bot_handler_seconds{router, handler}: время работы обработчика.
+- bot_db_seconds{query}: время запросов к базе данных (с ожиданием свободного потока).
+- bot_api_request_seconds{method}: время запросов к Telegram Bot API (без ожидания в очереди лимитов).
+- bot_api_errors_total{method}: количество ошибок запросов к Bot API.
+- bot_executor_wait_seconds: время ожидания обновления в очереди пользователя (services.executor).
+- Счетчики компонентов (буфер записи, кэш профилей, лимиты), зарегистрированные через register_stats().
+
+Основные компоненты модуля:
+- Counter, Histogram: типы метрик.
+- register_stats(prefix, stats): добавляет в вывод значения словаря stats() как gauge-метрики.
+- render(): текст всех метрик в формате Prometheus.
+- start_metrics_server(host, port, lifecycle): запускает HTTP-сервер с эндпоинтом /metrics
+  (и проверками /healthz, /readyz, если передан services.lifecycle.Lifecycle).
+"""
+
+import time
+from contextlib import contextmanager
+from aiohttp import web
+
+# Границы корзин гистограмм времени (в секундах)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metrics = []       # зарегистрированные счетчики и гистограммы
+_stats = []         # (префикс, функция stats) для gauge-метрик
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{str(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """Монотонный счетчик с метками."""
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        _metrics.append(self)
+
+    def inc(self, *label_values, amount=1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def collect(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        for values, value in self._values.items():
+            yield f'{self.name}{_labels(self.labels, values)} {value}'
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами и метками."""
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}   # значения меток -> [счетчики корзин, сумма, количество]
+        _metrics.append(self)
+
+    def observe(self, value, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    # Количество наблюдений и их сумма по значениям меток: {(метки): (count, sum)}
+    def totals(self):
+        return {values: (count, total) for values, (_, total, count) in self._series.items()}
+
+    # Замер времени блока кода: with histogram.time('label'): ...
+    @contextmanager
+    def time(self, *label_values):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def collect(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        for values, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % bound
+                yield f'{self.name}_bucket{_labels(self.labels, values, le)} {cumulative}'
+            le = 'le="+Inf"'
+            yield f'{self.name}_bucket{_labels(self.labels, values, le)} {count}'
+            yield f'{self.name}_sum{_labels(self.labels, values)} {total}'
+            yield f'{self.name}_count{_labels(self.labels, values)} {count}'
+
+
+# Метрики, которые пишут middleware и модуль базы данных
+updates_total = Counter('bot_updates_total', 'Incoming updates by event type', ('type',))
+update_seconds = Histogram('bot_update_seconds', 'Full update processing time', ('type',))
+handler_seconds = Histogram('bot_handler_seconds', 'Handler latency', ('router', 'handler'))
+db_seconds = Histogram('bot_db_seconds', 'Database call latency', ('query',))
+api_seconds = Histogram('bot_api_request_seconds', 'Telegram Bot API request latency', ('method',))
+api_errors_total = Counter('bot_api_errors_total', 'Failed Telegram Bot API requests', ('method',))
+executor_wait_seconds = Histogram('bot_executor_wait_seconds', 'Time an update waits in its user queue')
+
+
+# Регистрация словаря счетчиков компонента (например, write_buffer.stats) как gauge-метрик
+def register_stats(prefix, stats):
+    _stats.append((prefix, stats))
+
+
+# Текст всех метрик в формате Prometheus
+def render():
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.collect())
+    for prefix, stats in _stats:
+        for key, value in stats().items():
+            lines.append(f'# TYPE {prefix}_{key} gauge')
+            lines.append(f'{prefix}_{key} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+async def _metrics_handler(request):
+    return web.Response(text=render(), content_type='text/plain', charset='utf-8')
+
+
+# Добавление эндпоинта /metrics в приложение aiohttp
+def setup_metrics_routes(app):
+    app.router.add_get('/metrics', _metrics_handler)
+
+
+# Запуск отдельного HTTP-сервера с метриками, возвращает AppRunner для остановки
+async def start_metrics_server(host, port, lifecycle=None):
+    app = web.Application()
+    setup_metrics_routes(app)
+    if lifecycle is not None:
+        lifecycle.setup_routes(app)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    return runner
@@ -0,0 +1,62 @@
+"""Модуль для работы бота через long polling с ограничением принятых в обработку обновлений.
+
+dp.start_polling aiogram создает задачу на каждое полученное обновление без ограничения: при всплеске
+(или после долгой остановки) в памяти оказываются десятки тысяч ожидающих задач. Здесь обновления
+забираются через getUpdates так же, но перед каждым обновлением цикл ждет места в исполнителе
+(services.executor, MAX_PENDING_UPDATES): пока обработка не успевает, новые обновления остаются в Telegram.
+
+Задачи обработки (обработчик и отправка метода, который он вернул) добавляются в множество tasks:
+его дожидается services.lifecycle при остановке.
+
+Основные функции модуля:
+- poll_updates(dp, bot, tasks, allowed_updates): цикл получения и обработки обновлений.
+- run_polling(dp, bot, tasks, stop): polling до сигнала остановки (SIGINT или SIGTERM).
+"""
+
+import asyncio
+import logging
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError
+from services.updates import feed_update
+from services.webhook import wait_stop_signal
+
+# Время ожидания новых обновлений в одном запросе getUpdates и пауза после ошибки (в секундах)
+POLLING_TIMEOUT = 30
+RETRY_DELAY = 1.0
+
+
+# Получение обновлений через getUpdates и обработка не больше max_pending одновременно
+async def poll_updates(dp, bot, tasks, allowed_updates):
+    executor = dp['executor']
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=POLLING_TIMEOUT, allowed_updates=allowed_updates,
+                                            request_timeout=POLLING_TIMEOUT + 10)
+        except (TelegramNetworkError, TelegramAPIError):
+            logging.exception('get updates failed')
+            await asyncio.sleep(RETRY_DELAY)
+            continue
+        for update in updates:
+            # не забираем больше обновлений, чем исполнитель успевает обработать
+            await executor.wait_capacity()
+            task = asyncio.create_task(feed_update(dp, bot, update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            offset = update.update_id + 1
+            # задача доходит до исполнителя и занимает место до проверки следующего обновления
+            await asyncio.sleep(0)
+
+
+# Запуск polling до сигнала остановки
+async def run_polling(dp, bot, tasks, stop=None):
+    polling = asyncio.create_task(poll_updates(dp, bot, tasks, dp.resolve_used_update_types()))
+    stopped = asyncio.create_task(wait_stop_signal(stop))
+    logging.info('polling started')
+    try:
+        await asyncio.wait((polling, stopped), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        polling.cancel()
+        stopped.cancel()
+    if polling.done() and not polling.cancelled() and polling.exception():
+        raise polling.exception()
+    logging.info('polling stopped')
@@ -0,0 +1,434 @@
+"""Многопроцессный режим бота: процесс-супервизор и WORKERS процессов-обработчиков.
+
+Один процесс asyncio использует одно ядро: разбор обновлений, фильтры роутеров и сериализация
+запросов конкурируют за него. В этом режиме супервизор только получает обновления
+(polling или webhook) и раскладывает их по процессам-обработчикам, не разбирая в модели aiogram.
+
+Распределение:
+- процесс выбирается по id пользователя (shard_for), поэтому все обновления одного пользователя
+  обрабатывает один процесс: состояние FSM, кэш профилей и лимиты пользователя остаются согласованными;
+- внутри процесса обновления одного пользователя обрабатываются по порядку, разных - параллельно
+  (исполнитель services.executor, тот же, что в однопроцессном режиме);
+- обновления без пользователя обрабатывает процесс 0.
+
+Каждый процесс-обработчик собирает своего бота и диспетчер (main.create_bot, main.create_dispatcher),
+работает с той же базой SQLite (режим WAL, у каждого процесса свой поток-писатель, ожидание блокировки
+до 30 секунд) и пишет лог в отдельный файл (bot.log -> bot.worker-1.log). Миграции применяет супервизор
+до запуска обработчиков. Общие лимиты (OUTBOUND_GLOBAL_RATE, THROTTLE_GLOBAL_RATE) делятся поровну
+между процессами. Метрики процесса i доступны на порту METRICS_PORT + i (супервизор - на METRICS_PORT).
+
+Обновления, накопившиеся за время остановки бота (CATCHUP=True), не удаляются, а распределяются
+по процессам-обработчикам как обычные; уже обработанные до остановки пропускаются (middlewares.dedup,
+у каждого процесса-обработчика свой id последнего обработанного обновления).
+
+При остановке супервизор перестает получать обновления, а процессы-обработчики дорабатывают свои очереди
+(services.lifecycle, не дольше SHUTDOWN_TIMEOUT) и закрывают базу данных. /healthz и /readyz доступны
+на тех же портах, что и метрики; супервизор готов, пока все процессы-обработчики живы и не зависли.
+
+У каждого процесса-обработчика очередь обновлений (multiprocessing.Queue) и счетчики в общей памяти:
+сколько обновлений он забрал из очереди, когда забрал последнее и когда последний раз отметился (heartbeat).
+В очереди ждут не больше MAX_PENDING_UPDATES обновлений: дальше супервизор перестает получать обновления
+(polling) или задерживает ответ на запрос webhook, пока обработчик не заберет следующее.
+
+Процесс-обработчик, который не отмечается или не забирает обновления из непустой очереди STALL_TIMEOUT секунд,
+считается зависшим: /readyz отвечает 503, а супервизор завершает его. Упавший или завершенный процесс
+перезапускается с новой очередью: процесс, убитый во время чтения, оставляет блокировку старой очереди
+занятой. Обновления, которые удалось забрать из старой очереди, передаются новому процессу, остальные
+теряются (вместе с теми, что он обрабатывал в момент падения) - их количество пишется в лог.
+
+Основные компоненты модуля:
+- shard_for(user_id, workers): номер процесса для пользователя.
+- Supervisor: запуск, распределение обновлений, перезапуск и остановка процессов-обработчиков.
+- run_sharded(config): запуск бота в многопроцессном режиме (вызывается из main.py при WORKERS > 1).
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue as queue_errors
+import signal
+import time
+from aiohttp import web
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramNetworkError
+from aiogram.types import Update
+from config_data.config import load_config
+from database.sqlite3 import db_close, db_start
+from keyboards.main_menu import set_main_menu
+from middlewares.dedup import worker_state_key
+from services.broadcast import Broadcaster
+from services.lifecycle import Lifecycle
+from services.logging_setup import setup_logging
+from services.maintenance import maintenance_loop
+from services.backup import backup_loop
+from services.metrics import register_stats, start_metrics_server
+from services.updates import feed_update, update_user_id
+from services.webhook import install_stop_signal, wait_stop_signal
+
+# Интервал проверки процессов-обработчиков и пауза перед повторным перезапуском (в секундах)
+WATCH_INTERVAL = 1.0
+RESTART_DELAY = 5.0
+# Сколько ждать завершения процессов-обработчиков при остановке сверх SHUTDOWN_TIMEOUT (закрытие базы и сессии)
+STOP_MARGIN = 5.0
+# Время ожидания новых обновлений в getUpdates
+POLLING_TIMEOUT = 30
+# Как часто процесс-обработчик отмечается и через сколько секунд без отметки или без чтения очереди
+# он считается зависшим; как часто проверять место в очереди процесса-обработчика
+HEARTBEAT_INTERVAL = 1.0
+STALL_TIMEOUT = 30.0
+ROUTE_RETRY_DELAY = 0.01
+
+
+# Номер процесса-обработчика для пользователя
+def shard_for(user_id, workers):
+    if user_id is None:
+        return 0
+    return user_id % workers
+
+
+# Имя файла лога процесса-обработчика: bot.log -> bot.worker-1.log
+def _worker_log_file(path, index):
+    root, ext = os.path.splitext(path)
+    return f'{root}.worker-{index}{ext}'
+
+
+class _Channel:
+    """Очередь обновлений процесса-обработчика и счетчики в общей памяти (создаются при каждом запуске процесса).
+
+    Attributes:
+        queue (multiprocessing.Queue): Обновления для процесса-обработчика.
+        taken (Value): Сколько обновлений процесс забрал из очереди.
+        taken_at (Value): Когда процесс забрал последнее обновление (time.time()).
+        heartbeat (Value): Когда процесс последний раз отметился (time.time()).
+        sent (int): Сколько обновлений супервизор положил в очередь.
+        waiting_since (float): Когда в пустую очередь положено обновление (time.time()).
+    """
+
+    def __init__(self, context):
+        now = time.time()
+        self.queue = context.Queue()
+        self.taken = context.Value('q', 0)
+        self.taken_at = context.Value('d', now)
+        self.heartbeat = context.Value('d', now)
+        self.sent = 0
+        self.waiting_since = now
+
+    # Обновления в очереди, которые процесс еще не забрал
+    @property
+    def pending(self):
+        return self.sent - self.taken.value
+
+    def put(self, raw):
+        if not self.pending:
+            self.waiting_since = time.time()
+        self.queue.put(raw)
+        self.sent += 1
+
+    # Зависший процесс: давно не отмечался или не забирает обновления из непустой очереди
+    def stalled(self):
+        now = time.time()
+        return (now - self.heartbeat.value > STALL_TIMEOUT or
+                (self.pending > 0 and now - max(self.taken_at.value, self.waiting_since) > STALL_TIMEOUT))
+
+    # Забрать обновления, оставшиеся в очереди, и закрыть ее; блокировку чтения может держать упавший процесс,
+    # тогда get_nowait сразу сообщает, что очередь пуста
+    def drain(self):
+        items = []
+        try:
+            while True:
+                raw = self.queue.get_nowait()
+                if raw is not None:
+                    items.append(raw)
+        except (queue_errors.Empty, OSError, EOFError):
+            pass
+        self.queue.close()
+        self.queue.cancel_join_thread()
+        return items
+
+
+# Отметка процесса-обработчика для супервизора
+async def _heartbeat(channel):
+    while True:
+        channel.heartbeat.value = time.time()
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+
+# Разбор и обработка одного обновления
+async def _process_update(dp, bot, raw):
+    try:
+        update = Update.model_validate(raw, context={'bot': bot})
+    except Exception:
+        logging.exception(f'update {raw.get("update_id")} failed')
+        return
+    await feed_update(dp, bot, update)
+
+
+# Основной цикл процесса-обработчика
+async def _run_worker(index, workers, channel):
+    from main import create_bot, create_dispatcher
+
+    config = load_config()
+    config.logging.file = _worker_log_file(config.logging.file, index)
+    log_listener = setup_logging(config.logging)
+    config.outbound.global_rate /= workers
+    config.throttling.global_rate /= workers
+
+    bot = create_bot(config)
+    dp = create_dispatcher(config)
+    dp['bot_tg'] = bot
+    tasks = set()       # задачи обработки обновлений
+    lifecycle = Lifecycle(tasks, dp['executor'], drain_timeout=config.shutdown.timeout,
+                          max_loop_lag=config.shutdown.max_loop_lag)
+    lifecycle.start()
+    register_stats('bot_lifecycle', lifecycle.stats)
+    lifecycle.add_cleanup('bot session', bot.session.close)
+    lifecycle.add_cleanup('fsm storage', dp.storage.close)
+    broadcaster = Broadcaster(bot, concurrency=config.broadcast.concurrency)
+    dp['broadcaster'] = broadcaster
+    register_stats('bot_broadcast', broadcaster.stats)
+    await db_start(score_history=config.scores.history)
+    lifecycle.add_cleanup('database', db_close)
+    # у каждого обработчика свой id последнего обработанного обновления: очереди обработчиков независимы
+    dp['update_dedup'].key = worker_state_key(index)
+    await dp['update_dedup'].load()
+    lifecycle.add_cleanup('update dedup', dp['update_dedup'].save)
+    # прерванные рассылки продолжает, базу обслуживает и копирует первый процесс
+    lifecycle.add_cleanup('broadcasts', broadcaster.stop)
+    if index == 1:
+        # рассылки продолжаются по аренде: идущая в другом процессе рассылка не запускается второй раз
+        broadcast_watcher = asyncio.create_task(broadcaster.watch())
+        lifecycle.add_cleanup('broadcast watcher', broadcast_watcher.cancel)
+        if config.maintenance.interval:
+            maintenance = asyncio.create_task(maintenance_loop(config.maintenance))
+            lifecycle.add_cleanup('maintenance', maintenance.cancel)
+        if config.backup.interval:
+            backup = asyncio.create_task(backup_loop(config.backup))
+            lifecycle.add_cleanup('backup', backup.cancel)
+    if config.metrics.port:
+        metrics_runner = await start_metrics_server(config.metrics.host, config.metrics.port + index, lifecycle)
+        lifecycle.add_cleanup('metrics server', metrics_runner.cleanup)
+    heartbeat = asyncio.create_task(_heartbeat(channel))
+    lifecycle.add_cleanup('heartbeat', heartbeat.cancel)
+    lifecycle.set_ready()
+    logging.info(f'worker {index} started')
+
+    loop = asyncio.get_running_loop()
+    executor = dp['executor']
+
+    try:
+        while True:
+            raw = await loop.run_in_executor(None, channel.queue.get)
+            if raw is None:     # сигнал остановки от супервизора
+                break
+            channel.taken.value += 1
+            channel.taken_at.value = time.time()
+            # не забираем из очереди больше, чем исполнитель успевает обработать
+            await executor.wait_capacity()
+            task = asyncio.create_task(_process_update(dp, bot, raw))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        # принятые обновления дорабатываются не дольше SHUTDOWN_TIMEOUT
+        await lifecycle.shutdown()
+        logging.info(f'worker {index} stopped')
+        log_listener.stop()
+
+
+# Точка входа процесса-обработчика
+def _worker_main(index, workers, channel):
+    # Ctrl+C получает вся группа процессов, останавливает обработчиков супервизор
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_run_worker(index, workers, channel))
+
+
+class Supervisor:
+    """Процессы-обработчики с очередями обновлений.
+
+    Attributes:
+        workers (int): Количество процессов-обработчиков.
+        max_pending (int): Сколько обновлений может ждать в очереди одного процесса-обработчика.
+    """
+
+    def __init__(self, workers, max_pending=10000):
+        self.workers = workers
+        self.max_pending = max_pending
+        # spawn: новый интерпретатор без копии цикла событий и потоков супервизора
+        self._context = multiprocessing.get_context('spawn')
+        self._channels = [None] * workers
+        self._processes = [None] * workers
+        self._started_at = [0.0] * workers
+        self._routed = [0] * workers
+        self._restarts = 0
+        self._lost = 0
+
+    # Запуск процесса-обработчика с новой очередью; обновления из очереди прежнего процесса передаются новому
+    def _spawn(self, index):
+        old, channel = self._channels[index], _Channel(self._context)
+        if old is not None:
+            pending = old.pending
+            items = old.drain()
+            for raw in items:
+                channel.put(raw)
+            lost = max(0, pending - len(items))
+            self._lost += lost
+            logging.error(f'worker {index + 1}: {len(items)} pending updates moved to the new queue, {lost} lost')
+        self._channels[index] = channel
+        process = self._context.Process(target=_worker_main, args=(index + 1, self.workers, channel),
+                                        name=f'bot-worker-{index + 1}', daemon=True)
+        process.start()
+        self._processes[index] = process
+        self._started_at[index] = time.monotonic()
+
+    def start(self):
+        for index in range(self.workers):
+            self._spawn(index)
+        logging.info(f'started {self.workers} workers')
+
+    # Передача обновления (словарь JSON) процессу пользователя; ждет, пока в его очереди есть место
+    async def route(self, raw):
+        index = shard_for(update_user_id(raw), self.workers)
+        while self._channels[index].pending >= self.max_pending:
+            await asyncio.sleep(ROUTE_RETRY_DELAY)
+        self._channels[index].put(raw)
+        self._routed[index] += 1
+
+    # Перезапуск упавших процессов (не чаще раза в RESTART_DELAY секунд для одного процесса),
+    # зависшие процессы завершаются и перезапускаются на следующей проверке
+    async def watch(self):
+        while True:
+            await asyncio.sleep(WATCH_INTERVAL)
+            for index, process in enumerate(self._processes):
+                if process.is_alive():
+                    if self._channels[index].stalled():
+                        logging.error(f'worker {index + 1} stalled for {STALL_TIMEOUT} s, kill')
+                        process.kill()
+                    continue
+                if time.monotonic() - self._started_at[index] < RESTART_DELAY:
+                    continue
+                logging.error(f'worker {index + 1} exited with code {process.exitcode}, restart')
+                self._restarts += 1
+                self._spawn(index)
+
+    # Остановка: обработчики дорабатывают очередь и закрывают базу данных
+    async def stop(self, timeout):
+        for channel in self._channels:
+            channel.queue.put(None)
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join, max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logging.error(f'{process.name} did not stop in {timeout} s, terminate')
+                process.terminate()
+        logging.info(f'workers stopped')
+
+    # Проверка готовности для /readyz: все процессы-обработчики работают и не зависли
+    async def healthy(self):
+        return all(process is not None and process.is_alive() and not channel.stalled()
+                   for process, channel in zip(self._processes, self._channels))
+
+    def stats(self):
+        stats = {'workers': self.workers, 'restarts': self._restarts, 'lost': self._lost}
+        for index, routed in enumerate(self._routed):
+            stats[f'routed_worker_{index + 1}'] = routed
+            stats[f'pending_worker_{index + 1}'] = self._channels[index].pending if self._channels[index] else 0
+        return stats
+
+
+# Получение обновлений через getUpdates и передача процессам-обработчикам
+async def _poll(bot, supervisor, allowed_updates):
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=POLLING_TIMEOUT, allowed_updates=allowed_updates,
+                                            request_timeout=POLLING_TIMEOUT + 10)
+        except (TelegramNetworkError, TelegramAPIError):
+            logging.exception('get updates failed')
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            await supervisor.route(update.model_dump(mode='json', by_alias=True, exclude_unset=True))
+            offset = update.update_id + 1
+
+
+# Прием обновлений через webhook и передача процессам-обработчикам, False - нужно переключиться на polling
+async def _serve_webhook(bot, supervisor, webhook_config, allowed_updates, drop_pending_updates, stop):
+    async def handle(request):
+        if webhook_config.secret and \
+                request.headers.get('X-Telegram-Bot-Api-Secret-Token') != webhook_config.secret:
+            return web.Response(status=401)
+        await supervisor.route(await request.json())
+        return web.Response()
+
+    try:
+        await bot.set_webhook(
+            url=webhook_config.url.rstrip('/') + webhook_config.path,
+            secret_token=webhook_config.secret or None,
+            allowed_updates=allowed_updates,
+            drop_pending_updates=drop_pending_updates,
+        )
+    except TelegramAPIError:
+        logging.exception('set webhook failed, switch to polling')
+        return False
+
+    app = web.Application()
+    app.router.add_post(webhook_config.path, handle)
+    # обработчик только кладет обновление в очередь, долго ждать его завершения при остановке не нужно
+    runner = web.AppRunner(app, shutdown_timeout=STOP_MARGIN)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host=webhook_config.host, port=webhook_config.port).start()
+        logging.info(f'webhook server started on {webhook_config.host}:{webhook_config.port}')
+        await wait_stop_signal(stop)
+    finally:
+        await runner.cleanup()
+    return True
+
+
+# Запуск бота в многопроцессном режиме
+async def run_sharded(config):
+    from main import create_dispatcher
+
+    # Типы обновлений, на которые подписаны роутеры
+    allowed_updates = create_dispatcher(config).resolve_used_update_types()
+
+    # Миграции применяются один раз до запуска обработчиков
+    await db_start()
+    await db_close()
+
+    bot = Bot(token=config.tg_bot.token)
+    await set_main_menu(bot)
+
+    supervisor = Supervisor(config.sharding.workers, config.executor.max_pending)
+    register_stats('bot_sharding', supervisor.stats)
+    supervisor.start()
+    # супервизор готов, пока живы все процессы-обработчики
+    lifecycle = Lifecycle(max_loop_lag=config.shutdown.max_loop_lag, ready_check=supervisor.healthy)
+    lifecycle.start()
+    lifecycle.add_cleanup('bot session', bot.session.close)
+    lifecycle.add_cleanup('workers', supervisor.stop, config.shutdown.timeout + STOP_MARGIN)
+    watcher = asyncio.create_task(supervisor.watch())
+    lifecycle.add_cleanup('watcher', watcher.cancel)
+    if config.metrics.port:
+        metrics_runner = await start_metrics_server(config.metrics.host, config.metrics.port, lifecycle)
+        lifecycle.add_cleanup('metrics server', metrics_runner.cleanup)
+
+    # сигнал остановки, полученный до запуска polling или webhook, тоже проходит через lifecycle
+    stop = asyncio.Event()
+    install_stop_signal(stop)
+    try:
+        # накопившиеся обновления распределяются по обработчикам как обычные (по порядку для каждого пользователя)
+        drop_pending = not config.catchup.enabled
+        if config.catchup.enabled:
+            pending = (await bot.get_webhook_info()).pending_update_count
+            logging.info(f'catch up: {pending} pending updates')
+        lifecycle.set_ready()
+        if not (config.webhook.url and
+                await _serve_webhook(bot, supervisor, config.webhook, allowed_updates, drop_pending, stop)):
+            await bot.delete_webhook(drop_pending_updates=drop_pending)
+            poller = asyncio.create_task(_poll(bot, supervisor, allowed_updates))
+            await wait_stop_signal(stop)
+            poller.cancel()
+    finally:
+        await lifecycle.shutdown()
@@ -0,0 +1,52 @@
+"""Вспомогательные функции для обновлений Telegram.
+
+Используются там, где обновления обрабатываются в обход цикла polling aiogram
+(services.sharding: выбор процесса-обработчика по пользователю до разбора в объекты aiogram,
+services.catchup: обработка накопившихся обновлений при запуске).
+
+Основные функции модуля:
+- update_user_id(raw): id пользователя из обновления в виде словаря JSON (None, если пользователя нет).
+- event_user_id(update): то же для объекта Update aiogram.
+- feed_update(dp, bot, update, **kwargs): обработка обновления диспетчером вне цикла polling
+  (порядок обновлений одного пользователя обеспечивает middlewares.ordering).
+"""
+
+import logging
+from aiogram.methods import TelegramMethod
+
+# Поля события с отправителем: from у сообщений и нажатий кнопок, user у ответов на опросы и реакций
+USER_FIELDS = ('from', 'user')
+
+
+# id пользователя из обновления без разбора в модели aiogram
+def update_user_id(raw):
+    for key, event in raw.items():
+        if key == 'update_id' or not isinstance(event, dict):
+            continue
+        for field in USER_FIELDS:
+            user = event.get(field)
+            if user:
+                return user['id']
+        return None
+    return None
+
+
+# id пользователя из объекта Update
+def event_user_id(update):
+    try:
+        event = update.event
+    except Exception:       # неизвестный тип обновления
+        return None
+    user = getattr(event, 'from_user', None) or getattr(event, 'user', None)
+    return user.id if user else None
+
+
+# Обработка обновления диспетчером с отправкой метода, возвращенного обработчиком
+async def feed_update(dp, bot, update, **kwargs):
+    try:
+        result = await dp.feed_update(bot, update, **kwargs)
+        # метод, возвращенный обработчиком, отправляется отдельным запросом (как при polling)
+        if isinstance(result, TelegramMethod):
+            await dp.silent_call_request(bot, result)
+    except Exception:
+        logging.exception(f'update {update.update_id} failed')
@@ -0,0 +1,92 @@
+"""Модуль для работы бота в режиме webhook вместо long polling.
+
+Telegram отправляет обновления POST-запросами на WEBHOOK_URL + WEBHOOK_PATH, их принимает HTTP-сервер aiohttp.
+Запросы без правильного секретного токена (заголовок X-Telegram-Bot-Api-Secret-Token) отклоняются.
+Обновления обрабатываются сразу в запросе, поэтому если обработчик возвращает метод
+(например, `return message.answer(...)`), ответ уходит в теле ответа на webhook без отдельного запроса к API.
+За балансировщиком можно запустить несколько экземпляров бота.
+Новый запрос ждет места в исполнителе обновлений (services.executor, MAX_PENDING_UPDATES): при перегрузке
+Telegram получает ответ позже и сам ограничивает число одновременных запросов (max_connections).
+
+Основные функции модуля:
+- create_webhook_app(dp, bot, secret, path): создает приложение aiohttp с обработчиком обновлений.
+- run_webhook(dp, bot, webhook_config, drop_pending_updates, shutdown_timeout, stop): запускает сервер и регистрирует
+  webhook в Telegram. Если зарегистрировать webhook не удалось, возвращается False, чтобы main.py переключился
+  на polling. При остановке сервер ждет завершения принятых запросов не дольше shutdown_timeout секунд
+  (SHUTDOWN_TIMEOUT, меньше stop_grace_period в docker-compose.yml).
+- install_stop_signal(stop): SIGINT и SIGTERM устанавливают событие stop (asyncio.Event).
+- wait_stop_signal(stop): ожидание SIGINT или SIGTERM (используется также в services.polling и services.sharding).
+"""
+
+import asyncio
+import logging
+import signal
+from aiohttp import web
+from aiogram.exceptions import TelegramAPIError
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+
+# Создание приложения aiohttp для приема обновлений
+def create_webhook_app(dp, bot, secret, path):
+    executor = dp['executor']
+
+    # не принимаем в обработку больше обновлений, чем исполнитель успевает обработать
+    @web.middleware
+    async def wait_capacity(request, handler):
+        await executor.wait_capacity()
+        return await handler(request)
+
+    app = web.Application(middlewares=[wait_capacity])
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=False,     # ответ обработчика уходит в теле ответа на webhook
+        secret_token=secret or None,
+    ).register(app, path=path)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+# Установка события stop по сигналу остановки процесса
+def install_stop_signal(stop):
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:     # Windows
+            pass
+
+
+# Ожидание сигнала остановки процесса; stop - событие, уже установленное install_stop_signal
+async def wait_stop_signal(stop=None):
+    if stop is None:
+        stop = asyncio.Event()
+        install_stop_signal(stop)
+    await stop.wait()
+
+
+# Запуск бота в режиме webhook, возвращает False, если нужно переключиться на polling
+async def run_webhook(dp, bot, webhook_config, drop_pending_updates=True, shutdown_timeout=25.0, stop=None):
+    # Telegram повторяет доставку, пока сервер не запустится, поэтому webhook регистрируется первым
+    try:
+        await bot.set_webhook(
+            url=webhook_config.url.rstrip('/') + webhook_config.path,
+            secret_token=webhook_config.secret or None,
+            allowed_updates=dp.resolve_used_update_types(),
+            drop_pending_updates=drop_pending_updates,
+        )
+    except TelegramAPIError:
+        logging.exception('set webhook failed, switch to polling')
+        return False
+    logging.info(f'webhook set')
+
+    runner = web.AppRunner(create_webhook_app(dp, bot, webhook_config.secret, webhook_config.path),
+                           shutdown_timeout=shutdown_timeout)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host=webhook_config.host, port=webhook_config.port).start()
+        logging.info(f'webhook server started on {webhook_config.host}:{webhook_config.port}')
+        await wait_stop_signal(stop)
+    finally:
+        await runner.cleanup()
+    return True
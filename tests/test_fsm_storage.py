@@ -0,0 +1,56 @@
+"""Проверка хранилища FSM в SQLite: просроченная, но еще не удаленная запись не возвращает старые данные.
+
+Запуск из корня проекта:
+    python -m unittest discover tests
+"""
+
+import os
+import tempfile
+import time
+import unittest
+from aiogram.fsm.storage.base import StorageKey
+from database import sqlite3 as db
+from database.fsm_storage import SQLiteStorage
+
+KEY = StorageKey(bot_id=1, chat_id=2, user_id=2)
+
+
+class SQLiteStorageExpiryTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        db.DB_NAME = os.path.join(self.tmp.name, 'test.db')
+        await db.db_start()
+        self.storage = SQLiteStorage(ttl=60)
+        await self.storage.set_state(KEY, 'FSMFillForm:points_subject')
+        await self.storage.set_data(KEY, {'name_subject': 'Математика'})
+        # запись просрочена, но фоновая очистка ее еще не удалила
+        await db.execute('UPDATE fsm_storage SET expires_at = ?', (time.time() - 1,))
+
+    async def asyncTearDown(self):
+        await self.storage.close()
+        await db.db_close()
+        self.tmp.cleanup()
+
+    async def test_expired_row_is_not_read(self):
+        self.assertIsNone(await self.storage.get_state(KEY))
+        self.assertEqual(await self.storage.get_data(KEY), {})
+
+    async def test_set_state_drops_expired_data(self):
+        await self.storage.set_state(KEY, 'FSMFillForm:name_subject')
+        self.assertEqual(await self.storage.get_state(KEY), 'FSMFillForm:name_subject')
+        self.assertEqual(await self.storage.get_data(KEY), {})
+
+    async def test_set_data_drops_expired_state(self):
+        await self.storage.set_data(KEY, {'first_name': 'Иван'})
+        self.assertIsNone(await self.storage.get_state(KEY))
+        self.assertEqual(await self.storage.get_data(KEY), {'first_name': 'Иван'})
+
+    async def test_live_row_keeps_other_field(self):
+        await self.storage.set_state(KEY, 'FSMFillForm:first_name')
+        await self.storage.set_data(KEY, {'first_name': 'Иван'})
+        await self.storage.set_state(KEY, 'FSMFillForm:last_name')
+        self.assertEqual(await self.storage.get_data(KEY), {'first_name': 'Иван'})
+
+
+if __name__ == '__main__':
+    unittest.main()